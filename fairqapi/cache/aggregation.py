@@ -0,0 +1,182 @@
+"""
+Statistics of the grid and street forecasts per LOR and district.
+
+The LOR of every grid cell and street is found once per loaded cache (see
+Membership). A request only reduces the cached forecast arrays of the members
+of every group, for all forecast values at once.
+"""
+from collections import Counter
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, encode_json
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.internal.data_utils import get_iso_format
+
+AGGREGATION_SOURCES = ["grid", "streets"]
+# id of the groups: LOR (Planungsraum) and district (Bezirk), the first two digits of the PLR_ID
+AGGREGATION_GROUPS = {"lor": "PLR_ID", "district": "BEZ"}
+DISTRICT_DIGITS = 2
+STAT_PATTERN = r"(mean|min|max|p\d{1,2})"
+STATS_PATTERN = r"^{stat}(,{stat})*$".format(stat=STAT_PATTERN)
+
+
+class Membership():
+    """
+    This class holds the LOR of every feature of a source as index array: grid
+    cells belong to the LOR containing them, streets to the LOR containing the
+    point halfway along them. It is only computed again if the geometries of
+    the source or of the LOR changed.
+    """
+
+    def __init__(self, source_geometries: GeometryStore, lor_geometries: GeometryStore):
+        """
+        :param GeometryStore source_geometries: geometries of the grid cells or streets
+        :param GeometryStore lor_geometries: geometries of the LOR
+        """
+        self.source_geometries = source_geometries
+        self.lor_geometries = lor_geometries
+        # position of the LOR of every feature of the source, -1 outside of all LOR
+        self.lor_rows = lor_geometries.locate(source_geometries.midpoints())
+
+    def is_current(self, source_geometries: GeometryStore, lor_geometries: GeometryStore) -> bool:
+        """Check if the membership was computed from these geometries."""
+        return self.source_geometries is source_geometries and self.lor_geometries is lor_geometries
+
+    def groups(self, lor_ids: np.ndarray, by: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the groups of the features of the source.
+
+        :param np.ndarray lor_ids: PLR_ID of every LOR
+        :param str by: "lor" or "district"
+        :return: id of every group and position of the group of every feature, -1 if it belongs to none
+        """
+        if by == "lor":
+            return lor_ids, self.lor_rows
+
+        district_ids, lor_districts = np.unique(
+            np.array([lor_id[:DISTRICT_DIGITS] for lor_id in lor_ids.tolist()], dtype=str),
+            return_inverse=True,
+        )
+        return district_ids, np.where(self.lor_rows >= 0, lor_districts[np.maximum(self.lor_rows, 0)], -1)
+
+
+def build_memberships(
+    sources: dict[str, FeatureStore],
+    lor: FeatureStore,
+    previous: dict[str, Membership],
+) -> dict[str, Membership]:
+    """
+    Compute the membership of every source, reuse the previous one if the geometries did not change.
+
+    :param dict sources: loaded FeatureStore of every source, e.g. {"grid": ...}
+    :param FeatureStore lor: loaded FeatureStore of the LOR
+    :param dict previous: memberships of the previous snapshot
+    :return: Membership of every source
+    """
+    memberships = {}
+    for name, source in sources.items():
+        membership = previous.get(name)
+        if membership is None or not membership.is_current(source.geometries, lor.geometries):
+            membership = Membership(source.geometries, lor.geometries)
+        memberships[name] = membership
+    return memberships
+
+
+def aggregate(
+    store: FeatureStore,
+    group_ids: np.ndarray,
+    groups: np.ndarray,
+    group_name: str,
+    stats: list[str],
+) -> dict:
+    """
+    Compute statistics of the forecasts of every group, for every forecast value.
+
+    :param FeatureStore store: features of the source (a selection of pollutants and hours)
+    :param np.ndarray group_ids: id of every group
+    :param np.ndarray groups: position of the group of every feature, -1 if it belongs to none
+    :param str group_name: name of the group id, e.g. "PLR_ID"
+    :param list stats: "mean", "min", "max" or percentiles like "p95"
+    :return: forecast range and the statistics <pollutant>_<stat> of every group with members, missing values are None
+    """
+    order = np.argsort(groups, kind="stable")
+    order = order[groups[order] >= 0]
+    member_groups = groups[order]
+    is_group_start = np.ones(len(order), dtype=bool)
+    is_group_start[1:] = member_groups[1:] != member_groups[:-1]
+    group_starts = np.flatnonzero(is_group_start)
+    group_ends = np.append(group_starts[1:], len(order))
+
+    columns = {
+        group_name: group_ids[member_groups[group_starts]].tolist(),
+        "count": (group_ends - group_starts).tolist(),
+    }
+    for name, column in store.values.items():
+        values = column.values[order]
+        if column.horizons is not None:
+            values = np.where(np.arange(values.shape[1]) < column.horizons[order, None], values, np.nan)
+        for stat in stats:
+            columns[f"{name}_{stat}"] = _to_lists(group_statistic(values, group_starts, group_ends, stat))
+
+    forecast_range_name = "forecast_range_" + get_iso_format()["name"]
+    forecast_range = None
+    if forecast_range_name in store.strings and len(order):
+        codes = Counter(store.strings[forecast_range_name].codes[order].tolist())
+        forecast_range = store.strings[forecast_range_name].categories[codes.most_common(1)[0][0]].item()
+
+    return {
+        forecast_range_name: forecast_range,
+        "groups": [dict(zip(columns, group_values)) for group_values in zip(*columns.values())],
+    }
+
+
+def group_statistic(values: np.ndarray, group_starts: np.ndarray, group_ends: np.ndarray, stat: str) -> np.ndarray:
+    """
+    Reduce the forecasts of the members of every group, nan values are ignored.
+
+    :param np.ndarray values: forecasts with shape (members, forecast values), the members of a group one after another
+    :param np.ndarray group_starts: first member of every group
+    :param np.ndarray group_ends: end of the members of every group (exclusive)
+    :param str stat: "mean", "min", "max" or a percentile like "p95"
+    :return: statistic with shape (groups, forecast values), nan if a group has no values
+    """
+    if not len(group_starts):
+        return np.empty((0, values.shape[1]))
+
+    if stat == "max":
+        return np.fmax.reduceat(values, group_starts, axis=0)
+    if stat == "min":
+        return np.fmin.reduceat(values, group_starts, axis=0)
+
+    is_value = ~np.isnan(values)
+    if stat == "mean":
+        sums = np.add.reduceat(np.where(is_value, values, 0), group_starts, axis=0)
+        counts = np.add.reduceat(is_value.astype(np.int64), group_starts, axis=0)
+        return np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+    # percentiles interpolate linearly between the sorted values like numpy's default, every group on its own
+    quantile = int(stat[1:]) / 100
+    percentiles = np.full((len(group_starts), values.shape[1]), np.nan)
+    for group, (start, end) in enumerate(zip(group_starts.tolist(), group_ends.tolist())):
+        # nan values are sorted last
+        sorted_values = np.sort(values[start:end], axis=0)
+        counts = is_value[start:end].sum(axis=0)
+        position = (counts - 1).clip(0) * quantile
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, (counts - 1).clip(0))
+        lower_values = np.take_along_axis(sorted_values, lower[None], axis=0)[0]
+        upper_values = np.take_along_axis(sorted_values, upper[None], axis=0)[0]
+        group_percentiles = lower_values + (upper_values - lower_values) * (position - lower)
+        percentiles[group] = np.where(counts > 0, group_percentiles, np.nan)
+    return percentiles
+
+
+def render_aggregation(source: str, by: str, aggregation: dict) -> bytes:
+    """Encode the statistics of a request as json."""
+    return encode_json({"source": source, "by": by, **aggregation})
+
+
+def _to_lists(array: np.ndarray) -> list[list[float | None]]:
+    """Convert an array to nested lists, nan to None."""
+    return [[None if value != value else value for value in row] for row in array.tolist()]  # noqa: WPS312
@@ -1,76 +1,207 @@
 import asyncio
 import logging
 import os
-import pickle
 import time
 import traceback
 from logging.config import dictConfig
 
+from fairqapi.cache import cache_files
+from fairqapi.cache.aggregation import build_memberships
+from fairqapi.cache.changes import CHANGE_DATASETS, build_change_logs
+from fairqapi.cache.forecast_history import HISTORY_DATASETS, ForecastRun, forecast_history
+from fairqapi.cache.response_cache import EncodedResponse, page_response
 from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.grid_response import GridResponse
+from fairqapi.schemas.lor_response import LorResponse
+from fairqapi.schemas.request import Request
+from fairqapi.schemas.simulation_response import SimulationResponse
+from fairqapi.schemas.stations_response import StationsResponse
+from fairqapi.schemas.streets_response import StreetsResponse
+from fairqapi.tiles.tile_cache import TILE_LAYERS, prerender_tiles
 
 dictConfig(get_logger_config())
 
+CACHE_FILES = [
+    "stations",
+    "grid",
+    "grid_geometry",
+    "streets",
+    "streets_geometry",
+    "lor",
+    "lor_geometry",
+    "simulation",
+    "simulation_geometry",
+]
+
+
+class CacheSnapshot():
+    """
+    This class holds the loaded FeatureStores of all endpoints. A snapshot is never
+    modified after it was built, a reload builds a new one. Requests read the
+    current snapshot once and keep using it, even if it is replaced meanwhile.
+    """
+
+    def __init__(
+        self,
+        stations=None,
+        streets=None,
+        grid=None,
+        lor=None,
+        simulation=None,
+        loaded_at=0,
+        memberships=None,
+        change_logs=None,
+        forecast_runs=None,
+    ):
+        """
+        :param FeatureStore stations: stations, None if not loaded
+        :param FeatureStore streets: streets, None if not loaded
+        :param FeatureStore grid: grid, None if not loaded
+        :param FeatureStore lor: LOR, None if not loaded
+        :param FeatureStore simulation: simulation, None if not loaded
+        :param float loaded_at: time the loading of the snapshot started
+        :param dict memberships: Membership (LOR of every feature) of grid and streets, see aggregation.py
+        :param dict change_logs: ChangeLog of every paged endpoint, see changes.py
+        :param dict forecast_runs: ForecastRun of every dataset loaded for this snapshot, see forecast_history.py
+        """
+        self.stations = stations
+        self.streets = streets
+        self.grid = grid
+        self.lor = lor
+        self.simulation = simulation
+        self.loaded_at = loaded_at
+        self.memberships = memberships or {}
+        self.change_logs = change_logs or {}
+        self.forecast_runs = forecast_runs or {}
+
+    def is_loaded(self):
+        return (
+            self.streets is not None and
+            self.grid is not None and
+            self.stations is not None and
+            self.lor is not None and
+            self.simulation is not None
+        )
+
+
 class Cache():
     """
     This class contains the cached values for all endpoints. It also
     contains functionality to update the cached values if the files in the storage
-    are updated
+    are updated. The values are validated against the response models when they
+    are loaded and kept in columns (see FeatureStore). Geometries that are stored
+    in separate files are only reloaded if their file changed.
+
+    Modified files are loaded in a worker thread into a new CacheSnapshot, which then
+    replaces the current one with a single assignment. The event loop keeps serving
+    requests from the previous snapshot while a reload runs. The forecast history
+    is only updated after the new snapshot replaced the current one.
     """
 
     def __init__(self):
-        self.last_cache_update = 0
-        self.stations = None
-        self.streets = None
-        self.grid = None
-        self.lor = None
-        self.simulation = None
+        self.snapshot = CacheSnapshot()
+        self.geometry_files = {}
+        # False if a supervisor process reloads the cache for its workers, see fairqapi.serve
+        self.reload_periodically = True
         self.load_cache_files()
 
+    @property
+    def last_cache_update(self):
+        return self.snapshot.loaded_at
 
     def load_cache_files(self):
+        """load modified files and replace the current snapshot"""
+        self.swap_snapshot(self.build_snapshot())
+
+    def swap_snapshot(self, snapshot):
+        """replace the current snapshot, then add the runs of its reloaded datasets to the forecast history"""
+        self.snapshot = snapshot
+        for dataset, run in snapshot.forecast_runs.items():
+            forecast_history.add_run(dataset, run)
+
+    def build_snapshot(self):
+        """
+        build a new snapshot from the current one, loading every modified file
+        """
         logging.info("Loading cached files into memory")
+        snapshot = self.snapshot
+        loaded_at = time.time()
 
+        stations = snapshot.stations
         if self.update_needed("stations"):
             logging.debug("Updating stations")
-            self.stations = self.load_stations()
+            stations = self.load_stations()
         else:
             logging.debug("No update needed for stations")
 
-        if self.update_needed("grid"):
+        grid = snapshot.grid
+        if self.update_needed("grid") or self.update_needed("grid_geometry"):
             logging.debug("Updating grid")
-            self.grid = self.load_grid()
+            grid = self.load_grid()
         else:
             logging.debug("No update needed for grid")
 
-        if self.update_needed("streets"):
+        streets = snapshot.streets
+        if self.update_needed("streets") or self.update_needed("streets_geometry"):
             logging.debug("Updating streets")
-            self.streets = self.load_streets()
+            streets = self.load_streets()
         else:
             logging.debug("No update needed for streets")
 
-        if self.update_needed("lor"):
+        lor = snapshot.lor
+        if self.update_needed("lor") or self.update_needed("lor_geometry"):
             logging.debug("Updating LOR")
-            self.lor = self.load_lor()
+            lor = self.load_lor()
         else:
             logging.debug("No update needed for LOR")
 
-        if self.update_needed("simulation"):
+        simulation = snapshot.simulation
+        if self.update_needed("simulation") or self.update_needed("simulation_geometry"):
             logging.debug("Updating simulation")
-            self.simulation = self.load_simulation()
+            simulation = self.load_simulation()
         else:
             logging.debug("No update needed for simulation")
 
-        self.last_cache_update = time.time()
+        memberships = {}
+        if grid is not None and streets is not None and lor is not None:
+            # the LOR of every grid cell and street, computed again only if their geometries changed
+            memberships = build_memberships({"grid": grid, "streets": streets}, lor, snapshot.memberships)
 
-    def cache_is_loaded(self):
-        return (
-            self.streets is not None and
-            self.grid is not None and
-            self.stations is not None and
-            self.lor is not None and
-            self.simulation is not None
+        # the features that changed since the previous snapshot, only reloaded datasets are compared
+        loaded = {"stations": stations, "streets": streets, "grid": grid, "lor": lor, "simulation": simulation}
+        change_logs = build_change_logs(
+            {name: loaded[name] for name in CHANGE_DATASETS},
+            {name: getattr(snapshot, name) for name in CHANGE_DATASETS},
+            snapshot.change_logs,
         )
 
+        # added to the forecast history once the snapshot replaced the current one, see swap_snapshot
+        forecast_runs = {}
+        if forecast_history.max_runs > 0:
+            forecast_runs = {
+                name: ForecastRun(loaded[name])
+                for name in HISTORY_DATASETS
+                if loaded[name] is not None and loaded[name] is not getattr(snapshot, name)
+            }
+
+        return CacheSnapshot(
+            stations, streets, grid, lor, simulation, loaded_at, memberships, change_logs, forecast_runs,
+        )
+
+    def updates_available(self):
+        """check if any cache file was modified since the current snapshot was loaded"""
+        return any(self.update_needed(filename) for filename in CACHE_FILES)
+
+    def cache_is_loaded(self):
+        return self.snapshot.is_loaded()
+
+    async def reload(self):
+        """
+        load modified files in a worker thread and swap in the new snapshot, the
+        event loop is not blocked meanwhile
+        """
+        self.swap_snapshot(await asyncio.to_thread(self.build_snapshot))
+
     async def load_cache_files_loop(self):
         """
         reload cache files every minute if updated
@@ -79,7 +210,7 @@ class Cache():
             try:
                 await asyncio.sleep(60)
 
-                self.load_cache_files()
+                await self.reload()
             except Exception as e:
                 logging.error("Something went wrong when loading cache files")
                 logging.error(traceback.format_exc())
@@ -87,31 +218,86 @@ class Cache():
 
     def update_needed(self, filename):
         """
-        check if file was modified since last cache update
+        check if file exists and was modified since last cache update
         """
-        last_modification = os.path.getmtime(f"cache/{filename}.pickle")
+        path = cache_files.cache_file_path(filename)
+        if path is None:
+            return False
+
+        last_modification = os.path.getmtime(path)
 
         return last_modification > self.last_cache_update
 
     def load_stations(self):
-        return self.load_cache_file("stations")
+        return self.load_feature_store("stations", StationsResponse)
 
     def load_grid(self):
-        return self.load_cache_file("grid")
+        return self.load_feature_store("grid", GridResponse)
 
     def load_streets(self):
-        return self.load_cache_file("streets")
+        return self.load_feature_store("streets", StreetsResponse)
 
     def load_lor(self):
-        return self.load_cache_file("lor")
+        return self.load_feature_store("lor", LorResponse)
 
     def load_simulation(self):
-        return self.load_cache_file("simulation")
+        return self.load_feature_store("simulation", SimulationResponse)
+
+    def load_feature_store(self, filename, response_model):
+        """
+        load a FeatureStore, join it to its geometry file if necessary, validate it, stack the simulation
+        forecasts, build its spatial index, compress its default page and render its tiles of the common zoom levels
+        """
+        feature_store = self.load_cache_file(filename)
+        version = self.file_version(filename)
+
+        if feature_store.geometries is None:
+            geometry_file = self.load_geometry_file(f"{filename}_geometry")
+            feature_store = feature_store.with_geometries(
+                geometry_file["ids"], geometry_file["geometries"], geometry_file.get("simplified"),
+            )
+            version = max(version, self.file_version(f"{filename}_geometry"))
+
+        # the cursors of the paged endpoints continue after an id
+        feature_store = feature_store.sort_by_id().validate(response_model)
+        if filename == "simulation":
+            feature_store = feature_store.with_simulation_tensor()
+        feature_store.version = version
+        # build the spatial index now instead of on the first bbox request, geometries loaded
+        # from an unchanged geometry file keep their index
+        feature_store.geometries.spatial_index
+        # stations are not paginated, the other endpoints are mostly requested with the default page
+        default_page = page_response(filename, feature_store, None if filename == "stations" else Request())
+        if isinstance(default_page, EncodedResponse):
+            # compressed in this worker thread, requests only compress the variants of other pages
+            default_page.precompress()
+        if filename in TILE_LAYERS:
+            prerender_tiles(filename, feature_store)
+
+        return feature_store
+
+    def load_geometry_file(self, filename):
+        """
+        load a geometry file, reuse the loaded one if the file was not modified
+        """
+        if filename not in self.geometry_files or self.update_needed(filename):
+            logging.debug(f"Loading {filename}")
+            self.geometry_files[filename] = self.load_cache_file(filename)
+
+        return self.geometry_files[filename]
+
+    @staticmethod
+    def file_version(filename):
+        """
+        version of a cache file, its modification time in nanoseconds. It is the same
+        in every worker and increases with every update of the file.
+        """
+        return os.stat(cache_files.cache_file_path(filename)).st_mtime_ns
 
     @staticmethod
     def load_cache_file(filename):
-        with open(f"cache/{filename}.pickle", "rb") as handle:
-           return pickle.load(handle)
+        """load a cache file, its arrays are memory mapped and shared with the other workers"""
+        return cache_files.load_cache_file(filename)
 
 
 # initialize cache to be used everywhere
@@ -0,0 +1,153 @@
+"""
+Reading and writing cache files.
+
+A cache file <name> consists of a small json index (cache/<name>.json) and a
+directory of .npy blocks (cache/<name>.<stamp>/), one per numpy array. The index
+holds everything else (classes, strings, numbers) and references the blocks. The
+blocks are memory mapped read-only, so all worker processes share the same pages
+of the page cache instead of holding their own unpickled copy.
+
+Files written before this format (cache/<name>.pickle) are still read if there is no index,
+including the GeoJSON FeatureCollections written before the FeatureStores.
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+
+CACHE_DIR = "cache"
+FORMAT_VERSION = 1
+
+# classes that may be stored in a cache file, restored without calling __init__
+STORED_CLASSES = {cls.__name__: cls for cls in [FeatureStore, GeometryStore, StringColumn, ValueColumn]}
+# attributes computed after loading, never stored
+TRANSIENT_ATTRIBUTES = {"spatial_index"}
+
+
+def index_path(filename: str) -> str:
+    return os.path.join(CACHE_DIR, f"{filename}.json")
+
+
+def pickle_path(filename: str) -> str:
+    return os.path.join(CACHE_DIR, f"{filename}.pickle")
+
+
+def cache_file_path(filename: str) -> str | None:
+    """
+    Return the path whose modification marks an update of a cache file.
+
+    :param str filename: name of the cache file, e.g. "grid_geometry"
+    :return: path of the index, of the pickle if there is no index, None if neither exists
+    """
+    for path in [index_path(filename), pickle_path(filename)]:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def save_cache_file(data, filename: str):
+    """
+    Write a cache file. The blocks are written first, the index is replaced atomically
+    afterwards, so readers see either the previous or the new version.
+
+    :param data: FeatureStore or dict/list of FeatureStores, GeometryStores, numpy arrays and json values
+    :param str filename: name of the cache file
+    """
+    previous_blocks = None
+    if os.path.exists(index_path(filename)):
+        with open(index_path(filename)) as handle:
+            previous_blocks = json.load(handle)["blocks"]
+
+    blocks = f"{filename}.{time.time_ns()}"
+    os.makedirs(os.path.join(CACHE_DIR, blocks))
+    arrays = []
+    index = {"format": FORMAT_VERSION, "blocks": blocks, "data": _encode(data, arrays)}
+    for position, array in enumerate(arrays):
+        np.save(os.path.join(CACHE_DIR, blocks, f"{position}.npy"), array, allow_pickle=False)
+
+    temporary_path = f"{index_path(filename)}.tmp"
+    with open(temporary_path, "w") as handle:
+        json.dump(index, handle)
+    os.replace(temporary_path, index_path(filename))
+
+    # readers may still open the blocks of the previous version, older ones are removed
+    for entry in os.listdir(CACHE_DIR):
+        is_block_directory = entry.startswith(f"{filename}.") and entry[len(filename) + 1:].isdigit()
+        if is_block_directory and entry not in {blocks, previous_blocks}:
+            shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+    if os.path.exists(pickle_path(filename)):
+        os.remove(pickle_path(filename))
+
+
+def load_cache_file(filename: str):
+    """
+    Read a cache file, its arrays are memory mapped read-only.
+
+    :param str filename: name of the cache file
+    :return: the stored data, None if the file does not exist
+    """
+    if os.path.exists(index_path(filename)):
+        with open(index_path(filename)) as handle:
+            index = json.load(handle)
+        if index["format"] != FORMAT_VERSION:
+            raise ValueError(
+                "Cache file '{}' has format {}, expected {}.".format(filename, index["format"], FORMAT_VERSION),
+            )
+        return _decode(index["data"], os.path.join(CACHE_DIR, index["blocks"]))
+
+    if os.path.exists(pickle_path(filename)):
+        with open(pickle_path(filename), "rb") as handle:
+            data = pickle.load(handle)
+        if isinstance(data, dict) and data.get("type") == "FeatureCollection":
+            return FeatureStore.from_geojson(data)
+        return data
+
+    return None
+
+
+def _encode(data, arrays: list):
+    """Convert data to json values, numpy arrays are appended to arrays and referenced by position."""
+    if isinstance(data, np.ndarray):
+        if data.dtype == object:
+            raise ValueError("Arrays of python objects can not be memory mapped, convert them with to_numpy.")
+        arrays.append(data)
+        return {"array": len(arrays) - 1}
+    if type(data) in STORED_CLASSES.values():
+        attributes = {
+            name: _encode(attribute, arrays)
+            for name, attribute in vars(data).items()
+            if name not in TRANSIENT_ATTRIBUTES
+        }
+        return {"class": type(data).__name__, "attributes": attributes}
+    if isinstance(data, dict):
+        return {"dict": [[key, _encode(item, arrays)] for key, item in data.items()]}
+    if isinstance(data, (list, tuple)):
+        return {type(data).__name__: [_encode(item, arrays) for item in data]}
+    if isinstance(data, np.generic):
+        return {"value": data.item()}
+    return {"value": data}
+
+
+def _decode(encoded: dict, blocks_path: str):
+    """Restore data encoded by _encode."""
+    if "array" in encoded:
+        path = os.path.join(blocks_path, "{}.npy".format(encoded["array"]))
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    if "class" in encoded:
+        stored = STORED_CLASSES[encoded["class"]].__new__(STORED_CLASSES[encoded["class"]])
+        attributes = encoded["attributes"].items()
+        vars(stored).update({name: _decode(attribute, blocks_path) for name, attribute in attributes})
+        return stored
+    if "dict" in encoded:
+        return {key: _decode(item, blocks_path) for key, item in encoded["dict"]}
+    if "list" in encoded:
+        return [_decode(item, blocks_path) for item in encoded["list"]]
+    if "tuple" in encoded:
+        return tuple(_decode(item, blocks_path) for item in encoded["tuple"])
+    return encoded["value"]
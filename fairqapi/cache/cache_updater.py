@@ -1,124 +1,298 @@
+import datetime
 import logging
-import pickle
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from logging.config import dictConfig
 
+import numpy as np
+import pandas as pd
+
+from fairqapi.cache import cache_files
+from fairqapi.cache.feature_store import FeatureStore, FeatureStoreBuilder, to_numpy
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.cache.queries import forecast_query
+from fairqapi.cache.simplification import simplify_levels
 from fairqapi.db.db_connect import db_connect
-from fairqapi.internal.data_utils import get_property_cols, transform_raw_data
-from fairqapi.internal.json_utils import df_to_geojson
+from fairqapi.internal.data_utils import get_property_cols
+from fairqapi.internal.stopwatch import StageTimings
 from fairqapi.logging_config.logger_config import get_logger_config
 
 dictConfig(get_logger_config())
 
+# rows are fetched again if they are at most this much older than the newest row of the previous refresh,
+# so rows of a forecast run that was still being inserted are not missed
+REFRESH_OVERLAP = datetime.timedelta(hours=2)
+# seconds after which all forecasts are queried again instead of only new or changed rows
+FULL_REFRESH_INTERVAL = 24 * 3600
+# memory for the queried rows of all datasets updated at the same time, the block size is derived from it
+MEMORY_BUDGET = int(os.getenv("CACHE_UPDATE_MEMORY_BYTES", 2 * 1024 ** 3))
+# rows of the first block of a query, used to estimate the memory of a row
+FIRST_BLOCK_ROWS = 1000
+# a block is held as python rows, as data frame and as encoded columns at the same time
+BLOCK_COPIES = 3
+
 
 class CacheUpdater():
     """
-    This class updates the cache files with data from the clickhouse database
+    This class updates the cache files with data from the clickhouse database.
+
+    Geometries of grid, streets, LOR and simulation hardly ever change. They are
+    saved in separate files (<endpoint>_geometry) which are only rebuilt if the
+    checksum of the geometries in the database changed. The hourly update only
+    queries the forecasts, the cache joins them to the geometries by id. Lines
+    and polygons are also saved in simplified levels (see simplification.py).
+
+    Forecasts are refreshed incrementally: the newest date_time_forecast of a
+    table is its high-water mark (saved in <endpoint>_refresh). Only rows computed
+    since the previous refresh are queried and merged into the stored forecasts by
+    id. All rows are queried again once a day and whenever the number of rows in
+    the table and in the merged forecasts differ (e.g. deleted rows).
+
+    The datasets are updated at the same time, each in its own thread with its
+    own connection. Clickhouse selects and formats only the columns of the
+    responses (see queries.py). Queries are streamed in blocks which are written
+    into column arrays allocated for the row count of the table (see
+    FeatureStoreBuilder), so only a few blocks of rows are in memory at once
+    besides the columns of the result. The block size is chosen to keep all
+    datasets within the memory budget.
     """
 
-    def __init__(self):
+    def __init__(self, memory_budget=MEMORY_BUDGET):
         # after how many seconds should cache invalidate?
         self.cache_invalidation_time = 3600
+        self.memory_budget = memory_budget
+        self.updates = {
+            "stations": self.update_stations_file,
+            "grid": self.update_grid_file,
+            "streets": self.update_streets_file,
+            "lor": self.update_lor_file,
+            "simulation": self.update_simulation_file,
+        }
+        self.timings = StageTimings()
 
     def update_cache_files(self):
         """
-        Update all files (stations, grid, streets) regularly. The schedule
-        is defined by self.cache_invalidation_time
+        Update all files (stations, grid, streets, LOR, simulation) at the same time
+        and log how long each stage took. The schedule is defined by
+        self.cache_invalidation_time
         """
+        self.timings = StageTimings()
+
+        with ThreadPoolExecutor(max_workers=len(self.updates)) as executor:
+            futures = {name: executor.submit(update) for name, update in self.updates.items()}
+
+        failed = []
+        for name, future in futures.items():
+            if future.exception() is not None:
+                logging.error(f"Updating {name} failed", exc_info=future.exception())
+                failed.append(name)
 
-        logging.info("Updating stations")
-        self.update_stations_file()
+        logging.info("Cache update timings:\n{}".format(self.timings.report()))
+        if failed:
+            raise RuntimeError("Updating {} failed".format(", ".join(failed)))
 
-        logging.info("Updating grid")
-        self.update_grid_file()
+    def query_blocks(self, task, query, params=None):
+        """
+        Stream the result of a query as data frames of at most a few thousand rows.
+
+        :param str task: name of the dataset, used for the timings
+        :param str query: select query
+        :param dict params: query parameters
+        :return: generator of data frames, at least one (possibly empty)
+        """
+        with db_connect() as db:
+            with self.timings.stage(task, "query"):
+                rows = db.execute_iter(query, params, with_column_types=True)
+                column_names = [name for name, _ in next(rows)]
+                block = list(islice(rows, FIRST_BLOCK_ROWS))
 
-        logging.info("Updating streets")
-        self.update_streets_file()
+            block_rows = self.block_rows(block)
+            first = True
+            while block or first:
+                yield pd.DataFrame.from_records(block, columns=column_names)
 
-        logging.info("Updating LOR")
-        self.update_lor_file()
+                first = False
+                with self.timings.stage(task, "query"):
+                    block = list(islice(rows, block_rows))
 
-        logging.info("Updating simulation")
-        self.update_simulation_file()
+    def block_rows(self, block):
+        """number of rows per block, so that the blocks of all datasets fit into the memory budget"""
+        if not block:
+            return FIRST_BLOCK_ROWS
+        budget = self.memory_budget // len(self.updates) // BLOCK_COPIES
+        return max(FIRST_BLOCK_ROWS, budget // estimate_row_bytes(block))
 
     @staticmethod
     def save_cache_file(data, filename):
-        with open(f"cache/{filename}.pickle", "wb") as handle:
-            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        """save data as memory mappable cache file, see cache_files"""
+        cache_files.save_cache_file(data, filename)
 
-    def update_stations_file(self):
-        """get data for stations endpoint."""
+    @staticmethod
+    def load_cache_file(filename):
+        return cache_files.load_cache_file(filename)
+
+    def update_geometry_file(self, endpoint, id_col, geometry_cols, geometry_type):
+        """
+        Rebuild the geometry file of an endpoint if the geometries in the database changed.
+        Lines and polygons are simplified in all levels, files without the levels are rebuilt once.
+
+        :param str endpoint: name of the endpoint, the table is api_<endpoint>
+        :param str id_col: column identifying a feature, e.g. "element_nr"
+        :param list geometry_cols: ["x", "y"] for Points, else ["geometry"]
+        :param str geometry_type: geojson geometry type of the endpoint
+        """
+        columns = ", ".join([id_col, *geometry_cols])
         with db_connect() as db:
-            stations_df_raw = db.query_dataframe("select * from api_stations final;")
+            checksum = tuple(
+                int(value) for value in db.execute(
+                    f"select count(), groupBitXor(cityHash64({columns})) from api_{endpoint} final;",
+                )[0]
+            )
 
-        stations_df = transform_raw_data(stations_df_raw, endpoint="stations", forecast_interval_in_hours=1)
+        stored = self.load_cache_file(f"{endpoint}_geometry")
+        has_levels = geometry_type == "Point" or (stored is not None and "simplified" in stored)
+        if stored is not None and stored["checksum"] == checksum and has_levels:
+            logging.info(f"Geometries of {endpoint} are unchanged")
+            return
 
-        stations_geojson = df_to_geojson(stations_df, get_property_cols("stations"))
+        logging.info(f"Updating geometries of {endpoint}")
+        ids = []
+        geometries = []
+        query = f"select {columns} from api_{endpoint} final order by {id_col};"
+        for geometry_df in self.query_blocks(endpoint, query):
+            with self.timings.stage(endpoint, "encode"):
+                ids.append(to_numpy(geometry_df[id_col]))
+                geometries.append(GeometryStore.from_frame(geometry_df, geometry_type))
 
-        self.save_cache_file(stations_geojson, "stations")
+        with self.timings.stage(endpoint, "merge"):
+            ids = np.concatenate(ids)
+            geometries = GeometryStore.concat(geometries)
+            order = np.argsort(ids, kind="stable")
+            geometry_file = {"checksum": checksum, "ids": ids[order], "geometries": geometries.take(order)}
 
-    def update_grid_file(self):
-        """get data for grid endpoint."""
+        if geometry_type != "Point":
+            with self.timings.stage(endpoint, "simplify"):
+                geometry_file["simplified"] = simplify_levels(geometry_file["geometries"])
+
+        with self.timings.stage(endpoint, "save"):
+            self.save_cache_file(geometry_file, f"{endpoint}_geometry")
+
+    def update_forecasts(self, endpoint):
+        """
+        Refresh the forecasts (without geometries) of an endpoint, only new or changed rows are queried.
+
+        :param str endpoint: name of the endpoint, the table is api_<endpoint>
+        """
         with db_connect() as db:
-            grid_df_raw = db.query_dataframe(
-                "select * from api_grid final;",
-            )
+            row_count, high_water_mark = db.execute(
+                f"select count(), max(date_time_forecast) from api_{endpoint} final;",
+            )[0]
+
+        stored = self.load_cache_file(endpoint)
+        refresh = self.load_cache_file(f"{endpoint}_refresh")
+        full_refresh = (
+            stored is None or
+            refresh is None or
+            time.time() - refresh["full_refresh_at"] > FULL_REFRESH_INTERVAL
+        )
 
-        grid_df_raw.sort_values(by=["date_time_forecast", "x", "y"], inplace=True)
-        grid_df = transform_raw_data(grid_df_raw, endpoint="grid", forecast_interval_in_hours=1)
+        if not full_refresh and refresh["high_water_mark"] == high_water_mark.isoformat() and len(stored) == row_count:
+            logging.info(f"Forecasts of {endpoint} are unchanged")
+            return
 
-        grid_geojson = df_to_geojson(grid_df, get_property_cols("grid"))
+        if not full_refresh:
+            since = datetime.datetime.fromisoformat(refresh["high_water_mark"]) - REFRESH_OVERLAP
+            logging.info(f"Querying forecasts of {endpoint} computed since {since}")
+            newer = self.query_forecasts(endpoint, since)
+            with self.timings.stage(endpoint, "merge"):
+                forecast_store = stored.update(newer)
+            if len(forecast_store) != row_count:
+                logging.info(f"Rows of {endpoint} were deleted, querying all forecasts")
+                full_refresh = True
 
-        self.save_cache_file(grid_geojson, "grid")
+        if full_refresh:
+            forecast_store = self.query_forecasts(endpoint, expected_rows=row_count)
+            refresh = {"full_refresh_at": time.time()}
 
-    def update_streets_file(self):
-        """get data for streets endpoint."""
-        with db_connect() as db:
-            streets_df_raw = db.query_dataframe(
-                "select * from api_streets final;",
-            )
+        with self.timings.stage(endpoint, "save"):
+            self.save_cache_file(forecast_store, endpoint)
+            # saved after the forecasts, if saving fails the rows are queried again next time
+            refresh["high_water_mark"] = high_water_mark.isoformat()
+            self.save_cache_file(refresh, f"{endpoint}_refresh")
 
-        streets_df_raw.sort_values(by=["date_time_forecast", "element_nr"], inplace=True)
-        streets_df = transform_raw_data(streets_df_raw, endpoint="streets", forecast_interval_in_hours=1)
+    def query_forecasts(self, endpoint, since=None, expected_rows=0):
+        """
+        query the formatted forecasts (without geometries) of an endpoint.
 
-        streets_geojson = df_to_geojson(
-            streets_df,
-            get_property_cols("streets"),
-            geometry_type="LineString",
-        )
+        :param str endpoint: name of the endpoint, the table is api_<endpoint>
+        :param datetime.datetime since: only query rows with a date_time_forecast from this time on, None for all rows
+        :param int expected_rows: number of rows of the table, if all rows are queried
+        :return: FeatureStore without geometries
+        """
+        if since is None:
+            return self.query_feature_store(endpoint, forecast_query(endpoint), None, expected_rows=expected_rows)
+        return self.query_feature_store(endpoint, forecast_query(endpoint, since=True), {"since": since})
 
-        self.save_cache_file(streets_geojson, "streets")
+    def query_feature_store(self, endpoint, query, params, geometry_type=None, expected_rows=0):
+        """
+        Stream a query of formatted properties (see queries.forecast_query) into a FeatureStore, block by block.
 
-    def update_lor_file(self):
-        """get data for lor endpoint."""
-        with db_connect() as db:
-            lor_df_raw = db.query_dataframe(
-                "select * from api_lor final;",
-            )
+        :param str endpoint: name of the endpoint
+        :param str query: select query
+        :param dict params: query parameters
+        :param str geometry_type: geojson geometry type if the query contains the geometries, else None
+        :param int expected_rows: number of rows the columns are allocated for, they grow if more rows arrive
+        :return: FeatureStore sorted by id
+        """
+        builder = FeatureStoreBuilder(expected_rows)
+        for df in self.query_blocks(endpoint, query, params):
+            with self.timings.stage(endpoint, "encode"):
+                geometries = None if geometry_type is None else GeometryStore.from_frame(df, geometry_type)
+                builder.append(FeatureStore.from_frame(df, get_property_cols(endpoint), geometries))
 
-        lor_df_raw.sort_values(by=["date_time_forecast", "PLR_ID"], inplace=True)
-        lor_df = transform_raw_data(lor_df_raw, endpoint="lor", forecast_interval_in_hours=24)
+        with self.timings.stage(endpoint, "merge"):
+            return builder.build()
 
-        lor_geojson = df_to_geojson(
-            lor_df,
-            get_property_cols("lor"),
-            geometry_type="MultiPolygon",
+    def update_stations_file(self):
+        """get data for stations endpoint."""
+        stations_store = self.query_feature_store(
+            "stations", forecast_query("stations", point_cols=("x", "y")), None, geometry_type="Point",
         )
 
-        self.save_cache_file(lor_geojson, "lor")
+        with self.timings.stage("stations", "save"):
+            self.save_cache_file(stations_store, "stations")
+
+    def update_grid_file(self):
+        """get data for grid endpoint."""
+        self.update_geometry_file("grid", "id", ["x", "y"], "Point")
+        self.update_forecasts("grid")
+
+    def update_streets_file(self):
+        """get data for streets endpoint."""
+        self.update_geometry_file("streets", "element_nr", ["geometry"], "LineString")
+        self.update_forecasts("streets")
+
+    def update_lor_file(self):
+        """get data for lor endpoint."""
+        self.update_geometry_file("lor", "PLR_ID", ["geometry"], "MultiPolygon")
+        self.update_forecasts("lor")
 
     def update_simulation_file(self):
         """get data for simulation endpoint"""
-        with db_connect() as db:
-            simulation_df_raw = db.query_dataframe(
-                "select * from api_simulation final;"
-            )
-        simulation_df_raw.sort_values(by=["date_time_forecast", "element_nr"], inplace=True)
-        simulation_df = transform_raw_data(simulation_df_raw, endpoint="simulation", forecast_interval_in_hours=24)
+        self.update_geometry_file("simulation", "element_nr", ["geometry"], "LineString")
+        self.update_forecasts("simulation")
 
-        simulation_geojson = df_to_geojson(
-            simulation_df,
-            get_property_cols("simulation"),
-            geometry_type="LineString",
-        )
 
-        self.save_cache_file(simulation_geojson, "simulation")
+def estimate_row_bytes(rows):
+    """estimate the memory of a queried row as python objects, including the items of arrays"""
+    sample = rows[:100]
+    total = 0
+    for row in sample:
+        for value in row:
+            total += sys.getsizeof(value)
+            if isinstance(value, (list, tuple)):
+                total += sum(sys.getsizeof(item) for item in value)
+    return max(total // len(sample), 1)
@@ -0,0 +1,292 @@
+"""
+Changes of the paged datasets between the versions of the cache.
+
+When the Cache reloads a dataset it compares the new FeatureStore with the
+previous one (diff) and appends the changed and removed ids to the ChangeLog
+of the dataset. A client that knows the features of a version only fetches
+the features that changed since then.
+"""
+import os
+from bisect import bisect_right
+from typing import Iterator
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn, encode_json
+
+CHANGE_DATASETS = ["streets", "grid", "lor", "simulation"]
+# versions of a dataset whose changes are kept
+CHANGES_MAX_VERSIONS = int(os.getenv("CHANGES_MAX_VERSIONS", 24))
+
+
+def diff(previous: FeatureStore, current: FeatureStore) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compare two versions of a dataset feature by feature.
+
+    :param FeatureStore previous: previous version, sorted by id
+    :param FeatureStore current: current version, sorted by id
+    :return: ids of the features that are new or whose properties or geometry changed, ids of the removed features
+    """
+    rows, found = _find(previous.ids, current.ids)
+    _, kept = _find(current.ids, previous.ids)
+    changed = ~found
+    current_rows, previous_rows = np.flatnonzero(found), rows[found]
+    changed[current_rows] |= rows_differ(previous, previous_rows, current, current_rows)
+    return current.ids[changed], previous.ids[~kept]
+
+
+def rows_differ(
+    previous: FeatureStore,
+    previous_rows: np.ndarray,
+    current: FeatureStore,
+    current_rows: np.ndarray,
+) -> np.ndarray:
+    """
+    Compare the features with the same ids in two versions of a dataset.
+
+    :param FeatureStore previous: previous version
+    :param np.ndarray previous_rows: positions of the compared features in the previous version
+    :param FeatureStore current: current version
+    :param np.ndarray current_rows: positions of the same features in the current version
+    :return: boolean array, True for the features whose properties or geometry changed
+    """
+    if previous.property_names != current.property_names:
+        return np.ones(len(current_rows), dtype=bool)
+
+    differ = np.zeros(len(current_rows), dtype=bool)
+    for name, column in current.strings.items():
+        differ |= _strings_differ(previous.strings[name], previous_rows, column, current_rows)
+    for name, column in current.values.items():
+        differ |= _values_differ(previous.values[name], previous_rows, column, current_rows)
+    if previous.geometries is not current.geometries:
+        differ |= current.geometries.take(current_rows).differs(previous.geometries.take(previous_rows))
+    return differ
+
+
+class Change():
+    """This class holds the ids that changed between two versions of a dataset."""
+
+    def __init__(self, since: int, version: int, changed_ids: np.ndarray, removed_ids: np.ndarray):
+        """
+        :param int since: previous version
+        :param int version: version after the change
+        :param np.ndarray changed_ids: ids of the new and changed features
+        :param np.ndarray removed_ids: ids of the removed features
+        """
+        self.since = since
+        self.version = version
+        self.changed_ids = changed_ids
+        self.removed_ids = removed_ids
+
+
+class ChangeLog():
+    """
+    This class holds the last changes of a dataset, the oldest first. Changes
+    since a version are known if the version is not older than the first
+    version of the log. A version between two versions of the log has the
+    changes of the older one, the dataset did not change in between.
+    """
+
+    def __init__(self, first_version: int, changes: list[Change] | None = None):
+        """
+        :param int first_version: oldest version the changes are known since
+        :param list changes: changes after the first version, the oldest first
+        """
+        self.first_version = first_version
+        self.changes = changes or []
+
+    @property
+    def version(self) -> int:
+        """The current version."""
+        if self.changes:
+            return self.changes[-1].version
+        return self.first_version
+
+    @property
+    def versions(self) -> list[int]:
+        """The versions of the log, the oldest first."""
+        return [self.first_version, *[change.version for change in self.changes]]
+
+    def known_version(self, version: int) -> int | None:
+        """
+        Return the newest version of the log that is not newer than a version, the changes since both are the same.
+
+        :param int version: version the client knows
+        :return: version of the log, None if the version is older than the log
+        """
+        if version < self.first_version:
+            return None
+        versions = self.versions
+        return versions[bisect_right(versions, version) - 1]
+
+    def count_since(self, version: int) -> int:
+        """
+        Count the changed ids after a version, an id changed in several versions is counted once per version.
+
+        :param int version: version the client knows
+        :return: upper bound of the number of features changed since the version
+        """
+        return sum(len(change.changed_ids) for change in self.changes if change.version > version)
+
+    def with_change(
+        self,
+        previous: FeatureStore,
+        current: FeatureStore,
+        max_versions: int = CHANGES_MAX_VERSIONS,
+    ) -> "ChangeLog":
+        """
+        Return the log with the changes of a reloaded dataset.
+
+        :param FeatureStore previous: previous version of the dataset
+        :param FeatureStore current: reloaded version of the dataset
+        :param int max_versions: number of changes kept, the oldest are dropped
+        :return: new ChangeLog
+        """
+        if max_versions <= 0:
+            return ChangeLog(current.version)
+        changes = [*self.changes, Change(previous.version, current.version, *diff(previous, current))]
+        changes = changes[-max_versions:]
+        return ChangeLog(changes[0].since, changes)
+
+    def since(self, version: int, current: FeatureStore) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Collect the changes after a version.
+
+        :param int version: version the client knows
+        :param FeatureStore current: current version of the dataset, sorted by id
+        :return: positions of the features changed since the version in the current store and the ids of
+            the removed features, None if the changes since the version are not known
+        """
+        if version < self.first_version:
+            return None
+
+        changes = [change for change in self.changes if change.version > version]
+        changed_ids = np.unique(np.concatenate([current.ids[:0], *[change.changed_ids for change in changes]]))
+        removed_ids = np.unique(np.concatenate([current.ids[:0], *[change.removed_ids for change in changes]]))
+        # features removed and added again are changed, features changed and removed later are removed
+        changed_rows, changed_found = _find(current.ids, changed_ids)
+        _, removed_found = _find(current.ids, removed_ids)
+        return changed_rows[changed_found], removed_ids[~removed_found]
+
+
+def build_change_logs(
+    stores: dict[str, FeatureStore],
+    previous_stores: dict[str, FeatureStore | None],
+    previous_logs: dict[str, ChangeLog],
+) -> dict[str, ChangeLog]:
+    """
+    Update the change log of every dataset, only reloaded datasets are compared.
+
+    :param dict stores: loaded FeatureStore of every dataset, e.g. {"grid": ...}
+    :param dict previous_stores: FeatureStore of every dataset in the previous snapshot, None if it was not loaded
+    :param dict previous_logs: change logs of the previous snapshot
+    :return: ChangeLog of every loaded dataset
+    """
+    change_logs = {}
+    for name, store in stores.items():
+        if store is None:
+            continue
+        previous = previous_stores.get(name)
+        change_log = previous_logs.get(name)
+        if previous is None or change_log is None:
+            change_log = ChangeLog(store.version)
+        elif store is not previous:
+            change_log = change_log.with_change(previous, store)
+        change_logs[name] = change_log
+    return change_logs
+
+
+def iter_changes(
+    store: FeatureStore,
+    rows: np.ndarray,
+    removed_ids: np.ndarray,
+    since: int,
+    geometry: bool,
+    features_per_chunk: int | None = None,
+) -> Iterator[bytes]:
+    """
+    Encode the changed features chunk by chunk as FeatureCollection with the version, the removed ids and the features.
+
+    :param FeatureStore store: current features (a selection of properties)
+    :param np.ndarray rows: positions of the changed features
+    :param np.ndarray removed_ids: ids of the removed features
+    :param int since: version the changes are relative to
+    :param bool geometry: include the geometries, else the geometry of every feature is null
+    :param int features_per_chunk: features built and encoded at once, all if None
+    :return: generator of the utf-8 encoded parts of the FeatureCollection
+    """
+    header = {
+        "type": "FeatureCollection",
+        "version": store.version,
+        "since": since,
+        "removed": removed_ids.tolist(),
+    }
+    yield encode_json(header)[:-1] + b',"features":['
+    chunks = store.iter_page(rows, None, geometry, features_per_chunk)
+    # the header of the page (COLLECTION_HEADER) is replaced by the one above
+    next(chunks)
+    yield from chunks
+
+
+def render_changes(store: FeatureStore, rows: np.ndarray, removed_ids: np.ndarray, since: int, geometry: bool) -> bytes:
+    """
+    Encode the changed features at once, see iter_changes.
+
+    :return: utf-8 encoded FeatureCollection
+    """
+    return b"".join(iter_changes(store, rows, removed_ids, since, geometry))
+
+
+def _find(ids: np.ndarray, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Find keys in sorted ids: the position of every key and whether it was found."""
+    rows = np.searchsorted(ids, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    if len(ids):
+        found = (rows < len(ids)) & (ids[np.minimum(rows, len(ids) - 1)] == keys)
+    return rows, found
+
+
+def _strings_differ(
+    previous: StringColumn,
+    previous_rows: np.ndarray,
+    current: StringColumn,
+    current_rows: np.ndarray,
+) -> np.ndarray:
+    """Compare the strings of the same features in two versions of a column."""
+    return previous.categories[previous.codes[previous_rows]] != current.categories[current.codes[current_rows]]
+
+
+def _values_differ(
+    previous: ValueColumn,
+    previous_rows: np.ndarray,
+    current: ValueColumn,
+    current_rows: np.ndarray,
+) -> np.ndarray:
+    """
+    Compare the forecast lists of the same features in two versions of a column, padding is ignored.
+    Values are compared as they are encoded: float64 written without rounding, so two values are
+    unchanged if their bits are equal, e.g. 0.0 and -0.0 differ and nan equals nan.
+    """
+    previous_values, current_values = previous.values[previous_rows], current.values[current_rows]
+    width = max(previous_values.shape[1], current_values.shape[1])
+    previous_horizons = _horizons(previous, previous_rows)
+    current_horizons = _horizons(current, current_rows)
+    previous_values = np.pad(_as_float64(previous_values), ((0, 0), (0, width - previous_values.shape[1])))
+    current_values = np.pad(_as_float64(current_values), ((0, 0), (0, width - current_values.shape[1])))
+    equal = previous_values.view(np.int64) == current_values.view(np.int64)
+    equal |= np.arange(width) >= current_horizons[:, None]
+    return (previous_horizons != current_horizons) | ~equal.all(axis=1)
+
+
+def _horizons(column: ValueColumn, rows: np.ndarray) -> np.ndarray:
+    """Return the length of the forecast lists of some rows."""
+    if column.horizons is None:
+        return np.full(len(rows), column.values.shape[1])
+    return column.horizons[rows]
+
+
+def _as_float64(values: np.ndarray) -> np.ndarray:
+    """Return values as float64 with every nan the same nan, so equal encoded values have equal bits."""
+    values = values.astype(np.float64)
+    values[np.isnan(values)] = np.nan
+    return values
@@ -0,0 +1,64 @@
+"""Opaque cursors for keyset pagination of the paged endpoints."""
+import base64
+import binascii
+import json
+
+
+class Cursor():
+    """
+    This class points behind the last feature of a page: it holds the id
+    (key) of that feature, its position and the version of the data the
+    page was built from. The next page starts after the key, so pages do not
+    shift if the cache is reloaded during a crawl. The position is only a
+    shortcut for pages of the same version.
+
+    A Cursor is a query parameter type: the token is decoded when the request
+    is validated, malformed tokens are rejected with 422.
+    """
+
+    def __init__(self, version: int, position: int, key: int | str):
+        """
+        :param int version: version of the FeatureStore the page was built from
+        :param int position: position of the last feature of the page in that FeatureStore
+        :param key: id of the last feature of the page, e.g. its "element_nr"
+        """
+        self.version = version
+        self.position = position
+        self.key = key
+
+    def encode(self) -> str:
+        """Return the token of the cursor, url safe base64 without padding."""
+        token = json.dumps([self.version, self.position, self.key], separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(token).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        """
+        Restore a cursor from its token.
+
+        :param str token: token returned by encode
+        :return: Cursor
+        """
+        try:
+            version, position, key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise ValueError("Invalid cursor.")
+        if not isinstance(version, int) or not isinstance(position, int) or not isinstance(key, (int, str)):
+            raise ValueError("Invalid cursor.")
+        return cls(version, position, key)
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, token) -> "Cursor":
+        if isinstance(token, cls):
+            return token
+        if not isinstance(token, str):
+            raise TypeError("Cursor must be a string.")
+        return cls.decode(token)
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict):
+        field_schema.update(type="string", format="cursor")
@@ -0,0 +1,1021 @@
+"""Columnar in-memory storage of the features served by the endpoints."""
+import json
+from typing import Iterator, get_args
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from pydantic.fields import ModelField
+
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.internal.data_utils import get_iso_format, slice_forecast_range
+from fairqapi.internal.gc_utils import paused_gc
+
+COLLECTION_HEADER = b'{"type":"FeatureCollection","features":['
+COLLECTION_TRAILER = b"]}"
+
+
+def encode_json(content) -> bytes:
+    """
+    Encode content the same way fastapi's JSONResponse does.
+
+    :param content: json serializable content
+    :return: utf-8 encoded json
+    """
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class StringColumn():
+    """A column of repeated strings, stored as codes into the distinct values."""
+
+    def __init__(self, categories: np.ndarray, codes: np.ndarray):
+        """
+        :param np.ndarray categories: distinct strings of the column
+        :param np.ndarray codes: position of every row's string in categories
+        """
+        self.categories = categories
+        self.codes = codes
+
+    @classmethod
+    def from_values(cls, values: list) -> "StringColumn":
+        """
+        Factorize a list of strings.
+
+        :param list values: string of every row
+        :return: StringColumn of the values
+        """
+        codes_by_value = {}
+        codes = np.fromiter(
+            (codes_by_value.setdefault(row_value, len(codes_by_value)) for row_value in values),
+            dtype=np.int32,
+            count=len(values),
+        )
+        categories = np.array(list(codes_by_value), dtype=str)
+        return cls(categories, codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def to_list(self, start: int, end: int) -> list[str]:
+        """Return the strings of the rows [start, end)."""
+        return self.categories[self.codes[start:end]].tolist()
+
+    def take(self, rows: np.ndarray) -> "StringColumn":
+        """Select rows by position."""
+        return StringColumn(self.categories, self.codes[rows])
+
+    @classmethod
+    def concat(cls, columns: list["StringColumn"]) -> "StringColumn":
+        """Append the rows of several columns, their categories are merged."""
+        categories = np.unique(np.concatenate([column.categories for column in columns]))
+        codes = np.concatenate(
+            [np.searchsorted(categories, column.categories).astype(np.int32)[column.codes] for column in columns],
+        )
+        return cls(categories, codes)
+
+
+class ValueColumn():
+    """
+    A column of forecast lists, stored as 2-D float array (feature x forecast hour).
+    Shorter lists are padded with nan and their lengths are kept in horizons.
+    """
+
+    def __init__(self, values: np.ndarray, horizons: np.ndarray | None = None):
+        """
+        :param np.ndarray values: forecasts with shape (n_features, forecast hours)
+        :param np.ndarray horizons: length of every feature's forecast, None if all have full length
+        """
+        self.values = values
+        self.horizons = horizons
+
+    @classmethod
+    def from_lists(cls, lists: list) -> "ValueColumn":
+        """Stack a list of forecast lists."""
+        horizons = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+        max_horizon = horizons.max(initial=0)
+        if (horizons == max_horizon).all():
+            return cls(np.array(lists, dtype=np.float64).reshape(len(lists), max_horizon))
+
+        values = np.full((len(lists), max_horizon), np.nan)
+        values[np.arange(max_horizon) < horizons[:, None]] = np.concatenate(lists)
+        return cls(values, horizons)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_list(self, start: int, end: int) -> list[list[float]]:
+        """Return the forecast lists of the rows [start, end)."""
+        rows = self.values[start:end].tolist()
+        if self.horizons is None:
+            return rows
+        return [row[:horizon] for row, horizon in zip(rows, self.horizons[start:end].tolist())]
+
+    def take(self, rows: np.ndarray) -> "ValueColumn":
+        """Select rows by position."""
+        return ValueColumn(self.values[rows], None if self.horizons is None else self.horizons[rows])
+
+    def slice(self, start: int, stop: int) -> "ValueColumn":
+        """Select the forecast hours [start, stop) of all rows, the values are a view."""
+        values = self.values[:, start:stop]
+        if self.horizons is None:
+            return ValueColumn(values)
+        return ValueColumn(values, np.clip(self.horizons - start, 0, values.shape[1]))
+
+    @classmethod
+    def concat(cls, columns: list["ValueColumn"]) -> "ValueColumn":
+        """Append the rows of several columns, narrower columns are padded with nan."""
+        max_horizon = max(column.values.shape[1] for column in columns)
+        values = np.full((sum(len(column) for column in columns), max_horizon), np.nan)
+        horizons = []
+        start = 0
+        for column in columns:
+            width = column.values.shape[1]
+            values[start:start + len(column), :width] = column.values
+            start += len(column)
+            horizons.append(np.full(len(column), width) if column.horizons is None else column.horizons)
+
+        horizons = np.concatenate(horizons).astype(np.int64)
+        if (horizons == max_horizon).all():
+            return cls(values)
+        return cls(values, horizons)
+
+
+class SimulationTensor():
+    """
+    This class holds the forecasts of the simulation as one float array with the
+    shape (element, pollutant, level, forecast value). The ValueColumns
+    <pollutant>_<level> of the simulation are views of it. Forecasts of a
+    traffic reduction between two simulated levels are interpolated linearly,
+    for all elements and forecast values at once.
+    """
+
+    def __init__(
+        self,
+        pollutants: list[str],
+        levels: np.ndarray,
+        values: np.ndarray,
+        horizons: np.ndarray | None = None,
+    ):
+        """
+        :param list pollutants: pollutants in the order of the columns, e.g. ["no2", "pm10", "pm2.5"]
+        :param np.ndarray levels: simulated traffic reduction levels in percent, ascending
+        :param np.ndarray values: forecasts with shape (elements, pollutants, levels, forecast values), padded with nan
+        :param np.ndarray horizons: length of every forecast with shape (elements, pollutants, levels),
+            None if all have full length
+        """
+        self.pollutants = pollutants
+        self.levels = levels
+        self.values = values
+        self.horizons = horizons
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, ValueColumn]) -> "SimulationTensor":
+        """
+        Stack the forecast columns of the simulation.
+
+        :param dict columns: ValueColumns named <pollutant>_<level>, e.g. "pm2.5_30", for every pollutant and level
+        :return: SimulationTensor of the columns
+        """
+        names = {}
+        for name in columns:
+            pollutant, _, level = name.rpartition("_")
+            if not pollutant or not level.isdigit():
+                raise ValueError("Column '{}' is not named <pollutant>_<level>.".format(name))
+            names[(pollutant, int(level))] = name
+
+        pollutants = list(dict.fromkeys(pollutant for pollutant, _ in names))
+        levels = sorted({level for _, level in names})
+        missing = [
+            f"{pollutant}_{level}" for pollutant in pollutants for level in levels if (pollutant, level) not in names
+        ]
+        if missing:
+            raise ValueError("Forecasts {} are missing.".format(missing))
+
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        width = max((column.values.shape[1] for column in columns.values()), default=0)
+        values = np.full((n_rows, len(pollutants), len(levels), width), np.nan)
+        horizons = np.empty((n_rows, len(pollutants), len(levels)), dtype=np.int64)
+        for (pollutant, level), name in names.items():
+            column = columns[name]
+            position = (slice(None), pollutants.index(pollutant), levels.index(level))
+            values[(*position, slice(0, column.values.shape[1]))] = column.values
+            horizons[position] = column.values.shape[1] if column.horizons is None else column.horizons
+
+        if (horizons == width).all():
+            horizons = None
+        return cls(pollutants, np.array(levels), values, horizons)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def columns(self) -> dict[str, ValueColumn]:
+        """Return the forecasts of every pollutant and level as ValueColumns <pollutant>_<level>, views of the array."""
+        return {
+            f"{pollutant}_{level}": self.column(pollutant_position, level_position)
+            for pollutant_position, pollutant in enumerate(self.pollutants)
+            for level_position, level in enumerate(self.levels.tolist())
+        }
+
+    def column(self, pollutant_position: int, level_position: int) -> ValueColumn:
+        """Return the forecasts of one pollutant and simulated level, the values are a view."""
+        values = self.values[:, pollutant_position, level_position]
+        if self.horizons is None:
+            return ValueColumn(values)
+        return ValueColumn(values, self.horizons[:, pollutant_position, level_position])
+
+    def select(self, pollutants: list[str], hours: tuple[int, int] | None = None) -> "SimulationTensor":
+        """
+        Select pollutants and forecast hours, the values are a view if the pollutants are adjacent.
+
+        :param list pollutants: pollutants to keep, in the order of this tensor
+        :param tuple hours: (first, last) forecast values to keep, counted from the first prediction, None for all
+        :return: SimulationTensor of the selection
+        """
+        positions = [self.pollutants.index(pollutant) for pollutant in pollutants]
+        pollutant_index = positions
+        if positions and positions == list(range(positions[0], positions[-1] + 1)):
+            # a slice keeps the values a view
+            pollutant_index = slice(positions[0], positions[-1] + 1)
+        start, stop = (0, self.values.shape[3]) if hours is None else (hours[0], hours[1] + 1)
+        values = self.values[:, pollutant_index, :, start:stop]
+        horizons = None
+        if self.horizons is not None:
+            horizons = np.clip(self.horizons[:, pollutant_index] - start, 0, values.shape[3])
+        return SimulationTensor(pollutants, self.levels, values, horizons)
+
+    def at_level(self, level: float) -> dict[str, ValueColumn]:
+        """
+        Return the forecasts of every pollutant at one traffic reduction level.
+
+        :param float level: traffic reduction in percent, between the smallest and the largest simulated level
+        :return: ValueColumn <pollutant>_<level> of every pollutant, interpolated between the simulated levels around it
+        """
+        if not self.levels[0] <= level <= self.levels[-1]:
+            raise ValueError("The level must be between {} and {}.".format(self.levels[0], self.levels[-1]))
+
+        name = "{:g}".format(level)
+        upper = int(np.clip(np.searchsorted(self.levels, level), 1, len(self.levels) - 1))
+        lower = upper - 1
+        if level in (self.levels[lower], self.levels[upper]):
+            # a simulated level, the forecasts are returned as they are
+            level_position = lower if level == self.levels[lower] else upper
+            return {
+                f"{pollutant}_{name}": self.column(pollutant_position, level_position)
+                for pollutant_position, pollutant in enumerate(self.pollutants)
+            }
+
+        weight = (level - self.levels[lower]) / (self.levels[upper] - self.levels[lower])
+        values = (1 - weight) * self.values[:, :, lower] + weight * self.values[:, :, upper]
+        horizons = None
+        if self.horizons is not None:
+            horizons = np.minimum(self.horizons[:, :, lower], self.horizons[:, :, upper])
+        return {
+            f"{pollutant}_{name}": ValueColumn(
+                values[:, pollutant_position],
+                None if horizons is None else horizons[:, pollutant_position],
+            )
+            for pollutant_position, pollutant in enumerate(self.pollutants)
+        }
+
+
+class FeatureStore():
+    """
+    This class holds the features of one endpoint in columns: the ids, the
+    geometries in a GeometryStore, the timestamps as StringColumns and one
+    ValueColumn per pollutant. GeoJSON features are only built and encoded
+    for the requested page. The geometries of most endpoints are stored
+    separately by the CacheUpdater and joined by id when the cache is loaded,
+    together with their simplified levels.
+    """
+
+    # simplified geometries of the levels 1, 2, ... (see simplification.py), set when the geometries are joined.
+    # A class attribute, so stores restored from cache files without calling __init__ have it as well
+    simplified_geometries: list[GeometryStore] = []
+    # forecasts of the simulation as one array, the ValueColumns are views of it, see with_simulation_tensor
+    tensor: SimulationTensor | None = None
+
+    def __init__(
+        self,
+        id_name: str,
+        ids: np.ndarray,
+        geometries: GeometryStore | None,
+        strings: dict[str, StringColumn],
+        values: dict[str, ValueColumn],
+    ):
+        """
+        :param str id_name: name of the id property, e.g. "element_nr"
+        :param np.ndarray ids: id of every feature
+        :param GeometryStore geometries: geometry of every feature, None if they are stored separately
+        :param dict strings: string properties (timestamps) by name
+        :param dict values: forecast properties by name, in the order of the response
+        """
+        self.id_name = id_name
+        self.ids = ids
+        self.geometries = geometries
+        self.strings = strings
+        self.values = values
+        # version of the cached data, set by the Cache when the store is loaded
+        self.version = 0
+
+        self.property_names = [id_name, *strings, *values]
+
+        columns = [*strings.items(), *values.items()]
+        if geometries is not None:
+            columns.append(("geometry", geometries))
+        for name, column in columns:
+            if len(column) != len(ids):
+                raise ValueError("Column '{}' has {} rows instead of {}.".format(name, len(column), len(ids)))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, property_cols: list[str], geometries: GeometryStore | None = None):
+        """
+        Store the features of a transformed data frame in columns.
+
+        :param pd.DataFrame df: api data as returned by transform_raw_data
+        :param list property_cols: the property columns of the endpoint, see get_property_cols
+        :param GeometryStore geometries: geometry of every row, None if they are stored separately
+        :return: FeatureStore containing the features
+        """
+        iso = get_iso_format()
+        string_names = ["date_time_forecast_" + iso["name"], "forecast_range_" + iso["name"]]
+        id_name = property_cols[0]
+
+        with paused_gc():
+            return cls(
+                id_name=id_name,
+                ids=to_numpy(df[id_name]),
+                geometries=geometries,
+                strings={name: StringColumn.from_values(df[name].tolist()) for name in string_names},
+                values={
+                    name: ValueColumn.from_lists(df[name].tolist())
+                    for name in property_cols
+                    if name not in {id_name, *string_names}
+                },
+            )
+
+    @classmethod
+    def from_geojson(cls, geojson: dict) -> "FeatureStore":
+        """
+        Store a geojson FeatureCollection in columns. Cache files written before the FeatureStores
+        were pickled FeatureCollections, they are read until the CacheUpdater replaces them.
+
+        :param dict geojson: FeatureCollection, the first property of every feature is its id
+        :return: FeatureStore containing the features and their geometries
+        """
+        features = geojson["features"]
+        if not features:
+            raise ValueError("The FeatureCollection has no features to derive the properties from.")
+        geometry_kinds = {(feature["geometry"]["type"], feature["geometry"]["crs"]) for feature in features}
+        if len(geometry_kinds) > 1:
+            raise ValueError("All geometries must have the same type and crs.")
+
+        iso = get_iso_format()
+        string_names = ["date_time_forecast_" + iso["name"], "forecast_range_" + iso["name"]]
+        property_names = list(features[0]["properties"])
+        id_name = property_names[0]
+        geometry_type, crs = geometry_kinds.pop()
+
+        with paused_gc():
+            properties = [feature["properties"] for feature in features]
+            return cls(
+                id_name=id_name,
+                ids=np.array([feature_properties[id_name] for feature_properties in properties]),
+                geometries=GeometryStore.from_coordinates(
+                    geometry_type,
+                    [feature["geometry"]["coordinates"] for feature in features],
+                    crs,
+                ),
+                strings={
+                    name: StringColumn.from_values([str(feature_properties[name]) for feature_properties in properties])
+                    for name in string_names
+                },
+                values={
+                    name: ValueColumn.from_lists([feature_properties[name] for feature_properties in properties])
+                    for name in property_names
+                    if name not in {id_name, *string_names}
+                },
+            )
+
+    def with_geometries(
+        self,
+        geometry_ids: np.ndarray,
+        geometries: GeometryStore,
+        simplified_geometries: list[GeometryStore] | None = None,
+    ) -> "FeatureStore":
+        """
+        Join the features to separately stored geometries by id.
+
+        :param np.ndarray geometry_ids: sorted id of every geometry
+        :param GeometryStore geometries: geometries in the order of geometry_ids
+        :param list simplified_geometries: simplified levels of the geometries, in the order of geometry_ids
+        :return: FeatureStore with geometries
+        """
+        rows = np.searchsorted(geometry_ids, self.ids)
+        found = rows < len(geometry_ids)
+        found[found] = geometry_ids[rows[found]] == self.ids[found]
+        if not found.all():
+            raise ValueError(
+                "No geometry for {} features, e.g. {} '{}'.".format((~found).sum(), self.id_name, self.ids[~found][0]),
+            )
+
+        simplified_geometries = simplified_geometries or []
+        # the common case: forecasts and geometries contain the same ids
+        if len(rows) != len(geometry_ids) or (rows != np.arange(len(rows))).any():
+            geometries = geometries.take(rows)
+            simplified_geometries = [level.take(rows) for level in simplified_geometries]
+
+        store = FeatureStore(self.id_name, self.ids, geometries, self.strings, self.values)
+        store.simplified_geometries = simplified_geometries
+        return store
+
+    def validate(self, response_model: type[BaseModel]) -> "FeatureStore":
+        """
+        Validate the columns against the response model of the endpoint.
+
+        Columns are homogeneous, so every row is checked column-wise: the ids and coordinates convert to the
+        model types without loss, the forecasts are finite within their horizons, the horizons, string codes
+        and geometry offsets are in range. The distinct strings are converted like pydantic converts the
+        response, and the first and last feature are validated by the model itself.
+
+        :param response_model: pydantic model of the endpoint response, e.g. GridResponse
+        :return: FeatureStore serializing exactly as response_model would
+        """
+        feature_fields = response_model.__fields__["features"].type_.__fields__
+        geometry_fields = feature_fields["geometry"].type_.__fields__
+        property_fields = {field.alias: field for field in feature_fields["properties"].type_.__fields__.values()}
+        geometry_type = geometry_fields["type"].default
+        crs = geometry_fields["crs"].default
+
+        if list(property_fields) != self.property_names:
+            raise ValueError(
+                "Properties {} do not match the response model {}.".format(self.property_names, list(property_fields)),
+            )
+        if self.geometries is None:
+            raise ValueError("Features have no geometries.")
+        if self.geometries.geometry_type != geometry_type or self.geometries.crs != crs:
+            raise ValueError("Geometries must be of type '{}' in '{}'.".format(geometry_type, crs))
+
+        for name, column in self.strings.items():
+            if len(column) and (column.codes.min() < 0 or column.codes.max() >= len(column.categories)):
+                raise ValueError("Property {} has codes out of range.".format(name))
+        for name, column in self.values.items():
+            _validate_forecasts(name, column)
+        _validate_offsets(self.geometries)
+
+        geometries = self.geometries
+        coordinate_type = _numpy_type(geometry_fields["coordinates"])
+        if geometries.coords.dtype != coordinate_type:
+            geometries = GeometryStore(
+                geometries.geometry_type,
+                _convert_numbers("coordinates", geometries.coords, coordinate_type),
+                geometries.offsets,
+                geometries.crs,
+            )
+        strings = {
+            name: StringColumn(_validate_values(property_fields[name], column.categories), column.codes)
+            for name, column in self.strings.items()
+        }
+        store = FeatureStore(
+            self.id_name,
+            _convert_numbers(self.id_name, self.ids, _numpy_type(property_fields[self.id_name])),
+            geometries,
+            strings,
+            self.values,
+        )
+        store.simplified_geometries = self.simplified_geometries
+
+        sample_rows = sorted({0, len(store) - 1}) if len(store) else []
+        sample = [store.features(row, row + 1)[0] for row in sample_rows]
+        expected = jsonable_encoder(response_model.parse_obj({"type": "FeatureCollection", "features": sample}))
+        if encode_json(expected["features"]) != encode_json(sample):
+            raise ValueError("Features do not serialize like the response model {}.".format(response_model.__name__))
+
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def features(self, start: int, end: int, geometry: bool = True) -> list[dict]:
+        """
+        Build the geojson features [start, end).
+
+        :param int start: first feature
+        :param int end: end of the feature range (exclusive)
+        :param bool geometry: include the geometries, else the geometry of every feature is null
+        :return: list of geojson features
+        """
+        columns = [
+            self.ids[start:end].tolist(),
+            *[column.to_list(start, end) for column in self.strings.values()],
+            *[column.to_list(start, end) for column in self.values.values()],
+        ]
+        if not geometry:
+            return [
+                {"type": "Feature", "geometry": None, "properties": dict(zip(self.property_names, feature_properties))}
+                for feature_properties in zip(*columns)
+            ]
+
+        geometry_type = self.geometries.geometry_type
+        crs = self.geometries.crs
+
+        return [
+            {
+                "type": "Feature",
+                "geometry": {"type": geometry_type, "coordinates": coordinates, "crs": crs},
+                "properties": dict(zip(self.property_names, feature_properties)),
+            }
+            for coordinates, feature_properties in zip(self.geometries.coordinates(start, end), zip(*columns))
+        ]
+
+    def select(
+        self,
+        fields: list[str] | None = None,
+        pollutants: list[str] | None = None,
+        hours: tuple[int, int] | None = None,
+    ) -> "FeatureStore":
+        """
+        Select properties and forecast hours. The columns of the selection are views of the columns of this store.
+
+        :param list fields: properties to keep (the id is always kept), None for all
+        :param list pollutants: pollutants whose forecasts are kept, e.g. ["no2"], None for all
+        :param tuple hours: (first, last) forecast values to keep, counted from the first prediction, None for all
+        :return: FeatureStore with the selected properties and forecast hours
+        """
+        if fields is not None:
+            unknown = [field for field in fields if field not in self.property_names]
+            if unknown:
+                raise ValueError("Unknown properties {}, the properties are {}.".format(unknown, self.property_names))
+
+        def is_selected(name: str) -> bool:
+            return fields is None or name in fields
+
+        strings = {name: column for name, column in self.strings.items() if is_selected(name)}
+        values = {
+            name: column
+            for name, column in self.values.items()
+            # the simulation forecasts are named <pollutant>_<level>
+            if is_selected(name) and (pollutants is None or name.split("_")[0] in pollutants)
+        }
+
+        if hours is not None:
+            start, stop = hours[0], hours[1] + 1
+            iso = get_iso_format()
+            forecast_range_name = "forecast_range_" + iso["name"]
+            if forecast_range_name in strings:
+                forecast_range = strings[forecast_range_name]
+                categories = [
+                    slice_forecast_range(category, start, stop) for category in forecast_range.categories.tolist()
+                ]
+                strings[forecast_range_name] = StringColumn(np.array(categories, dtype=str), forecast_range.codes)
+            values = {name: column.slice(start, stop) for name, column in values.items()}
+
+        store = FeatureStore(self.id_name, self.ids, self.geometries, strings, values)
+        store.version = self.version
+        store.simplified_geometries = self.simplified_geometries
+        if self.tensor is not None:
+            # the pollutants of the selected forecasts <pollutant>_<level>, so at_level selects the same ones
+            selected_pollutants = {name.rpartition("_")[0] for name in values}
+            store.tensor = self.tensor.select(
+                [pollutant for pollutant in self.tensor.pollutants if pollutant in selected_pollutants],
+                hours,
+            )
+        return store
+
+    def simplified(self, level: int) -> "FeatureStore":
+        """
+        Return the features with the geometries of a simplification level.
+
+        :param int level: simplification level, 0 for the stored geometries
+        :return: FeatureStore with the simplified geometries, this store if there are no simplified geometries
+        """
+        if level == 0 or not self.simplified_geometries:
+            return self
+
+        geometries = self.simplified_geometries[min(level, len(self.simplified_geometries)) - 1]
+        store = FeatureStore(self.id_name, self.ids, geometries, self.strings, self.values)
+        store.version = self.version
+        store.simplified_geometries = self.simplified_geometries
+        store.tensor = self.tensor
+        return store
+
+    def with_simulation_tensor(self) -> "FeatureStore":
+        """
+        Keep the forecasts <pollutant>_<level> of the simulation in one SimulationTensor.
+
+        :return: FeatureStore whose ValueColumns are views of its tensor
+        """
+        tensor = SimulationTensor.from_columns(self.values)
+        store = FeatureStore(self.id_name, self.ids, self.geometries, self.strings, tensor.columns())
+        store.version = self.version
+        store.simplified_geometries = self.simplified_geometries
+        store.tensor = tensor
+        return store
+
+    def at_level(self, level: float) -> "FeatureStore":
+        """
+        Select the forecasts of one traffic reduction level of the simulation.
+
+        :param float level: traffic reduction in percent, levels between the simulated ones are interpolated
+        :return: FeatureStore with one ValueColumn <pollutant>_<level> per pollutant, keeping the tensor of all levels
+        """
+        if self.tensor is None:
+            raise ValueError("Only the simulation has traffic reduction levels.")
+
+        store = FeatureStore(self.id_name, self.ids, self.geometries, self.strings, self.tensor.at_level(level))
+        store.version = self.version
+        store.simplified_geometries = self.simplified_geometries
+        store.tensor = self.tensor
+        return store
+
+    def take(self, rows: np.ndarray) -> "FeatureStore":
+        """
+        Select features by position, the simplified geometries are not selected.
+
+        :param np.ndarray rows: positions of the features to keep, in the new order
+        :return: FeatureStore with the selected features
+        """
+        return FeatureStore(
+            self.id_name,
+            self.ids[rows],
+            None if self.geometries is None else self.geometries.take(rows),
+            {name: column.take(rows) for name, column in self.strings.items()},
+            {name: column.take(rows) for name, column in self.values.items()},
+        )
+
+    def update(self, newer: "FeatureStore") -> "FeatureStore":
+        """
+        Merge newer rows by id: they replace the rows with the same id, new ids are added.
+
+        :param FeatureStore newer: store with the new or changed rows, without geometries
+        :return: FeatureStore without geometries, sorted by id
+        """
+        if self.geometries is not None or newer.geometries is not None:
+            raise ValueError("Only FeatureStores without geometries can be updated.")
+        if self.property_names != newer.property_names:
+            raise ValueError(
+                "Properties {} do not match the properties {} of the stored features.".format(
+                    newer.property_names, self.property_names,
+                ),
+            )
+
+        kept = self.take(np.flatnonzero(~np.isin(self.ids, newer.ids)))
+        return FeatureStore.concat([kept, newer]).sort_by_id()
+
+    @classmethod
+    def concat(cls, stores: list["FeatureStore"]) -> "FeatureStore":
+        """
+        Append the features of several stores, e.g. built from blocks of a query.
+
+        :param list stores: FeatureStores with the same properties, all with or all without geometries
+        :return: FeatureStore with the features of all stores, in order
+        """
+        first = stores[0]
+        if any(store.property_names != first.property_names for store in stores):
+            raise ValueError("Only FeatureStores with the same properties can be concatenated.")
+
+        geometries = None
+        if first.geometries is not None:
+            geometries = GeometryStore.concat([store.geometries for store in stores])
+
+        return cls(
+            first.id_name,
+            np.concatenate([store.ids for store in stores]),
+            geometries,
+            {name: StringColumn.concat([store.strings[name] for store in stores]) for name in first.strings},
+            {name: ValueColumn.concat([store.values[name] for store in stores]) for name in first.values},
+        )
+
+    def sort_by_id(self) -> "FeatureStore":
+        """Return the features sorted by id, the store itself if they already are."""
+        if (self.ids[1:] >= self.ids[:-1]).all():
+            return self
+        order = np.argsort(self.ids, kind="stable")
+        store = self.take(order)
+        store.simplified_geometries = [level.take(order) for level in self.simplified_geometries]
+        return store
+
+    def nearest(self, x: float, y: float) -> dict | None:
+        """
+        Find the feature nearest to a point.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: dict with the "distance" and the geojson "feature", None if there are no features
+        """
+        nearest = self.geometries.nearest(x, y)
+        if nearest is None:
+            return None
+
+        row, distance = nearest
+        return {"distance": distance, "feature": self.take(np.array([row])).features(0, 1)[0]}
+
+    def containing(self, x: float, y: float) -> list[dict]:
+        """
+        Find the features whose (Multi)Polygon contains a point.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: list of geojson features
+        """
+        rows = self.geometries.containing(x, y)
+        return self.take(rows).features(0, len(rows))
+
+    def position_after(self, cursor: Cursor) -> int:
+        """
+        Find the position of the first feature after the key of a cursor, the features must be sorted by id.
+
+        :param Cursor cursor: cursor of the previous page
+        :return: position of the first feature of the next page
+        """
+        position = cursor.position
+        # pages of the same version are continued without a search
+        if cursor.version == self.version and 0 <= position < len(self) and self.ids[position] == cursor.key:
+            return position + 1
+
+        if isinstance(cursor.key, str) != (self.ids.dtype.kind == "U"):
+            raise ValueError("Invalid cursor.")
+        return int(np.searchsorted(self.ids, cursor.key, side="right"))
+
+    def page(
+        self,
+        skip: int = 0,
+        limit: int | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+        cursor: Cursor | None = None,
+        geometry: bool = True,
+    ) -> bytes:
+        """
+        Return a FeatureCollection with the features [skip, skip + limit) as json.
+
+        If there are further features the collection contains the token of a
+        Cursor to them as "next".
+
+        :param int skip: number of features to skip (after the cursor)
+        :param int limit: maximum number of features, all remaining features if None
+        :param tuple bbox: (minx, miny, maxx, maxy), only page through features whose envelope intersects it
+        :param Cursor cursor: only page through features after the last feature of a previous page
+        :param bool geometry: include the geometries, else the geometry of every feature is null
+        :return: utf-8 encoded FeatureCollection
+        """
+        rows, next_cursor = self.page_rows(skip, limit, bbox, cursor)
+        return b"".join(self.iter_page(rows, next_cursor, geometry))
+
+    def page_rows(
+        self,
+        skip: int = 0,
+        limit: int | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+        cursor: Cursor | None = None,
+    ) -> tuple[range | np.ndarray, Cursor | None]:
+        """
+        Find the features of a page, see page for the parameters.
+
+        :return: positions of the features (a range if there is no bbox) and the cursor of the next page, if any
+        """
+        start = 0 if cursor is None else self.position_after(cursor)
+        if bbox is None:
+            first = min(start + skip, len(self))
+            end = len(self) if limit is None else min(first + limit, len(self))
+            rows = range(first, end)
+            has_next = end < len(self)
+        else:
+            rows = self.geometries.spatial_index.query(bbox)
+            rows = rows[np.searchsorted(rows, start) + skip:]
+            has_next = limit is not None and limit < len(rows)
+            rows = rows[:limit]
+
+        if not has_next or not len(rows):
+            return rows, None
+        return rows, Cursor(self.version, int(rows[-1]), self.ids[rows[-1]].item())
+
+    def iter_page(
+        self,
+        rows: range | np.ndarray,
+        next_cursor: Cursor | None = None,
+        geometry: bool = True,
+        features_per_chunk: int | None = None,
+    ) -> Iterator[bytes]:
+        """
+        Encode a FeatureCollection chunk by chunk: the header, the features and the trailer.
+
+        :param rows: positions of the features, see page_rows
+        :param Cursor next_cursor: cursor of the next page, None if there are no further features
+        :param bool geometry: include the geometries, else the geometry of every feature is null
+        :param int features_per_chunk: features built and encoded at once, all if None
+        :return: generator of the utf-8 encoded parts of the FeatureCollection
+        """
+        yield COLLECTION_HEADER
+        features_per_chunk = features_per_chunk or max(len(rows), 1)
+        for chunk_start in range(0, len(rows), features_per_chunk):
+            chunk = rows[chunk_start:chunk_start + features_per_chunk]
+            if isinstance(chunk, range):
+                features = self.features(chunk.start, chunk.stop, geometry)
+            else:
+                features = self.take(chunk).features(0, len(chunk), geometry)
+            if chunk_start:
+                yield b","
+            yield encode_json(features)[1:-1]
+
+        if next_cursor is None:
+            yield COLLECTION_TRAILER
+        else:
+            yield b'],"next":' + encode_json(next_cursor.encode()) + b"}"
+
+
+class FeatureStoreBuilder():
+    """
+    This class appends the blocks of a query to preallocated column arrays, so a
+    FeatureStore is built without holding all blocks and their concatenation at
+    once. The arrays grow by doubling if more rows than expected are appended.
+    Geometries (only queried for the few stations) are concatenated at the end.
+    """
+
+    def __init__(self, expected_rows: int = 0):
+        """
+        :param int expected_rows: number of rows the arrays are allocated for, e.g. the row count of the table
+        """
+        self.capacity = expected_rows
+        self.length = 0
+        self.first: FeatureStore | None = None
+        self.ids: np.ndarray | None = None
+        self.codes_by_string: dict[str, dict[str, int]] = {}
+        self.codes: dict[str, np.ndarray] = {}
+        self.values: dict[str, np.ndarray] = {}
+        self.horizons: dict[str, np.ndarray] = {}
+        self.geometries: list[GeometryStore] = []
+
+    def append(self, store: FeatureStore):
+        """
+        Append the features of a block.
+
+        :param FeatureStore store: features of the block, with the properties of the first block
+        """
+        if self.first is None:
+            self.first = store
+            self.codes_by_string = {name: {} for name in store.strings}
+        elif store.property_names != self.first.property_names:
+            raise ValueError("Only FeatureStores with the same properties can be concatenated.")
+
+        start, stop = self.length, self.length + len(store)
+        self.reserve(stop, store)
+        self.ids[start:stop] = store.ids
+        for name, column in store.strings.items():
+            codes_by_string = self.codes_by_string[name]
+            mapping = np.fromiter(
+                (codes_by_string.setdefault(string, len(codes_by_string)) for string in column.categories.tolist()),
+                dtype=np.int32,
+                count=len(column.categories),
+            )
+            self.codes[name][start:stop] = mapping[column.codes]
+        for name, column in store.values.items():
+            width = column.values.shape[1]
+            self.values[name][start:stop, :width] = column.values
+            self.values[name][start:stop, width:] = np.nan
+            self.horizons[name][start:stop] = width if column.horizons is None else column.horizons
+        if store.geometries is not None:
+            self.geometries.append(store.geometries)
+        self.length = stop
+
+    def reserve(self, rows: int, store: FeatureStore):
+        """grow the arrays to hold rows features, wide enough for the ids and forecasts of store"""
+        capacity = self.capacity if rows <= self.capacity else max(rows, 2 * self.capacity)
+        self.ids = _resized(self.ids, store.ids.dtype, (capacity,), self.length)
+        for name in store.strings:
+            self.codes[name] = _resized(self.codes.get(name), np.int32, (capacity,), self.length)
+        for name, column in store.values.items():
+            width = column.values.shape[1]
+            current = self.values.get(name)
+            if current is not None:
+                width = max(width, current.shape[1])
+            values = _resized(current, np.float64, (capacity, width), self.length)
+            if current is not None and values is not current:
+                values[:self.length, current.shape[1]:] = np.nan
+            self.values[name] = values
+            self.horizons[name] = _resized(self.horizons.get(name), np.int64, (capacity,), self.length)
+        self.capacity = capacity
+
+    def build(self) -> FeatureStore:
+        """
+        Return the appended features sorted by id. The columns are sorted one after
+        another in place of the arrays, so only one column is copied at once. Already
+        sorted columns are views of the arrays, they keep their capacity until the
+        store is saved.
+
+        :return: FeatureStore with the features of all blocks, sorted by id
+        """
+        if self.first is None:
+            raise ValueError("No features were appended.")
+
+        rows = np.arange(self.length)
+        ids = self.ids[:self.length]
+        if (ids[1:] >= ids[:-1]).all():
+            self.ids = ids
+            select = slice(self.length)
+        else:
+            rows = np.argsort(ids, kind="stable")
+            self.ids = ids[rows]
+            select = rows
+        for name in self.codes:
+            self.codes[name] = self.codes[name][select]
+        for name in self.values:
+            self.values[name] = self.values[name][select]
+            self.horizons[name] = self.horizons[name][select]
+        self.capacity = self.length
+
+        geometries = None
+        if self.first.geometries is not None:
+            geometries = GeometryStore.concat(self.geometries).take(rows)
+
+        values = {}
+        for name, column in self.values.items():
+            horizons = self.horizons[name]
+            values[name] = ValueColumn(column, None if (horizons == column.shape[1]).all() else horizons)
+        return FeatureStore(
+            self.first.id_name,
+            self.ids,
+            geometries,
+            {
+                name: StringColumn(np.array(list(codes_by_string), dtype=str), self.codes[name])
+                for name, codes_by_string in self.codes_by_string.items()
+            },
+            values,
+        )
+
+
+def to_numpy(column: pd.Series) -> np.ndarray:
+    """Convert a column to numpy, strings as fixed width unicode instead of python objects."""
+    if column.dtype == object:
+        return column.to_numpy().astype(str)
+    return column.to_numpy()
+
+
+def _resized(array: np.ndarray | None, dtype, shape: tuple, length: int) -> np.ndarray:
+    """Return array if it has the shape and holds dtype, else a new array of the shape with its first length rows."""
+    if array is not None:
+        dtype = np.result_type(array.dtype, dtype)
+        if array.shape == shape and array.dtype == dtype:
+            return array
+    resized = np.empty(shape, dtype=dtype)
+    if array is not None:
+        resized[(slice(length), *map(slice, array.shape[1:]))] = array[:length]
+    return resized
+
+
+def _numpy_type(field: ModelField) -> type:
+    """Return the numpy type pydantic converts the (innermost) values of a field to."""
+    python_type = field.outer_type_
+    while get_args(python_type):
+        python_type = get_args(python_type)[0]
+    return {int: np.int64, float: np.float64}.get(python_type, str)
+
+
+def _convert_numbers(name: str, values: np.ndarray, numpy_type: type) -> np.ndarray:
+    """Convert a numeric array to the type of the response model, integers and finite numbers must stay exact."""
+    if numpy_type is str or values.dtype.kind not in "iuf":
+        return values.astype(numpy_type, copy=False)
+    if values.dtype.kind == "f" and not np.isfinite(values).all():
+        raise ValueError("Property {} contains missing or infinite values.".format(name))
+    converted = values.astype(numpy_type, copy=False)
+    if (converted != values).any():
+        raise ValueError("Property {} has values that are not of type {}.".format(name, numpy_type.__name__))
+    return converted
+
+
+def _validate_forecasts(name: str, column: ValueColumn):
+    """Check that the horizons are in range and the forecasts are finite within them (json has no nan)."""
+    width = column.values.shape[1]
+    finite = np.isfinite(column.values)
+    if column.horizons is not None:
+        if len(column) and (column.horizons.min() < 0 or column.horizons.max() > width):
+            raise ValueError("Property {} has forecast lengths out of range.".format(name))
+        # the padding after the horizon is nan
+        finite |= np.arange(width) >= column.horizons[:, None]
+    if not finite.all():
+        raise ValueError("Property {} contains missing or infinite forecasts.".format(name))
+
+
+def _validate_offsets(geometries: GeometryStore):
+    """Check that the offsets of every nesting level are increasing and point into the next level."""
+    part_counts = [len(level) - 1 for level in geometries.offsets[1:]] + [len(geometries.coords)]
+    for level, part_count in zip(geometries.offsets, part_counts):
+        if len(level) and (level[0] < 0 or level[-1] > part_count or (np.diff(level) < 0).any()):
+            raise ValueError("Geometry offsets are out of range.")
+
+
+def _validate_values(field: ModelField, values: np.ndarray) -> np.ndarray:
+    """Validate values with a pydantic field and serialize them like the response."""
+    serialized = []
+    for raw_value in values.tolist():
+        value, error = field.validate(raw_value, {}, loc=field.alias)
+        if error:
+            raise ValueError("Invalid value '{}' for property {}.".format(raw_value, field.alias))
+        serialized.append(jsonable_encoder(value))
+    return np.array(serialized, dtype=str)
@@ -0,0 +1,188 @@
+"""
+The last forecast runs of every dataset, kept when the cache is reloaded.
+
+Every loaded FeatureStore is added as a run: its ids, timestamps and forecasts
+as float32 matrices, without geometries. The Cache builds the runs together
+with a snapshot and adds them once the snapshot replaced the current one. Runs are evicted, oldest first, when a
+dataset has more than max_runs runs or all runs together exceed max_bytes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.internal.data_utils import get_iso_format
+
+HISTORY_DATASETS = ["stations", "streets", "grid", "lor", "simulation"]
+
+
+class ForecastRun():
+    """
+    This class holds the forecasts of one run of a dataset compactly: float32
+    values padded with nan and the features sorted by id, so a feature is found
+    by binary search.
+    """
+
+    def __init__(self, feature_store: FeatureStore):
+        """
+        :param FeatureStore feature_store: loaded FeatureStore of the dataset, sorted by id
+        """
+        iso = get_iso_format()
+        date_time_forecast = feature_store.strings.get("date_time_forecast_" + iso["name"])
+        # time of the run: the newest forecast, the version (modification time) of the cache file without timestamps
+        self.run_time = feature_store.version
+        if date_time_forecast is not None and len(date_time_forecast.categories):
+            self.run_time = max(date_time_forecast.categories.tolist())
+        self.version = feature_store.version
+
+        strings = {
+            name: StringColumn(np.array(column.categories), np.array(column.codes, dtype=np.int32))
+            for name, column in feature_store.strings.items()
+        }
+        values = {
+            name: ValueColumn(
+                np.array(column.values, dtype=np.float32),
+                None if column.horizons is None else np.array(column.horizons, dtype=np.int32),
+            )
+            for name, column in feature_store.values.items()
+        }
+        self.store = FeatureStore(feature_store.id_name, np.array(feature_store.ids), None, strings, values)
+        # bytes of the arrays of the run, the cache files are memory mapped but the runs are copies
+        string_bytes = sum(column.categories.nbytes + column.codes.nbytes for column in strings.values())
+        value_bytes = sum(
+            column.values.nbytes + (0 if column.horizons is None else column.horizons.nbytes)
+            for column in values.values()
+        )
+        self.nbytes = self.store.ids.nbytes + string_bytes + value_bytes
+
+    def row(self, feature_id: str) -> int | None:
+        """
+        Find a feature.
+
+        :param str feature_id: id of the feature, converted to the type of the ids
+        :return: position of the feature, None if the run does not contain it
+        """
+        ids = self.store.ids
+        if ids.dtype.kind in "iu":
+            try:
+                feature_id = int(feature_id)
+            except ValueError:
+                return None
+        position = int(np.searchsorted(ids, feature_id))
+        if position < len(ids) and ids[position] == feature_id:
+            return position
+        return None
+
+    def properties(
+        self,
+        row: int,
+        pollutants: list[str] | None = None,
+        hours: tuple[int, int] | None = None,
+    ) -> dict:
+        """
+        Return the timestamps and forecasts of a feature.
+
+        :param int row: position of the feature
+        :param list pollutants: pollutants whose forecasts are returned, None for all
+        :param tuple hours: (first, last) forecast values to return, None for all
+        :return: properties of the feature without its id, the forecasts as lists
+        """
+        selection = self.store.select(None, pollutants, hours).take(np.array([row]))
+        properties = {name: column.to_list(0, 1)[0] for name, column in selection.strings.items()}
+        for name, column in selection.values.items():
+            horizon = column.values.shape[1] if column.horizons is None else column.horizons[0]
+            # the shortest decimal of every float32 value, e.g. 36.7 and not 36.70000076293945
+            properties[name] = [float(str(value)) for value in column.values[0, :horizon]]
+        return properties
+
+
+class ForecastHistory():
+    """
+    This class keeps the last forecast runs of every dataset. A run replaces
+    the run with the same run time (e.g. the geometries changed, but not the
+    forecasts). Runs are evicted by count per dataset and by their total bytes.
+    """
+
+    def __init__(self, max_runs: int, max_bytes: int):
+        """
+        :param int max_runs: runs kept per dataset
+        :param int max_bytes: byte budget of the runs of all datasets
+        """
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        # runs of all datasets in the order they were added, keyed by (dataset, run time)
+        self.runs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, dataset: str, feature_store: FeatureStore):
+        """
+        Add the current run of a dataset and evict the oldest runs.
+
+        :param str dataset: name of the dataset, one of HISTORY_DATASETS
+        :param FeatureStore feature_store: loaded FeatureStore of the dataset, sorted by id
+        """
+        if self.max_runs > 0:
+            self.add_run(dataset, ForecastRun(feature_store))
+
+    def add_run(self, dataset: str, run: ForecastRun):
+        """
+        Add a run of a dataset, built beforehand, and evict the oldest runs.
+
+        :param str dataset: name of the dataset, one of HISTORY_DATASETS
+        :param ForecastRun run: the run
+        """
+        with self.lock:
+            self.runs.pop((dataset, run.run_time), None)
+            self.runs[(dataset, run.run_time)] = run
+            dataset_keys = [key for key in self.runs if key[0] == dataset]
+            for key in dataset_keys[:-self.max_runs]:
+                del self.runs[key]
+            total_size = sum(run.nbytes for run in self.runs.values())
+            while total_size > self.max_bytes and self.runs:
+                _, evicted = self.runs.popitem(last=False)
+                total_size -= evicted.nbytes
+
+    def dataset_runs(self, dataset: str) -> list[ForecastRun]:
+        """Return the runs of a dataset, the oldest first."""
+        with self.lock:
+            return [run for (run_dataset, _), run in self.runs.items() if run_dataset == dataset]
+
+    def feature_history(
+        self,
+        dataset: str,
+        feature_id: str,
+        pollutants: list[str] | None = None,
+        hours: tuple[int, int] | None = None,
+        n_runs: int | None = None,
+    ) -> dict | None:
+        """
+        Return the forecasts of a feature in the kept runs.
+
+        :param str dataset: name of the dataset
+        :param str feature_id: id of the feature
+        :param list pollutants: pollutants whose forecasts are returned, None for all
+        :param tuple hours: (first, last) forecast values to return, None for all
+        :param int n_runs: number of the newest runs to return, None for all
+        :return: dataset, id and the run time and properties of the feature in every run containing it,
+            the oldest run first. None if no run contains the feature
+        """
+        typed_id = None
+        runs = []
+        for run in self.dataset_runs(dataset):
+            row = run.row(feature_id)
+            if row is not None:
+                typed_id = run.store.ids[row].item()
+                runs.append({"run_time": run.run_time, **run.properties(row, pollutants, hours)})
+        if not runs:
+            return None
+        if n_runs is not None:
+            runs = runs[-n_runs:]
+        return {"dataset": dataset, "id": typed_id, "runs": runs}
+
+
+forecast_history = ForecastHistory(
+    max_runs=int(os.getenv("HISTORY_MAX_RUNS", 24)),
+    max_bytes=int(os.getenv("HISTORY_MAX_BYTES", 512 * 1024 ** 2)),
+)
@@ -0,0 +1,406 @@
+"""Columnar storage of the feature geometries."""
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from fairqapi.cache.spatial_index import SpatialIndex
+from fairqapi.internal.gc_utils import paused_gc
+from fairqapi.internal.json_utils import parse_geometries
+
+# number of nesting levels between a feature and its coordinate pairs
+GEOMETRY_DEPTH = {
+    "Point": 0,
+    "LineString": 1,
+    "Polygon": 2,
+    "MultiLineString": 2,
+    "MultiPolygon": 3,
+}
+
+
+class GeometryStore():
+    """
+    This class holds the geometries of all features of one endpoint as a single
+    coordinate buffer (one row per coordinate pair) and one offset array per
+    nesting level, e.g. feature -> polygon -> ring -> coordinate for MultiPolygons.
+    Point geometries need no offsets, feature i is coordinate row i.
+    """
+
+    def __init__(self, geometry_type: str, coords: np.ndarray, offsets: list[np.ndarray], crs: str = "EPSG:25833"):
+        """
+        :param str geometry_type: geojson geometry type, one of GEOMETRY_DEPTH
+        :param np.ndarray coords: coordinate pairs with shape (n_coordinates, 2)
+        :param list offsets: offset arrays from the outermost to the innermost nesting level
+        :param str crs: coordinate reference system of all geometries
+        """
+        if geometry_type not in GEOMETRY_DEPTH:
+            raise ValueError("Geometry type can only be one of {}.".format(", ".join(GEOMETRY_DEPTH)))
+        if len(offsets) != GEOMETRY_DEPTH[geometry_type]:
+            raise ValueError(
+                "Geometry type '{}' needs {} offset arrays.".format(geometry_type, GEOMETRY_DEPTH[geometry_type]),
+            )
+        self.geometry_type = geometry_type
+        self.coords = coords
+        self.offsets = offsets
+        self.crs = crs
+
+    @classmethod
+    def from_coordinates(cls, geometry_type: str, coordinates: list, crs: str = "EPSG:25833") -> "GeometryStore":
+        """
+        Build the store from nested geojson coordinate lists.
+
+        :param str geometry_type: geojson geometry type of all geometries
+        :param list coordinates: one nested coordinate list per feature
+        :param str crs: coordinate reference system of all geometries
+        :return: GeometryStore with flattened coordinates
+        """
+        offsets = []
+        parts = coordinates
+        with paused_gc():
+            for _ in range(GEOMETRY_DEPTH.get(geometry_type, 0)):
+                level_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+                np.cumsum([len(part) for part in parts], out=level_offsets[1:])
+                offsets.append(level_offsets)
+                parts = [child for part in parts for child in part]
+
+            coords = np.array(parts).reshape(-1, 2) if parts else np.empty((0, 2))
+
+        return cls(geometry_type, coords, offsets, crs)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, geometry_type: str) -> "GeometryStore":
+        """
+        Build the store from queried geometries.
+
+        :param pd.DataFrame df: columns "x" and "y" for Points, else column "geometry" with geojson strings
+        :param str geometry_type: geojson geometry type of all geometries
+        :return: GeometryStore with one geometry per row of df
+        """
+        if geometry_type == "Point":
+            if not {"x", "y"}.issubset(df.columns):
+                raise ValueError("Point coordinates 'x' and/or 'y' are missing in df")
+            return cls(geometry_type, df[["x", "y"]].to_numpy(), [])
+
+        return cls.from_coordinates(geometry_type, parse_geometries(df["geometry"].tolist(), geometry_type))
+
+    @classmethod
+    def concat(cls, stores: list["GeometryStore"]) -> "GeometryStore":
+        """
+        Append the geometries of several stores.
+
+        :param list stores: GeometryStores with the same geometry type and crs
+        :return: GeometryStore with the geometries of all stores, in order
+        """
+        if len({(store.geometry_type, store.crs) for store in stores}) > 1:
+            raise ValueError("Only geometries of the same type and crs can be concatenated.")
+
+        offsets = []
+        for level in range(GEOMETRY_DEPTH[stores[0].geometry_type]):
+            # every store's offsets continue at the end of the previous store's
+            level_offsets = [np.zeros(1, dtype=np.int64)]
+            shift = 0
+            for store in stores:
+                level_offsets.append(store.offsets[level][1:] + shift)
+                shift += store.offsets[level][-1]
+            offsets.append(np.concatenate(level_offsets))
+
+        return cls(stores[0].geometry_type, np.concatenate([store.coords for store in stores]), offsets, stores[0].crs)
+
+    def __len__(self) -> int:
+        if self.offsets:
+            return len(self.offsets[0]) - 1
+        return len(self.coords)
+
+    def coordinates(self, start: int, end: int) -> list:
+        """
+        Rebuild the nested geojson coordinate lists of the features [start, end).
+
+        :param int start: first feature
+        :param int end: end of the feature range (exclusive)
+        :return: one nested coordinate list per feature
+        """
+        relative_offsets = []
+        for level_offsets in self.offsets:
+            relative_offsets.append((level_offsets[start:end + 1] - level_offsets[start]).tolist())
+            start, end = level_offsets[start], level_offsets[end]
+
+        nested = self.coords[start:end].tolist()
+        for level_offsets in reversed(relative_offsets):
+            nested = [nested[lower:upper] for lower, upper in zip(level_offsets[:-1], level_offsets[1:])]
+
+        return nested
+
+    def coordinate_offsets(self) -> np.ndarray:
+        """
+        Return the range of coordinate rows of every feature.
+
+        :return: offsets with shape (n_features + 1), feature i has the coordinates [offsets[i], offsets[i + 1])
+        """
+        if not self.offsets:
+            return np.arange(len(self.coords) + 1)
+
+        offsets = self.offsets[0]
+        for level_offsets in self.offsets[1:]:
+            offsets = level_offsets[offsets]
+        return offsets
+
+    def envelopes(self) -> np.ndarray:
+        """
+        Return the envelope (bounding box) of every feature.
+
+        :return: array with shape (n_features, 4) with columns minx, miny, maxx, maxy, nan for empty geometries
+        """
+        offsets = self.coordinate_offsets()
+        envelopes = np.full((len(self), 4), np.nan)
+        non_empty = offsets[1:] > offsets[:-1]
+        if non_empty.any():
+            starts = offsets[:-1][non_empty]
+            envelopes[non_empty, :2] = np.minimum.reduceat(self.coords, starts, axis=0)
+            envelopes[non_empty, 2:] = np.maximum.reduceat(self.coords, starts, axis=0)
+        return envelopes
+
+    @cached_property
+    def spatial_index(self) -> SpatialIndex:
+        """Spatial index over the envelopes, built on first use."""
+        return SpatialIndex(self.envelopes())
+
+    def segments(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the segments between consecutive coordinates of every line or polygon ring.
+
+        :return: coordinate row of every segment start (the segment ends at the next row) and the feature of
+            every segment
+        """
+        is_segment_start = np.ones(len(self.coords), dtype=bool)
+        if self.offsets:
+            # the last coordinate of every line or ring starts no segment
+            is_segment_start[self.offsets[-1][1:] - 1] = False
+        else:
+            is_segment_start[:] = False
+        starts = np.flatnonzero(is_segment_start)
+        features = np.searchsorted(self.coordinate_offsets(), starts, side="right") - 1
+        return starts, features
+
+    def contains(self, x: float, y: float) -> np.ndarray:
+        """
+        Check which (Multi)Polygons contain a point, using the even-odd rule over all rings.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: boolean array, True for every geometry containing the point
+        """
+        if self.geometry_type not in {"Polygon", "MultiPolygon"}:
+            return np.zeros(len(self), dtype=bool)
+
+        starts, features = self.segments()
+        segment_starts, segment_ends = self.coords[starts], self.coords[starts + 1]
+        crosses = (segment_starts[:, 1] > y) != (segment_ends[:, 1] > y)
+        segment_starts, segment_ends = segment_starts[crosses], segment_ends[crosses]
+        crossing_x = segment_starts[:, 0] + (y - segment_starts[:, 1]) * (
+            (segment_ends[:, 0] - segment_starts[:, 0]) / (segment_ends[:, 1] - segment_starts[:, 1])
+        )
+        crossings = np.bincount(features[crosses][crossing_x > x], minlength=len(self))
+        return crossings % 2 == 1
+
+    def locate(self, points: np.ndarray) -> np.ndarray:
+        """
+        Find a (Multi)Polygon containing every point, using the even-odd rule like contains.
+        Every geometry is only checked against the points within its envelope.
+
+        :param np.ndarray points: points with shape (n, 2)
+        :return: position of the first geometry containing every point, -1 if none does
+        """
+        located = np.full(len(points), -1, dtype=np.int64)
+        if self.geometry_type not in {"Polygon", "MultiPolygon"} or not len(points):
+            return located
+
+        order = np.argsort(points[:, 0], kind="stable")
+        sorted_x = points[order, 0]
+        starts, features = self.segments()
+        feature_segments = np.searchsorted(features, np.arange(len(self) + 1))
+        for row, (minx, miny, maxx, maxy) in enumerate(self.envelopes().tolist()):
+            candidates = order[np.searchsorted(sorted_x, minx):np.searchsorted(sorted_x, maxx, side="right")]
+            candidate_y = points[candidates, 1]
+            candidates = candidates[(candidate_y >= miny) & (candidate_y <= maxy) & (located[candidates] < 0)]
+            segment_starts = starts[feature_segments[row]:feature_segments[row + 1]]
+            if not len(candidates) or not len(segment_starts):
+                continue
+
+            start_points, end_points = self.coords[segment_starts], self.coords[segment_starts + 1]
+            # points x segments are compared at once, in chunks of about a million pairs
+            chunk_size = max(1, 2 ** 20 // len(segment_starts))
+            for chunk_start in range(0, len(candidates), chunk_size):
+                chunk = candidates[chunk_start:chunk_start + chunk_size]
+                x, y = points[chunk, :1], points[chunk, 1:]
+                crosses = (start_points[:, 1] > y) != (end_points[:, 1] > y)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    crossing_x = start_points[:, 0] + (y - start_points[:, 1]) * (
+                        (end_points[:, 0] - start_points[:, 0]) / (end_points[:, 1] - start_points[:, 1])
+                    )
+                inside = (crosses & (crossing_x > x)).sum(axis=1) % 2 == 1
+                located[chunk[inside]] = row
+
+        return located
+
+    def midpoints(self) -> np.ndarray:
+        """
+        Return the point halfway along every (Multi)LineString, the coordinates of Points.
+
+        :return: array with shape (n_features, 2), the first coordinate for geometries without length,
+            nan for empty ones
+        """
+        if not self.offsets:
+            return self.coords
+
+        offsets = self.coordinate_offsets()
+        midpoints = np.full((len(self), 2), np.nan)
+        non_empty = offsets[1:] > offsets[:-1]
+        midpoints[non_empty] = self.coords[offsets[:-1][non_empty]]
+
+        starts, features = self.segments()
+        directions = self.coords[starts + 1] - self.coords[starts]
+        lengths = np.hypot(directions[:, 0], directions[:, 1])
+        cumulative = np.cumsum(lengths)
+        feature_lengths = np.bincount(features, lengths, minlength=len(self))
+        has_length = feature_lengths > 0
+        # position halfway along the feature on the length of all segments, one feature after another
+        length_before = np.cumsum(feature_lengths) - feature_lengths
+        halfway = length_before[has_length] + feature_lengths[has_length] / 2
+        segments = np.searchsorted(cumulative, halfway)
+        # rounding may place the position just after the last segment of the feature
+        last_segments = np.searchsorted(features, np.flatnonzero(has_length), side="right") - 1
+        segments = np.minimum(segments, last_segments)
+        along = ((halfway - (cumulative[segments] - lengths[segments])) / lengths[segments]).clip(0, 1)
+        midpoints[has_length] = self.coords[starts[segments]] + along[:, None] * directions[segments]
+        return midpoints
+
+    def distances(self, x: float, y: float) -> np.ndarray:
+        """
+        Return the distance of a point to every geometry, 0 for polygons containing the point.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: distance to every geometry, inf for empty geometries
+        """
+        point = np.array([x, y])
+        if not self.offsets:
+            return np.hypot(*(self.coords - point).T)
+
+        distances = np.full(len(self), np.inf)
+        vertex_features = np.repeat(np.arange(len(self)), np.diff(self.coordinate_offsets()))
+        np.minimum.at(distances, vertex_features, np.hypot(*(self.coords - point).T))
+
+        starts, features = self.segments()
+        segment_starts = self.coords[starts]
+        directions = self.coords[starts + 1] - segment_starts
+        to_point = point - segment_starts
+        squared_lengths = (directions ** 2).sum(axis=1)
+        # position of the closest point on each segment, 0 at its start and 1 at its end
+        projections = np.divide(
+            (to_point * directions).sum(axis=1),
+            squared_lengths,
+            out=np.zeros(len(starts)),
+            where=squared_lengths > 0,
+        ).clip(0, 1)
+        np.minimum.at(distances, features, np.hypot(*(to_point - projections[:, None] * directions).T))
+
+        distances[self.contains(x, y)] = 0
+        return distances
+
+    def nearest(self, x: float, y: float) -> tuple[int, float] | None:
+        """
+        Find the geometry nearest to a point.
+
+        The spatial index is searched in growing squares around the point until a candidate is found.
+        Its distance bounds the square holding all geometries that can be nearer.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: position of the nearest geometry and its distance, None if there are no geometries
+        """
+        index = self.spatial_index
+        point = np.array([x, y])
+        corners = np.array([index.origin, index.origin + index.shape * index.bucket_size])
+        max_radius = np.abs(corners - point).max()
+
+        # the search starts at the edge of the indexed area if the point lies outside of it
+        radius = max(index.bucket_size, np.max(np.maximum(corners[0] - point, point - corners[1])))
+        candidates = index.query((x - radius, y - radius, x + radius, y + radius))
+        while not len(candidates) and radius < max_radius:
+            radius *= 2
+            candidates = index.query((x - radius, y - radius, x + radius, y + radius))
+        if not len(candidates):
+            return None
+
+        # padded, the square of the exact distance can miss the candidate by rounding far away from the geometries
+        radius = self.take(candidates).distances(x, y).min()
+        radius = radius * (1 + 1e-9) + 1e-9 * np.abs(point).max()
+        candidates = np.union1d(candidates, index.query((x - radius, y - radius, x + radius, y + radius)))
+        distances = self.take(candidates).distances(x, y)
+        nearest = distances.argmin()
+
+        return int(candidates[nearest]), float(distances[nearest])
+
+    def containing(self, x: float, y: float) -> np.ndarray:
+        """
+        Find the (Multi)Polygons containing a point, only geometries whose envelope contains it are checked.
+
+        :param float x: x coordinate of the point
+        :param float y: y coordinate of the point
+        :return: positions of the geometries containing the point
+        """
+        candidates = self.spatial_index.query((x, y, x, y))
+        return candidates[self.take(candidates).contains(x, y)]
+
+    def differs(self, other: "GeometryStore") -> np.ndarray:
+        """
+        Compare the geometries with the geometries of another store feature by feature.
+
+        :param GeometryStore other: store with as many geometries, e.g. the previous geometries of the same features
+        :return: boolean array, True for the features whose coordinates or parts differ
+        """
+        if self.geometry_type != other.geometry_type or len(self.offsets) != len(other.offsets):
+            return np.ones(len(self), dtype=bool)
+
+        # features with different numbers of parts or coordinates
+        differ = np.zeros(len(self), dtype=bool)
+        spans, other_spans = np.arange(len(self) + 1), np.arange(len(other) + 1)
+        for level_offsets, other_level_offsets in zip(self.offsets, other.offsets):
+            spans, other_spans = level_offsets[spans], other_level_offsets[other_spans]
+            differ |= np.diff(spans) != np.diff(other_spans)
+
+        # the other features have the same numbers of elements on every level, their arrays are aligned
+        same = np.flatnonzero(~differ)
+        geometries, other_geometries = self.take(same), other.take(same)
+        element_features = np.arange(len(same))
+        for level_offsets, other_level_offsets in zip(geometries.offsets, other_geometries.offsets):
+            # an element ends elsewhere if it or an element before it in the same feature has another length
+            differ[same[element_features[level_offsets[1:] != other_level_offsets[1:]]]] = True
+            element_features = np.repeat(element_features, np.diff(level_offsets))
+        coords_differ = (geometries.coords != other_geometries.coords).any(axis=1)
+        differ[same[element_features[coords_differ]]] = True
+        return differ
+
+    def take(self, rows: np.ndarray) -> "GeometryStore":
+        """
+        Select geometries by position.
+
+        :param np.ndarray rows: positions of the geometries to keep, in the new order
+        :return: GeometryStore with the selected geometries
+        """
+        offsets = []
+        for level_offsets in self.offsets:
+            starts = level_offsets[rows]
+            lengths = level_offsets[rows + 1] - starts
+            new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_offsets[1:])
+            offsets.append(new_offsets)
+            rows = _expand_ranges(starts, lengths)
+
+        return GeometryStore(self.geometry_type, self.coords[rows], offsets, self.crs)
+
+
+def _expand_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate the ranges [starts[i], starts[i] + lengths[i]) into one position array."""
+    range_starts = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) + np.repeat(starts - range_starts, lengths)
@@ -0,0 +1,63 @@
+"""
+Queries of the CacheUpdater. Only the columns of the response are selected and
+clickhouse formats them like transform_raw_data would: timestamps as iso8601
+strings, the forecast range as R<n>/<first prediction>/PT<h>H and pm25 as pm2.5.
+"""
+from fairqapi.internal.data_utils import get_iso_format, get_property_cols, get_raw_col
+
+# hours between two forecast values of each endpoint
+FORECAST_INTERVAL_IN_HOURS = {"stations": 1, "grid": 1, "streets": 1, "lor": 24, "simulation": 24}
+
+
+def iso_datetime(column: str) -> str:
+    """
+    SQL expression formatting a DateTime column with the iso format of get_iso_format.
+
+    :param str column: DateTime column, e.g. "date_time_forecast"
+    :return: expression returning e.g. "2022-10-24T13:00:00.000000Z"
+    """
+    return f"concat(replaceOne(toString({column}), ' ', 'T'), '.000000Z')"
+
+
+def forecast_range(forecast_interval_in_hours: int) -> str:
+    """
+    SQL expression for the forecast range, see add_forecast_range_iso.
+
+    :param int forecast_interval_in_hours: hours between two forecast values
+    :return: expression returning e.g. "R80/2022-10-24T14:00:00.000000Z/PT1H"
+    """
+    interval_in_seconds = 3600 * forecast_interval_in_hours
+    horizon = f"intDiv(dateDiff('second', first_pred_date_time, last_pred_date_time), {interval_in_seconds}) + 1"
+    return "concat('R', toString({horizon}), '/', {first}, '/PT{interval}H')".format(
+        horizon=horizon,
+        first=iso_datetime("first_pred_date_time"),
+        interval=forecast_interval_in_hours,
+    )
+
+
+def forecast_query(endpoint: str, since: bool = False, point_cols: tuple = ()) -> str:
+    """
+    Query the formatted properties of an endpoint.
+
+    :param str endpoint: name of the endpoint, the table is api_<endpoint>
+    :param bool since: only select rows with a date_time_forecast >= the query parameter "since"
+    :param tuple point_cols: additional columns, e.g. ("x", "y") for the point geometries of stations
+    :return: select query
+    """
+    iso = get_iso_format()
+    expressions = {
+        "date_time_forecast_" + iso["name"]: iso_datetime("date_time_forecast"),
+        "forecast_range_" + iso["name"]: forecast_range(FORECAST_INTERVAL_IN_HOURS[endpoint]),
+    }
+
+    columns = list(point_cols)
+    for col in get_property_cols(endpoint):
+        expression = expressions.get(col, get_raw_col(col))
+        columns.append(col if expression == col else f"{expression} as `{col}`")
+
+    where = " where date_time_forecast >= %(since)s" if since else ""
+    return "select {columns} from api_{endpoint} final{where};".format(
+        columns=", ".join(columns),
+        endpoint=endpoint,
+        where=where,
+    )
@@ -0,0 +1,546 @@
+"""Encoded and precompressed responses with ETags, bounded by a byte budget, and streamed large responses."""
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Iterator
+
+import numpy as np
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic.error_wrappers import ErrorWrapper
+
+from fairqapi.cache.aggregation import AGGREGATION_GROUPS, aggregate, render_aggregation
+from fairqapi.cache.changes import ChangeLog, iter_changes, render_changes
+from fairqapi.formats.negotiation import DEFAULT_FORMAT, encode_page, media_type
+from fairqapi.schemas.request import AggregateRequest, ChangesRequest, Request
+
+try:
+    import brotli
+except ImportError:  # brotli is a dependency, responses are only gzip compressed in environments without it
+    brotli = None
+
+# responses smaller than this are not worth compressing (same threshold as starlette's GZipMiddleware)
+MINIMUM_COMPRESSION_SIZE = 500
+# moderate levels: a variant missing from the cache is compressed while its request waits
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# pages with at least this many features are streamed in chunks instead of being encoded at once and cached
+STREAMING_MIN_FEATURES = int(os.getenv("STREAMING_MIN_FEATURES", 10000))
+FEATURES_PER_CHUNK = 1000
+# responses depend on the output format (Accept) and the content coding
+VARY = "Accept, Accept-Encoding"
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    """
+    Compress a response body.
+
+    :param bytes content: uncompressed body
+    :param str encoding: content coding, "br" or "gzip"
+    :return: compressed body
+    """
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def supported_encodings() -> list[str]:
+    """Return the content codings in order of preference."""
+    if brotli is None:
+        return ["gzip"]
+    return ["br", "gzip"]
+
+
+def choose_encoding(accept_encoding: str | None, encodings: list[str] | None = None) -> str:
+    """
+    Choose the content coding from an Accept-Encoding header.
+
+    :param str accept_encoding: value of the Accept-Encoding header, e.g. "gzip, deflate, br;q=0.5"
+    :param list encodings: codings to choose from in order of preference, the supported ones if None
+    :return: the coding with the highest quality, "identity" if there is none
+    """
+    qualities = {}
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    candidates = [
+        (qualities.get(encoding, qualities.get("*", 0)), -preference, encoding)
+        for preference, encoding in enumerate(encodings or supported_encodings())
+    ]
+    quality, _, encoding = max(candidates)
+    if quality <= 0:
+        return "identity"
+    return encoding
+
+
+class EncodedResponse():
+    """
+    This class holds one encoded response (json or a binary format) and its
+    compressed variants. A variant is compressed when it is first requested,
+    or at load time for the responses rendered by the Cache (see precompress).
+    Every variant has its own strong ETag ("<version>-<digest>[-<coding>]").
+    """
+
+    def __init__(self, content: bytes, version: int, digest: str, media_type: str = "application/json"):
+        """
+        :param bytes content: uncompressed body
+        :param int version: version of the cached data the response was built from
+        :param str digest: digest of the request the response answers
+        :param str media_type: Content-Type of the body
+        """
+        self.content = content
+        self.media_type = media_type
+        self.etag_base = f"{version}-{digest}"
+        self.variants = {"identity": content}
+
+    @property
+    def size(self) -> int:
+        return sum(len(variant) for variant in self.variants.values())
+
+    def etag(self, encoding: str) -> str:
+        if encoding == "identity":
+            return f'"{self.etag_base}"'
+        return f'"{self.etag_base}-{encoding}"'
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """Check an If-None-Match header (weak comparison) against all variants of this response."""
+        return etag_matches(if_none_match, [self.etag(encoding) for encoding in ["identity", *supported_encodings()]])
+
+    def variant(self, encoding: str) -> bytes:
+        """Return the body for a content coding, compressing it on first use."""
+        if encoding not in self.variants:
+            self.variants[encoding] = compress(self.content, encoding)
+        return self.variants[encoding]
+
+    def precompress(self) -> "EncodedResponse":
+        """Compress all variants now, e.g. while the cache is loaded in its worker thread."""
+        if len(self.content) >= MINIMUM_COMPRESSION_SIZE:
+            for encoding in supported_encodings():
+                self.variant(encoding)
+        return self
+
+    def to_response(self, accept_encoding: str | None = None, if_none_match: str | None = None) -> Response:
+        """
+        Build the http response for the request headers.
+
+        :param str accept_encoding: value of the Accept-Encoding header
+        :param str if_none_match: value of the If-None-Match header
+        :return: 304 without body if the client has this response, else the (compressed) body
+        """
+        encoding = choose_encoding(accept_encoding)
+        if len(self.content) < MINIMUM_COMPRESSION_SIZE:
+            encoding = "identity"
+
+        headers = {"ETag": self.etag(encoding), "Vary": VARY}
+        if self.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variant(encoding), media_type=self.media_type, headers=headers)
+
+
+class StreamedResponse():
+    """
+    This class streams a large json response chunk by chunk, so the memory of
+    a request does not grow with the size of the page and the first bytes
+    are sent at once. Streamed responses are not cached. They are gzip
+    compressed on the fly; the compressed stream has a weak ETag because
+    it is not byte for byte the cached gzip variant.
+    """
+
+    def __init__(self, chunks: Callable[[], Iterator[bytes]], version: int, digest: str):
+        """
+        :param chunks: function returning a generator of the parts of the uncompressed json
+        :param int version: version of the cached data the response is built from
+        :param str digest: digest of the request the response answers
+        """
+        self.chunks = chunks
+        self.etag_base = f"{version}-{digest}"
+
+    def etag(self, encoding: str) -> str:
+        if encoding == "identity":
+            return f'"{self.etag_base}"'
+        return f'W/"{self.etag_base}-{encoding}"'
+
+    def to_response(self, accept_encoding: str | None = None, if_none_match: str | None = None) -> Response:
+        """
+        Build the http response for the request headers.
+
+        :param str accept_encoding: value of the Accept-Encoding header
+        :param str if_none_match: value of the If-None-Match header
+        :return: 304 without body if the client has this response, else the (gzip compressed) json stream
+        """
+        encoding = "gzip" if choose_encoding(accept_encoding, ["gzip"]) == "gzip" else "identity"
+        headers = {"ETag": self.etag(encoding), "Vary": VARY}
+        if etag_matches(if_none_match, [self.etag("identity"), self.etag("gzip")]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding == "identity":
+            return StreamingResponse(self.chunks(), media_type="application/json", headers=headers)
+        headers["Content-Encoding"] = encoding
+        return StreamingResponse(gzip_stream(self.chunks()), media_type="application/json", headers=headers)
+
+
+class NotModifiedResponse():
+    """
+    This class answers a conditional request whose ETag the client already has,
+    without rendering the response. The ETags of a response only depend on the
+    version of the data and the request, see response_etags.
+    """
+
+    def __init__(self, etag: str):
+        """
+        :param str etag: ETag of the response the client has
+        """
+        self.etag = etag
+
+    def to_response(self, accept_encoding: str | None = None, if_none_match: str | None = None) -> Response:
+        """
+        Build the http response.
+
+        :return: 304 without body
+        """
+        return Response(status_code=304, headers={"ETag": self.etag, "Vary": VARY})
+
+
+def gzip_stream(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Compress a stream of chunks into one gzip member.
+
+    :param chunks: parts of the uncompressed body
+    :return: generator of the parts of the compressed body
+    """
+    # level 6 instead of 9: streams are compressed for every request, not once per version
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def etag_matches(if_none_match: str | None, etags: list[str]) -> bool:
+    """
+    Check an If-None-Match header against ETags, using the weak comparison.
+
+    :param str if_none_match: value of the If-None-Match header
+    :param list etags: ETags of the response, e.g. ['"1-ab"', 'W/"1-ab-gzip"']
+    :return: True if the client has one of the ETags
+    """
+    return matching_etag(if_none_match, etags) is not None
+
+
+def matching_etag(if_none_match: str | None, etags: list[str]) -> str | None:
+    """
+    Find the ETag of an If-None-Match header, using the weak comparison.
+
+    :param str if_none_match: value of the If-None-Match header
+    :param list etags: ETags of the response, e.g. ['"1-ab"', 'W/"1-ab-gzip"']
+    :return: the first ETag the client has as it sent it, the first ETag for "*", None if it has none
+    """
+    own_tags = {etag.removeprefix("W/").strip('"') for etag in etags}
+    for client_etag in (if_none_match or "").split(","):
+        tag = client_etag.strip().removeprefix("W/").strip('"')
+        if tag == "*" and etags:
+            return etags[0]
+        if tag in own_tags:
+            return client_etag.strip()
+    return None
+
+
+def response_etags(version: int, digest: str) -> list[str]:
+    """Return the ETags of all variants of a response, encoded or streamed, the uncompressed one first."""
+    return [f'"{version}-{digest}"', *[f'"{version}-{digest}-{encoding}"' for encoding in supported_encodings()]]
+
+
+def not_modified(key: tuple, version: int, if_none_match: str | None) -> NotModifiedResponse | None:
+    """
+    Check If-None-Match before a response is rendered.
+
+    :param tuple key: identifies the request, see ResponseCache.get
+    :param int version: version of the cached data
+    :param str if_none_match: value of the If-None-Match header
+    :return: NotModifiedResponse if the client has the response, else None
+    """
+    etag = matching_etag(if_none_match, response_etags(version, request_digest(key)))
+    if etag is None:
+        return None
+    return NotModifiedResponse(etag)
+
+
+def request_digest(key: tuple) -> str:
+    """Return the digest of a request key, part of the ETag."""
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache():
+    """
+    This class keeps the most recently used EncodedResponses, keyed by the
+    dataset version and the request, until their total size exceeds max_bytes.
+    Responses are only compressed once per version of the cached data and
+    requested content coding. Variants compressed after a response was cached
+    count towards the budget from the next insertion on.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param int max_bytes: byte budget for all cached responses and their variants
+        """
+        self.max_bytes = max_bytes
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        key: tuple,
+        version: int,
+        render: Callable[[], bytes],
+        media_type: str = "application/json",
+        if_none_match: str | None = None,
+    ) -> EncodedResponse | NotModifiedResponse:
+        """
+        Return the cached response for a request, render it if it is missing.
+
+        :param tuple key: identifies the request, e.g. ("grid", skip, limit, bbox)
+        :param int version: version of the cached data, part of the ETag
+        :param render: function returning the uncompressed body
+        :param str media_type: Content-Type of the body
+        :param str if_none_match: value of the If-None-Match header, a missing response the client has is not rendered
+        :return: EncodedResponse, NotModifiedResponse if the response is missing and the client has it
+        """
+        cache_key = (*key, version)
+        with self.lock:
+            if cache_key in self.responses:
+                self.responses.move_to_end(cache_key)
+                return self.responses[cache_key]
+
+        not_modified_response = not_modified(key, version, if_none_match)
+        if not_modified_response is not None:
+            return not_modified_response
+
+        encoded_response = EncodedResponse(render(), version, request_digest(key), media_type)
+        if encoded_response.size <= self.max_bytes // 4:
+            with self.lock:
+                self.responses[cache_key] = encoded_response
+                self.evict()
+
+        return encoded_response
+
+    def evict(self):
+        """drop the least recently used responses until the budget is kept."""
+        total_size = sum(cached.size for cached in self.responses.values())
+        while total_size > self.max_bytes and self.responses:
+            _, evicted = self.responses.popitem(last=False)
+            total_size -= evicted.size
+
+
+def page_response(
+    name: str,
+    feature_store,
+    request: Request | None = None,
+    output_format: str = DEFAULT_FORMAT,
+    if_none_match: str | None = None,
+) -> EncodedResponse | StreamedResponse | NotModifiedResponse:
+    """
+    Return the cached response for a page of a FeatureStore, a streamed response for large geojson pages.
+
+    :param str name: name of the endpoint
+    :param FeatureStore feature_store: loaded FeatureStore of the endpoint
+    :param Request request: the page and the selected properties, None for all features
+    :param str output_format: format of the response, see choose_format
+    :param str if_none_match: value of the If-None-Match header, checked before the page is rendered
+    :return: EncodedResponse, StreamedResponse if a geojson page has at least STREAMING_MIN_FEATURES features,
+        NotModifiedResponse if the client has the page and it is not cached
+    """
+    if request is None:
+        if output_format == DEFAULT_FORMAT:
+            return response_cache.get((name,), feature_store.version, feature_store.page, if_none_match=if_none_match)
+        return response_cache.get(
+            (name, output_format),
+            feature_store.version,
+            lambda: render_page(name, feature_store, range(len(feature_store)), None, True, output_format),
+            media_type(output_format),
+            if_none_match,
+        )
+
+    cursor = None
+    if request.cursor is not None:
+        try:
+            feature_store.position_after(request.cursor)
+        except ValueError as error:
+            # e.g. a cursor of another endpoint
+            raise invalid_query_parameter("cursor", error)
+        cursor = request.cursor.encode()
+
+    hours = request.hour_range
+    level = request.simplification_level
+    selection = feature_store.simplified(level)
+    if request.level is not None:
+        try:
+            selection = selection.at_level(request.level)
+        except ValueError as error:
+            raise invalid_query_parameter("level", error)
+    try:
+        # the selected columns are views, selecting is cheap
+        selection = selection.select(request.field_list, request.pollutant_list, hours)
+    except ValueError as error:
+        raise invalid_query_parameter("fields", error)
+
+    key = (
+        name, request.skip, request.limit, request.bbox, cursor,
+        request.pollutants, request.hours, request.fields, request.geometry, level, request.level,
+    )
+    if output_format != DEFAULT_FORMAT:
+        def render() -> bytes:
+            rows, next_cursor = selection.page_rows(request.skip, request.limit, request.bbox_bounds, request.cursor)
+            return render_page(name, selection, rows, next_cursor, request.geometry, output_format)
+
+        return response_cache.get(
+            (*key, output_format), feature_store.version, render, media_type(output_format), if_none_match,
+        )
+
+    if request.limit >= STREAMING_MIN_FEATURES:
+        not_modified_response = not_modified(key, feature_store.version, if_none_match)
+        if not_modified_response is not None:
+            return not_modified_response
+        rows, next_cursor = selection.page_rows(request.skip, request.limit, request.bbox_bounds, request.cursor)
+        if len(rows) >= STREAMING_MIN_FEATURES:
+            return StreamedResponse(
+                lambda: selection.iter_page(rows, next_cursor, request.geometry, FEATURES_PER_CHUNK),
+                feature_store.version,
+                request_digest(key),
+            )
+
+    return response_cache.get(
+        key,
+        feature_store.version,
+        lambda: selection.page(request.skip, request.limit, request.bbox_bounds, request.cursor, request.geometry),
+        if_none_match=if_none_match,
+    )
+
+
+def render_page(
+    name: str,
+    feature_store,
+    rows: range | np.ndarray,
+    next_cursor,
+    geometry: bool,
+    output_format: str,
+) -> bytes:
+    """
+    Encode the features of a page in a binary format.
+
+    :param str name: name of the endpoint
+    :param FeatureStore feature_store: FeatureStore (selection) the page is taken from
+    :param rows: positions of the features, see FeatureStore.page_rows
+    :param Cursor next_cursor: cursor of the next page, None if there are no further features
+    :param bool geometry: include the geometries
+    :param str output_format: one of the binary formats, e.g. "arrow"
+    :return: encoded page
+    """
+    if isinstance(rows, range):
+        rows = np.arange(rows.start, rows.stop)
+    return encode_page(output_format, feature_store.take(rows), next_cursor, geometry, name)
+
+
+def aggregate_response(
+    snapshot,
+    request: AggregateRequest,
+    if_none_match: str | None = None,
+) -> EncodedResponse | NotModifiedResponse:
+    """
+    Return the cached statistics of the grid or street forecasts per LOR or district.
+
+    :param CacheSnapshot snapshot: loaded snapshot with the memberships of the sources
+    :param AggregateRequest request: source, groups, statistics and the selected forecasts
+    :param str if_none_match: value of the If-None-Match header, checked before the statistics are computed
+    :return: EncodedResponse, cached until the source or the LOR are updated
+    """
+    hours = request.hour_range
+    source = getattr(snapshot, request.source)
+    lor = snapshot.lor
+    stats = request.stat_list
+
+    def render() -> bytes:
+        group_ids, groups = snapshot.memberships[request.source].groups(lor.ids, request.by)
+        selection = source.select(None, request.pollutant_list, hours)
+        aggregation = aggregate(selection, group_ids, groups, AGGREGATION_GROUPS[request.by], stats)
+        return render_aggregation(request.source, request.by, aggregation)
+
+    key = ("aggregate", request.source, request.by, tuple(stats), request.pollutants, request.hours)
+    return response_cache.get(key, max(source.version, lor.version), render, if_none_match=if_none_match)
+
+
+def changes_response(
+    name: str,
+    feature_store,
+    change_log: ChangeLog,
+    request: ChangesRequest,
+    if_none_match: str | None = None,
+) -> EncodedResponse | StreamedResponse | NotModifiedResponse:
+    """
+    Return the cached features of a paged endpoint that changed since a version.
+
+    :param str name: name of the endpoint
+    :param FeatureStore feature_store: loaded FeatureStore of the endpoint
+    :param ChangeLog change_log: changes of the endpoint, its version is the version of the FeatureStore
+    :param ChangesRequest request: version the client knows and the selected properties
+    :param str if_none_match: value of the If-None-Match header, checked before the changes are rendered
+    :return: EncodedResponse, StreamedResponse if at least STREAMING_MIN_FEATURES features changed
+    """
+    if request.since > feature_store.version:
+        raise invalid_query_parameter("since", ValueError("The version is newer than the current version."))
+    # versions between two versions of the log share the response of the older one
+    since = change_log.known_version(request.since)
+    if since is None:
+        raise HTTPException(
+            status_code=410,
+            detail=(
+                f"The changes since version {request.since} are not kept anymore. Fetch the features from /{name} "
+                f"and the changes since version {feature_store.version} afterwards."
+            ),
+        )
+    hours = request.hour_range
+    try:
+        selection = feature_store.select(request.field_list, request.pollutant_list, hours)
+    except ValueError as error:
+        raise invalid_query_parameter("fields", error)
+
+    key = ("changes", name, since, request.pollutants, request.hours, request.fields, request.geometry)
+    if change_log.count_since(since) >= STREAMING_MIN_FEATURES:
+        not_modified_response = not_modified(key, feature_store.version, if_none_match)
+        if not_modified_response is not None:
+            return not_modified_response
+        rows, removed_ids = change_log.since(since, feature_store)
+        if len(rows) >= STREAMING_MIN_FEATURES:
+            return StreamedResponse(
+                lambda: iter_changes(selection, rows, removed_ids, since, request.geometry, FEATURES_PER_CHUNK),
+                feature_store.version,
+                request_digest(key),
+            )
+
+    def render() -> bytes:
+        rows, removed_ids = change_log.since(since, feature_store)
+        return render_changes(selection, rows, removed_ids, since, request.geometry)
+
+    return response_cache.get(key, feature_store.version, render, if_none_match=if_none_match)
+
+
+def invalid_query_parameter(name: str, error: ValueError) -> RequestValidationError:
+    """Return the error answering a request with an invalid query parameter with 422, like fastapi's validation."""
+    return RequestValidationError([ErrorWrapper(error, loc=("query", name))])
+
+
+response_cache = ResponseCache(max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 ** 2)))
@@ -0,0 +1,205 @@
+"""
+Simplified versions of the line and polygon geometries for overview maps.
+
+The CacheUpdater simplifies the geometries of streets, simulation and LOR in
+several levels when their geometry file is rebuilt: Douglas-Peucker with the
+tolerance of the level, then the coordinates are rounded. Requests pick a
+level with simplify= or zoom=, level 0 are the stored geometries.
+
+Vertices shared by several lines or rings (street junctions, the ends of the
+borders between neighbouring LOR) are never removed, and the stretches between
+them are simplified the same way in every geometry they belong to. So streets
+stay connected and neighbouring LOR keep a common border without gaps or overlaps.
+"""
+import math
+
+import numpy as np
+
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.tiles.projection import WEB_MERCATOR_HALF_WORLD
+
+# tolerance of the Douglas-Peucker simplification (metres) and decimals the coordinates are rounded to, by level
+SIMPLIFICATION_LEVELS = {1: (1.0, 1), 2: (5.0, 0), 3: (25.0, 0), 4: (100.0, -1)}
+# metres of a WebMercator pixel (256 pixel tiles) at zoom level 0 at the latitude of Berlin
+GROUND_RESOLUTION = 2 * WEB_MERCATOR_HALF_WORLD / 256 * math.cos(math.radians(52.5))
+# coordinates a ring (closed) and a line need at least
+MIN_RING_COORDINATES = 4
+MIN_LINE_COORDINATES = 2
+
+
+def level_for_zoom(zoom: int) -> int:
+    """
+    Return the coarsest simplification level whose tolerance is at most a pixel at a zoom level.
+
+    :param int zoom: WebMercator zoom level of the map
+    :return: simplification level, 0 (not simplified) for the large zoom levels
+    """
+    pixel_size = GROUND_RESOLUTION / 2 ** zoom
+    return max([0, *[level for level, (tolerance, _) in SIMPLIFICATION_LEVELS.items() if tolerance <= pixel_size]])
+
+
+def simplify_levels(geometries: GeometryStore) -> list[GeometryStore]:
+    """
+    Simplify geometries in all levels.
+
+    :param GeometryStore geometries: stored geometries
+    :return: simplified geometries of the levels 1, 2, ...
+    """
+    fixed = None
+    if geometries.offsets:
+        fixed = shared_vertices(geometries.coords, geometries.offsets[-1])
+    return [simplify(geometries, tolerance, decimals, fixed) for tolerance, decimals in SIMPLIFICATION_LEVELS.values()]
+
+
+def simplify(
+    geometries: GeometryStore,
+    tolerance: float,
+    decimals: int,
+    fixed: np.ndarray | None = None,
+) -> GeometryStore:
+    """
+    Simplify geometries with the Douglas-Peucker algorithm and round their coordinates.
+
+    Lines keep their ends and rings at least three distinct vertices, rings that would
+    collapse keep all their vertices. Points are only rounded.
+
+    :param GeometryStore geometries: geometries to simplify
+    :param float tolerance: maximum distance of a removed vertex to the simplified line or ring
+    :param int decimals: decimals the coordinates are rounded to, may be negative
+    :param np.ndarray fixed: vertices that are kept, see shared_vertices, found if None
+    :return: GeometryStore with the simplified geometries, the same features, parts and nesting
+    """
+    if not geometries.offsets:
+        return GeometryStore(geometries.geometry_type, np.round(geometries.coords, decimals), [], geometries.crs)
+
+    coords = geometries.coords
+    part_offsets = geometries.offsets[-1]
+    if fixed is None:
+        fixed = shared_vertices(coords, part_offsets)
+    kept = douglas_peucker(coords, fixed, tolerance)
+
+    is_ring = geometries.geometry_type in {"Polygon", "MultiPolygon"}
+    min_coordinates = MIN_RING_COORDINATES if is_ring else MIN_LINE_COORDINATES
+    part_lengths = np.diff(part_offsets)
+    part_of_vertex = np.repeat(np.arange(len(part_lengths)), part_lengths)
+    needed = np.minimum(part_lengths, min_coordinates)
+    collapsed = np.bincount(part_of_vertex[kept], minlength=len(part_lengths)) < needed
+    kept |= collapsed[part_of_vertex]
+
+    rounded = np.round(coords, decimals)
+    # rounding may merge consecutive vertices, unless the part would collapse
+    duplicate = np.zeros(len(coords), dtype=bool)
+    is_first = np.zeros(len(coords), dtype=bool)
+    is_first[part_offsets[:-1][part_lengths > 0]] = True
+    kept_rows = np.flatnonzero(kept)
+    is_repeated = (rounded[kept_rows[1:]] == rounded[kept_rows[:-1]]).all(axis=1)
+    duplicate[kept_rows[1:]] = is_repeated & ~is_first[kept_rows[1:]]
+    remaining = np.bincount(part_of_vertex[kept & ~duplicate], minlength=len(part_lengths))
+    kept &= ~(duplicate & (remaining >= needed)[part_of_vertex])
+
+    new_part_offsets = np.zeros(len(part_offsets), dtype=np.int64)
+    np.cumsum(np.bincount(part_of_vertex[kept], minlength=len(part_lengths)), out=new_part_offsets[1:])
+    return GeometryStore(
+        geometries.geometry_type,
+        rounded[kept],
+        [*geometries.offsets[:-1], new_part_offsets],
+        geometries.crs,
+    )
+
+
+def shared_vertices(coords: np.ndarray, part_offsets: np.ndarray) -> np.ndarray:
+    """
+    Find the vertices every simplification keeps: the ends of the lines and rings and the
+    vertices where the number of lines or rings sharing a vertex changes (junctions, ends of common borders).
+
+    :param np.ndarray coords: coordinates of all lines or rings with shape (n, 2)
+    :param np.ndarray part_offsets: line or ring i has the coordinates [part_offsets[i], part_offsets[i + 1])
+    :return: boolean mask of the fixed vertices, the same for equal coordinates
+    """
+    fixed = np.zeros(len(coords), dtype=bool)
+    non_empty = np.diff(part_offsets) > 0
+    firsts, lasts = part_offsets[:-1][non_empty], part_offsets[1:][non_empty] - 1
+    fixed[firsts] = True
+    fixed[lasts] = True
+    if not len(coords):
+        return fixed
+    # the last vertex of a ring repeats the first, it does not count as shared
+    is_closing = np.zeros(len(coords), dtype=bool)
+    is_closing[lasts] = (coords[lasts] == coords[firsts]).all(axis=1) & (lasts > firsts)
+
+    # equal coordinates get the same vertex id
+    order = np.lexsort((coords[:, 1], coords[:, 0]))
+    is_new_vertex = np.ones(len(coords), dtype=bool)
+    is_new_vertex[1:] = (coords[order[1:]] != coords[order[:-1]]).any(axis=1)
+    vertex_ids = np.empty(len(coords), dtype=np.int64)
+    vertex_ids[order] = np.cumsum(is_new_vertex) - 1
+    occurrences = np.bincount(vertex_ids[~is_closing], minlength=vertex_ids.max() + 1)
+    shared_by = occurrences[vertex_ids]
+    changes = shared_by[1:] != shared_by[:-1]
+    fixed[1:] |= changes
+    fixed[:-1] |= changes
+
+    # a vertex fixed in one line or ring is fixed in all of them
+    fixed_ids = np.zeros(len(occurrences), dtype=bool)
+    fixed_ids[vertex_ids[fixed]] = True
+    return fixed_ids[vertex_ids]
+
+
+def douglas_peucker(coords: np.ndarray, fixed: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of all stretches between fixed vertices at once.
+
+    Every iteration keeps the vertex farthest from the chord of every stretch that has a vertex
+    beyond the tolerance. Chords and ties do not depend on the direction of a stretch, so a border
+    shared by two rings is simplified the same way in both.
+
+    :param np.ndarray coords: coordinates of all lines or rings with shape (n, 2)
+    :param np.ndarray fixed: vertices that are kept, at least the first and last of every line or ring
+    :param float tolerance: maximum distance of a removed vertex to its chord
+    :return: boolean mask of the kept vertices
+    """
+    kept = fixed.copy()
+    candidates = np.flatnonzero(~kept)
+    while len(candidates):
+        kept_rows = np.flatnonzero(kept)
+        following = np.searchsorted(kept_rows, candidates)
+        previous_row, next_row = kept_rows[following - 1], kept_rows[following]
+
+        # chords from the lexicographically smaller to the larger end
+        start, end = coords[previous_row], coords[next_row]
+        swap = (start[:, 0] > end[:, 0]) | ((start[:, 0] == end[:, 0]) & (start[:, 1] > end[:, 1]))
+        start, end = np.where(swap[:, None], end, start), np.where(swap[:, None], start, end)
+        direction = end - start
+        to_vertex = coords[candidates] - start
+        squared_length = (direction ** 2).sum(axis=1)
+        # distance to the chord as segment, like GEOS does
+        projection = np.divide(
+            (to_vertex * direction).sum(axis=1),
+            squared_length,
+            out=np.zeros(len(candidates)),
+            where=squared_length > 0,
+        ).clip(0, 1)
+        offset = to_vertex - projection[:, None] * direction
+        distance = np.hypot(offset[:, 0], offset[:, 1])
+
+        # the candidates between two kept vertices are consecutive
+        is_stretch_start = np.ones(len(candidates), dtype=bool)
+        is_stretch_start[1:] = previous_row[1:] != previous_row[:-1]
+        stretch_starts = np.flatnonzero(is_stretch_start)
+        stretch = np.cumsum(is_stretch_start) - 1
+        max_distance = np.maximum.reduceat(distance, stretch_starts)
+
+        farthest = distance == max_distance[stretch]
+        for axis in (0, 1):
+            axis_coords = np.where(farthest, coords[candidates, axis], np.inf)
+            farthest &= axis_coords == np.minimum.reduceat(axis_coords, stretch_starts)[stretch]
+        _, first_farthest = np.unique(stretch[farthest], return_index=True)
+        split = np.flatnonzero(farthest)[first_farthest]
+        split = split[max_distance[stretch[split]] > tolerance]
+
+        kept[candidates[split]] = True
+        remaining = max_distance[stretch] > tolerance
+        remaining[split] = False
+        candidates = candidates[remaining]
+
+    return kept
@@ -0,0 +1,99 @@
+"""Spatial index over the feature envelopes."""
+import numpy as np
+
+# average number of features per bucket the bucket size is chosen for
+FEATURES_PER_BUCKET = 4
+
+
+class SpatialIndex():
+    """
+    This class is a uniform grid of square buckets over the envelopes
+    (minx, miny, maxx, maxy) of all features. Every feature is registered in
+    all buckets its envelope overlaps, the buckets are stored row by row as
+    one array of feature positions with an offset per bucket. A bounding box
+    query only reads the buckets it overlaps and checks their envelopes.
+    """
+
+    def __init__(self, envelopes: np.ndarray):
+        """
+        :param np.ndarray envelopes: (minx, miny, maxx, maxy) of every feature, nan for empty geometries
+        """
+        self.envelopes = envelopes
+        positions = np.flatnonzero(~np.isnan(envelopes).any(axis=1))
+        valid_envelopes = envelopes[positions]
+
+        if len(positions):
+            self.origin = valid_envelopes[:, :2].min(axis=0)
+            extent = valid_envelopes[:, 2:].max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        envelope_sizes = (valid_envelopes[:, 2:] - valid_envelopes[:, :2]).max(axis=1)
+        self.bucket_size = max(
+            np.sqrt(extent[0] * extent[1] / max(len(positions), 1) * FEATURES_PER_BUCKET),
+            # features along a horizontal or vertical line cover no area
+            extent.max() / max(len(positions), 1) * FEATURES_PER_BUCKET,
+            np.median(envelope_sizes) if len(positions) else 0,
+            1e-9,
+        )
+        self.shape = (extent // self.bucket_size).astype(np.int64) + 1
+
+        lower = ((valid_envelopes[:, :2] - self.origin) // self.bucket_size).astype(np.int64)
+        upper = ((valid_envelopes[:, 2:] - self.origin) // self.bucket_size).astype(np.int64)
+        widths = upper[:, 0] - lower[:, 0] + 1
+        counts = widths * (upper[:, 1] - lower[:, 1] + 1)
+
+        # one entry per (feature, overlapped bucket)
+        entry_features = np.repeat(positions, counts)
+        within_feature = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        entry_widths = np.repeat(widths, counts)
+        bucket_x = np.repeat(lower[:, 0], counts) + within_feature % entry_widths
+        bucket_y = np.repeat(lower[:, 1], counts) + within_feature // entry_widths
+        entry_buckets = bucket_y * self.shape[0] + bucket_x
+
+        order = np.argsort(entry_buckets, kind="stable")
+        self.bucket_features = entry_features[order]
+        self.bucket_offsets = np.zeros(self.shape.prod() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_buckets, minlength=self.shape.prod()), out=self.bucket_offsets[1:])
+
+    def query(self, bbox: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Find all features whose envelope intersects a bounding box.
+
+        :param tuple bbox: (minx, miny, maxx, maxy) in the coordinate reference system of the features
+        :return: sorted positions of the features
+        """
+        minx, miny, maxx, maxy = bbox
+        if minx > maxx or miny > maxy:
+            return np.empty(0, dtype=np.int64)
+
+        # clipped before the conversion to integers, far away bounds would overflow
+        lower = np.maximum((np.array([minx, miny]) - self.origin) // self.bucket_size, 0)
+        upper = np.minimum((np.array([maxx, maxy]) - self.origin) // self.bucket_size, self.shape - 1)
+        if not (lower <= upper).all():
+            # the bounding box lies outside of all buckets
+            return np.empty(0, dtype=np.int64)
+        lower, upper = lower.astype(np.int64), upper.astype(np.int64)
+
+        first_buckets = np.arange(lower[1], upper[1] + 1) * self.shape[0] + lower[0]
+        last_buckets = first_buckets + upper[0] - lower[0]
+        candidates = np.unique(
+            np.concatenate(
+                [
+                    self.bucket_features[:0],
+                    *[
+                        self.bucket_features[self.bucket_offsets[first]:self.bucket_offsets[last + 1]]
+                        for first, last in zip(first_buckets, last_buckets)
+                    ],
+                ],
+            ),
+        )
+
+        envelopes = self.envelopes[candidates]
+        intersects = (
+            (envelopes[:, 0] <= maxx) &
+            (envelopes[:, 2] >= minx) &
+            (envelopes[:, 1] <= maxy) &
+            (envelopes[:, 3] >= miny)
+        )
+        return candidates[intersects]
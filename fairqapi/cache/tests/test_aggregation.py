@@ -0,0 +1,103 @@
+"""test file for aggregation.py."""
+import numpy as np
+
+from fairqapi.cache.aggregation import Membership, aggregate, build_memberships, group_statistic
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+
+
+def get_lor_geometries() -> GeometryStore:
+    """Create three square LOR side by side, the first two in district 01."""
+    squares = [
+        [[[[x, 0.0], [x + 10.0, 0.0], [x + 10.0, 10.0], [x, 10.0], [x, 0.0]]]]
+        for x in (0.0, 10.0, 20.0)
+    ]
+    return GeometryStore.from_coordinates("MultiPolygon", squares)
+
+
+def get_grid_store() -> FeatureStore:
+    """Create grid cells in the LOR and one outside of all of them, the last cell has one forecast value."""
+    points = [[1.0, 1.0], [5.0, 5.0], [15.0, 5.0], [25.0, 5.0], [50.0, 5.0]]
+    geometries = GeometryStore.from_coordinates("Point", points)
+    forecast_ranges = StringColumn.from_values(["R2/2022-10-27T10:00:00.000000Z/PT1H"] * 4 + ["other"])
+    no2 = ValueColumn(
+        np.array([[1.0, 2.0], [3.0, 6.0], [5.0, 5.0], [7.0, 8.0], [9.0, 9.0]]),
+        np.array([2, 2, 2, 1, 2]),
+    )
+    return FeatureStore("id", np.arange(5), geometries, {"forecast_range_iso8601": forecast_ranges}, {"no2": no2})
+
+
+def test_membership_groups() -> None:
+    """This test asserts the LOR and district of every grid cell and street."""
+    # arrange
+    lor_ids = np.array(["01100000", "01100001", "02100000"])
+    streets = GeometryStore.from_coordinates("LineString", [[[1.0, 5.0], [29.0, 5.0]], [[100.0, 0.0], [110.0, 0.0]]])
+
+    # act
+    grid_membership = Membership(get_grid_store().geometries, get_lor_geometries())
+    streets_membership = Membership(streets, get_lor_geometries())
+    district_ids, districts = grid_membership.groups(lor_ids, "district")
+
+    # assert
+    np.testing.assert_array_equal(grid_membership.lor_rows, [0, 0, 1, 2, -1])
+    np.testing.assert_array_equal(streets_membership.lor_rows, [1, -1])
+    np.testing.assert_array_equal(district_ids, ["01", "02"])
+    np.testing.assert_array_equal(districts, [0, 0, 0, 1, -1])
+
+
+def test_build_memberships_reuse() -> None:
+    """This test asserts that memberships are only computed again for changed geometries."""
+    # arrange
+    grid = get_grid_store()
+    lor = FeatureStore("PLR_ID", np.array(["01100000", "01100001", "02100000"]), get_lor_geometries(), {}, {})
+    previous = build_memberships({"grid": grid}, lor, {})
+
+    # act
+    res = build_memberships({"grid": grid}, lor, previous)
+    res_changed = build_memberships({"grid": get_grid_store()}, lor, previous)
+
+    # assert
+    assert res["grid"] is previous["grid"]
+    assert res_changed["grid"] is not previous["grid"]
+
+
+def test_aggregate() -> None:
+    """This test asserts the statistics of every LOR with grid cells, values beyond the horizon are ignored."""
+    # arrange
+    store = get_grid_store()
+    group_ids = np.array(["01100000", "01100001", "02100000"])
+    groups = np.array([0, 0, 1, 2, -1])
+
+    # act
+    res = aggregate(store, group_ids, groups, "PLR_ID", ["mean", "max", "p50"])
+
+    # assert
+    assert res["forecast_range_iso8601"] == "R2/2022-10-27T10:00:00.000000Z/PT1H"
+    assert res["groups"] == [
+        {"PLR_ID": "01100000", "count": 2, "no2_mean": [2.0, 4.0], "no2_max": [3.0, 6.0], "no2_p50": [2.0, 4.0]},
+        {"PLR_ID": "01100001", "count": 1, "no2_mean": [5.0, 5.0], "no2_max": [5.0, 5.0], "no2_p50": [5.0, 5.0]},
+        {"PLR_ID": "02100000", "count": 1, "no2_mean": [7.0, None], "no2_max": [7.0, None], "no2_p50": [7.0, None]},
+    ]
+
+
+def test_group_statistic() -> None:
+    """This test asserts that the statistics of groups equal numpy's nan-ignoring reductions."""
+    # arrange
+    rng = np.random.default_rng(0)
+    values = rng.random((200, 3))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    group_starts = np.array([0, 50, 51, 120])
+    group_ends = np.array([50, 51, 120, 200])
+    groups = [values[start:end] for start, end in zip(group_starts, group_ends)]
+
+    # act & assert
+    np.testing.assert_allclose(
+        group_statistic(values, group_starts, group_ends, "mean"), [np.nanmean(group, axis=0) for group in groups],
+    )
+    np.testing.assert_allclose(
+        group_statistic(values, group_starts, group_ends, "min"), [np.nanmin(group, axis=0) for group in groups],
+    )
+    np.testing.assert_allclose(
+        group_statistic(values, group_starts, group_ends, "p95"),
+        [np.nanpercentile(group, 95, axis=0) for group in groups],
+    )
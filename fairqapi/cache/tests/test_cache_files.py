@@ -0,0 +1,83 @@
+"""test file for cache_files.py."""
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from fairqapi.cache import cache_files
+from fairqapi.cache.tests.test_feature_store import get_grid_df, get_grid_store
+from fairqapi.internal.data_utils import get_property_cols
+from fairqapi.schemas.grid_response import GridResponse
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Write cache files to a temporary directory."""
+    monkeypatch.setattr(cache_files, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_cache_file_round_trip() -> None:
+    """This test asserts that a stored FeatureStore is restored with memory mapped arrays."""
+    # arrange
+    store = get_grid_store(3)
+    geometry_file = {"checksum": (3, 42), "ids": store.ids, "geometries": store.geometries}
+
+    # act
+    cache_files.save_cache_file(store, "grid")
+    cache_files.save_cache_file(geometry_file, "grid_geometry")
+    res_store = cache_files.load_cache_file("grid")
+    res_geometry_file = cache_files.load_cache_file("grid_geometry")
+
+    # assert
+    assert res_store.page() == store.page()
+    assert isinstance(res_store.values["no2"].values, np.memmap)
+    assert not res_store.values["no2"].values.flags.writeable
+    assert res_geometry_file["checksum"] == (3, 42)
+    assert res_geometry_file["ids"].tolist() == [0, 1, 2]
+
+
+def test_cache_file_replaces_previous_versions(cache_dir) -> None:
+    """This test asserts that only the current and the previous blocks are kept and old pickles are removed."""
+    # arrange
+    with open(cache_dir / "grid.pickle", "wb") as handle:
+        pickle.dump(get_grid_store(1), handle)
+
+    # act
+    res_pickle = cache_files.load_cache_file("grid")
+    for n_features in [2, 3, 4]:
+        cache_files.save_cache_file(get_grid_store(n_features), "grid")
+
+    # assert
+    assert len(res_pickle) == 1
+    assert len(cache_files.load_cache_file("grid")) == 4
+    # the index and the blocks of the last two versions
+    assert "grid.pickle" not in os.listdir(cache_dir)
+    assert len(os.listdir(cache_dir)) == 3
+    assert cache_files.load_cache_file("lor") is None
+
+
+def test_cache_file_baseline_pickle(cache_dir) -> None:
+    """This test asserts that a pickled GeoJSON FeatureCollection of the former CacheUpdater is read as FeatureStore."""
+    # arrange
+    df = get_grid_df(3)
+    # the features as the former df_to_geojson built them from the rows of the transformed data
+    geojson = {"type": "FeatureCollection", "features": []}
+    for _, row in df.iterrows():
+        geojson["features"].append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [row["x"], row["y"]], "crs": "EPSG:25833"},
+                "properties": {prop: row[prop] for prop in get_property_cols("grid")},
+            },
+        )
+    with open(cache_dir / "grid.pickle", "wb") as handle:
+        pickle.dump(geojson, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # act
+    res = cache_files.load_cache_file("grid")
+
+    # assert
+    assert cache_files.cache_file_path("grid") == str(cache_dir / "grid.pickle")
+    assert res.validate(GridResponse).page() == get_grid_store(3).page()
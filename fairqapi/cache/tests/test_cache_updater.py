@@ -0,0 +1,116 @@
+"""test file for cache_updater.py."""
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from fairqapi.cache import cache_files, cache_updater
+from fairqapi.cache.cache_updater import CacheUpdater
+from fairqapi.internal.data_utils import get_property_cols, transform_raw_data
+
+
+class FakeClient():
+    """Answers the forecast queries of the CacheUpdater from a raw data frame, formatted like clickhouse would."""
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table
+        self.queries = []
+
+    def execute(self, query):
+        return [(len(self.table), self.table["date_time_forecast"].max().to_pydatetime())]
+
+    def execute_iter(self, query, params=None, with_column_types=False):
+        self.queries.append((query, params))
+        table = self.table
+        if params is not None:
+            table = table[table["date_time_forecast"] >= params["since"]]
+        # clickhouse does not sort the rows like transform_raw_data
+        table = transform_raw_data(table.copy(), endpoint="grid", forecast_interval_in_hours=1).loc[table.index]
+        table = table[get_property_cols("grid")]
+        yield [(name, str(dtype)) for name, dtype in table.dtypes.items()]
+        yield from table.itertuples(index=False, name=None)
+
+
+def get_raw_grid_df(ids: list[int], computed_at: str, no2: float) -> pd.DataFrame:
+    """Create raw grid forecasts as queried from api_grid."""
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "date_time_forecast": pd.to_datetime([computed_at] * len(ids)),
+            "first_pred_date_time": pd.to_datetime(["2022-10-27 10:00"] * len(ids)),
+            "last_pred_date_time": pd.to_datetime(["2022-10-27 11:00"] * len(ids)),
+            "no2": [[no2, float(idx)] for idx in ids],
+            "pm10": [[1.5, 2.5]] * len(ids),
+            "pm25": [[3.5, 4.5]] * len(ids),
+        }
+    )
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch) -> FakeClient:
+    """Write cache files to a temporary directory and query a fake database."""
+    monkeypatch.setattr(cache_files, "CACHE_DIR", str(tmp_path))
+    client = FakeClient(get_raw_grid_df([1, 2, 3], "2022-10-27 09:10", 10.5))
+
+    @contextmanager
+    def fake_connect():
+        yield client
+
+    monkeypatch.setattr(cache_updater, "db_connect", fake_connect)
+    return client
+
+
+def test_update_forecasts_incremental(client) -> None:
+    """This test asserts that only new rows are queried and merged into the stored forecasts by id."""
+    # arrange
+    updater = CacheUpdater()
+    updater.update_forecasts("grid")
+    client.table = pd.concat(
+        [client.table.iloc[[0, 2]], get_raw_grid_df([2, 4], "2022-10-27 12:10", 20.5)],
+        ignore_index=True,
+    )
+
+    # act
+    updater.update_forecasts("grid")
+    res = cache_files.load_cache_file("grid")
+
+    # assert
+    assert client.queries[-1][1] == {"since": pd.Timestamp("2022-10-27 07:10")}
+    assert res.ids.tolist() == [1, 2, 3, 4]
+    assert res.values["no2"].to_list(0, 4) == [[10.5, 1.0], [20.5, 2.0], [10.5, 3.0], [20.5, 4.0]]
+    assert res.strings["date_time_forecast_iso8601"].to_list(0, 4)[1] == "2022-10-27T12:10:00.000000Z"
+
+
+def test_update_forecasts_unchanged_and_deleted(client) -> None:
+    """This test asserts that unchanged tables are not queried and deleted rows lead to a full refresh."""
+    # arrange
+    updater = CacheUpdater()
+    updater.update_forecasts("grid")
+
+    # act
+    updater.update_forecasts("grid")
+    n_queries_unchanged = len(client.queries)
+    client.table = get_raw_grid_df([1, 3], "2022-10-27 12:10", 20.5)
+    updater.update_forecasts("grid")
+
+    # assert
+    assert n_queries_unchanged == 1
+    assert [params for _, params in client.queries[1:]] == [{"since": pd.Timestamp("2022-10-27 07:10")}, None]
+    assert cache_files.load_cache_file("grid").ids.tolist() == [1, 3]
+
+
+def test_update_forecasts_blocks(client, monkeypatch) -> None:
+    """This test asserts that rows streamed in several blocks are stored like rows queried at once."""
+    # arrange
+    monkeypatch.setattr(cache_updater, "FIRST_BLOCK_ROWS", 2)
+    client.table = get_raw_grid_df([3, 1, 2, 5, 4], "2022-10-27 09:10", 10.5)
+    updater = CacheUpdater(memory_budget=1)
+
+    # act
+    updater.update_forecasts("grid")
+    res = cache_files.load_cache_file("grid")
+
+    # assert
+    assert res.ids.tolist() == [1, 2, 3, 4, 5]
+    assert res.values["no2"].to_list(0, 5) == [[10.5, float(idx)] for idx in [1, 2, 3, 4, 5]]
+    assert updater.timings.report().startswith("grid: query")
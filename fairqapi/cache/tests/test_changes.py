@@ -0,0 +1,122 @@
+"""test file for changes.py."""
+import json
+
+import numpy as np
+
+from fairqapi.cache.changes import ChangeLog, build_change_logs, diff, iter_changes, render_changes
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+
+
+def get_grid_store(ids: list[int], no2: list[list[float]], version: int, points: list | None = None) -> FeatureStore:
+    """Create a grid FeatureStore of one version, forecasts with nan are shorter."""
+    values = np.array(no2)
+    horizons = (~np.isnan(values)).sum(axis=1)
+    points = points or [[float(feature_id), 0.0] for feature_id in ids]
+    store = FeatureStore(
+        "id",
+        np.array(ids),
+        GeometryStore.from_coordinates("Point", points),
+        {"forecast_range_iso8601": StringColumn.from_values(["R2/2022-10-27T10:00:00.000000Z/PT1H"] * len(ids))},
+        {"no2": ValueColumn(values, horizons)},
+    )
+    store.version = version
+    return store
+
+
+def test_diff() -> None:
+    """This test asserts the new, changed and removed features, forecasts beyond the horizon are ignored."""
+    # arrange
+    previous = get_grid_store([1, 2, 3, 4, 5], [[1.0, 2.0], [3.0, 4.0], [5.0, np.nan], [7.0, 8.0], [9.0, 9.0]], 1)
+    current = get_grid_store(
+        [2, 3, 4, 5, 6],
+        [[3.0, 4.0], [5.0, np.nan], [7.0, np.nan], [9.0, 9.0], [1.0, 1.0]],
+        2,
+        [[2.0, 0.0], [3.0, 0.0], [4.0, 0.0], [5.0, 1.0], [6.0, 0.0]],
+    )
+
+    # act
+    changed_ids, removed_ids = diff(previous, current)
+
+    # assert
+    np.testing.assert_array_equal(changed_ids, [4, 5, 6])
+    np.testing.assert_array_equal(removed_ids, [1])
+    assert [len(ids) for ids in diff(current, current)] == [0, 0]
+
+
+def test_diff_encoded_values() -> None:
+    """This test asserts that values are compared as they are encoded, 0.0 and -0.0 differ."""
+    # arrange
+    previous = get_grid_store([1, 2, 3], [[0.0, 1.0], [np.nan, np.nan], [1.0, 2.0]], 1)
+    current = get_grid_store([1, 2, 3], [[-0.0, 1.0], [-np.nan, np.nan], [1.0, 2.0 + 1e-15]], 2)
+
+    # act
+    changed_ids, removed_ids = diff(previous, current)
+
+    # assert
+    np.testing.assert_array_equal(changed_ids, [1, 3])
+    assert len(removed_ids) == 0
+
+
+def test_change_log() -> None:
+    """This test asserts the changes since a version, features removed and added again are changed."""
+    # arrange
+    first = get_grid_store([1, 2, 3], [[1.0], [2.0], [3.0]], 10)
+    second = get_grid_store([2, 3], [[2.0], [4.0]], 20)
+    third = get_grid_store([1, 2, 3], [[1.0], [2.0], [4.0]], 30)
+    logs = build_change_logs({"grid": first}, {}, {})
+
+    # act
+    logs = build_change_logs({"grid": second}, {"grid": first}, logs)
+    logs = build_change_logs({"grid": third}, {"grid": second}, logs)
+    change_log = logs["grid"]
+
+    # assert
+    assert (change_log.first_version, change_log.version) == (10, 30)
+    rows, removed_ids = change_log.since(10, third)
+    np.testing.assert_array_equal(third.ids[rows], [1, 3])
+    assert len(removed_ids) == 0
+    rows, removed_ids = change_log.since(20, third)
+    np.testing.assert_array_equal(third.ids[rows], [1])
+    rows, removed_ids = change_log.since(10, second)
+    np.testing.assert_array_equal(removed_ids, [1])
+    assert change_log.since(9, third) is None
+    assert [change_log.known_version(version) for version in [9, 10, 19, 20, 25, 30, 31]] == [
+        None, 10, 10, 20, 20, 30, 30,
+    ]
+    assert (change_log.count_since(10), change_log.count_since(20), change_log.count_since(30)) == (2, 1, 0)
+    assert build_change_logs({"grid": third}, {"grid": third}, logs)["grid"] is change_log
+
+
+def test_change_log_max_versions() -> None:
+    """This test asserts that the oldest changes are dropped."""
+    # arrange
+    stores = [get_grid_store([1], [[float(version)]], version) for version in range(4)]
+    change_log = ChangeLog(0)
+
+    # act
+    for previous, current in zip(stores[:-1], stores[1:]):
+        change_log = change_log.with_change(previous, current, max_versions=2)
+
+    # assert
+    assert [change.version for change in change_log.changes] == [2, 3]
+    assert change_log.first_version == 1
+    assert change_log.since(0, stores[-1]) is None
+
+
+def test_iter_changes() -> None:
+    """This test asserts that the changes encoded chunk by chunk are the changes encoded at once."""
+    # arrange
+    store = get_grid_store([1, 2, 3, 4], [[1.0], [2.0], [3.0], [4.0]], 20)
+    rows, removed_ids = np.array([0, 2, 3]), np.array([5])
+
+    # act
+    chunks = list(iter_changes(store, rows, removed_ids, 10, False, features_per_chunk=2))
+
+    # assert
+    assert len(chunks) > 2
+    content = json.loads(b"".join(chunks))
+    assert content == json.loads(render_changes(store, rows, removed_ids, 10, False))
+    assert (content["version"], content["since"], content["removed"]) == (20, 10, [5])
+    assert [feature["properties"]["id"] for feature in content["features"]] == [1, 3, 4]
+    assert content["features"][0]["geometry"] is None
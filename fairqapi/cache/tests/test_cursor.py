@@ -0,0 +1,26 @@
+"""test file for cursor.py."""
+import pytest
+
+from fairqapi.cache.cursor import Cursor
+
+
+def test_cursor_encode_decode() -> None:
+    """This test asserts that a cursor is restored from its url safe token."""
+    # arrange
+    cursor = Cursor(1667000000000000000, 41, "47420012_47420011.02")
+
+    # act
+    token = cursor.encode()
+    res = Cursor.decode(token)
+
+    # assert
+    assert "=" not in token and "/" not in token and "+" not in token
+    assert (res.version, res.position, res.key) == (1667000000000000000, 41, "47420012_47420011.02")
+
+
+@pytest.mark.parametrize("token", ["", "abc", "W10", "WzEsMiwzLjVd", "eyJhIjoxfQ"])
+def test_cursor_decode_invalid(token: str) -> None:
+    """This test asserts that malformed tokens are rejected."""
+    # act & assert
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        Cursor.decode(token)
@@ -0,0 +1,386 @@
+"""test file for feature_store.py."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.feature_store import FeatureStore, FeatureStoreBuilder, SimulationTensor, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.internal.data_utils import get_property_cols
+from fairqapi.schemas.grid_response import GridResponse
+
+
+def get_grid_df(n_features: int) -> pd.DataFrame:
+    """Create grid data as returned by transform_raw_data."""
+    return pd.DataFrame(
+        {
+            "x": [415725] * n_features,
+            "y": [5810275 + 50 * idx for idx in range(n_features)],
+            "id": list(range(n_features)),
+            "date_time_forecast_iso8601": ["2022-10-27T09:14:45.000000Z"] * n_features,
+            "forecast_range_iso8601": ["R2/2022-10-27T10:00:00.000000Z/PT1H"] * n_features,
+            "no2": [[22.4, idx] for idx in range(n_features)],
+            "pm10": [[23.5, 21.8]] * n_features,
+            "pm2.5": [[42.4, 9.2]] * n_features,
+        }
+    )
+
+
+def get_grid_store(n_features: int) -> FeatureStore:
+    """Create a validated grid FeatureStore."""
+    df = get_grid_df(n_features)
+    return FeatureStore.from_frame(df, get_property_cols("grid"), GeometryStore.from_frame(df, "Point")).validate(
+        GridResponse,
+    )
+
+
+def test_feature_store_page() -> None:
+    """This test asserts that a page contains the validated features [skip, skip + limit)."""
+    # arrange
+    store = get_grid_store(5)
+
+    # act
+    res = json.loads(store.page(skip=1, limit=2))
+
+    # assert
+    assert len(store) == 5
+    assert res["type"] == "FeatureCollection"
+    assert [feature["properties"]["id"] for feature in res["features"]] == [1, 2]
+    assert res["features"][0]["geometry"] == {"type": "Point", "coordinates": [415725, 5810325], "crs": "EPSG:25833"}
+    assert res["features"][0]["properties"]["date_time_forecast_iso8601"] == "2022-10-27T09:14:45+00:00"
+    assert res["features"][0]["properties"]["no2"] == [22.4, 1.0]
+    assert res["features"][0]["properties"]["pm2.5"] == [42.4, 9.2]
+
+
+def test_feature_store_page_bounds() -> None:
+    """This test asserts correct pages at and beyond the end of the features."""
+    # arrange
+    store = get_grid_store(3)
+
+    # act
+    res_all = json.loads(store.page())
+    res_tail = json.loads(store.page(skip=2, limit=10))
+    res_empty = json.loads(store.page(skip=5, limit=10))
+
+    # assert
+    assert len(res_all["features"]) == 3
+    assert [feature["properties"]["id"] for feature in res_tail["features"]] == [2]
+    assert res_empty == {"type": "FeatureCollection", "features": []}
+
+
+def test_feature_store_iter_page() -> None:
+    """This test asserts that a page encoded in chunks is the page encoded at once."""
+    # arrange
+    store = get_grid_store(7)
+    rows, next_cursor = store.page_rows(skip=1, limit=5)
+    bbox_rows, bbox_cursor = store.page_rows(limit=4, bbox=(415725, 5810275, 415725, 5810475))
+
+    # act
+    chunks = list(store.iter_page(rows, next_cursor, features_per_chunk=2))
+    bbox_chunks = list(store.iter_page(bbox_rows, bbox_cursor, features_per_chunk=3))
+
+    # assert
+    assert len(chunks) == 7
+    assert b"".join(chunks) == store.page(skip=1, limit=5)
+    assert b"".join(bbox_chunks) == store.page(limit=4, bbox=(415725, 5810275, 415725, 5810475))
+
+
+def test_feature_store_page_cursor() -> None:
+    """This test asserts that following the next cursors visits every feature once."""
+    # arrange
+    store = get_grid_store(7)
+    pages = [json.loads(store.page(limit=3))]
+
+    # act
+    while "next" in pages[-1]:
+        pages.append(json.loads(store.page(limit=3, cursor=Cursor.decode(pages[-1]["next"]))))
+
+    # assert
+    assert [[feature["properties"]["id"] for feature in page["features"]] for page in pages] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_feature_store_page_cursor_new_version() -> None:
+    """This test asserts that a crawl continues after the last id if the data changed in between."""
+    # arrange
+    store = get_grid_store(7)
+    store.version = 1
+    cursor = Cursor.decode(json.loads(store.page(limit=3))["next"])
+    newer = store.take(np.array([0, 1, 3, 4, 5, 6]))
+    newer.version = 2
+
+    # act
+    res = json.loads(newer.page(limit=3, cursor=cursor))
+    res_bbox = json.loads(newer.page(limit=3, bbox=(415725, 5810275, 415725, 5810475), cursor=cursor))
+
+    # assert
+    assert cursor.position == 2
+    assert newer.position_after(cursor) == 2
+    assert [feature["properties"]["id"] for feature in res["features"]] == [3, 4, 5]
+    assert [feature["properties"]["id"] for feature in res_bbox["features"]] == [3, 4]
+    assert "next" not in res_bbox
+
+
+def test_feature_store_select() -> None:
+    """This test asserts that the selected properties and forecast hours are paged, without geometries if requested."""
+    # arrange
+    store = get_grid_store(3)
+
+    # act
+    selection = store.select(fields=["forecast_range_iso8601", "no2", "pm10"], pollutants=["no2"], hours=(1, 1))
+    res = json.loads(selection.page(limit=2, geometry=False))
+
+    # assert
+    assert selection.property_names == ["id", "forecast_range_iso8601", "no2"]
+    assert selection.values["no2"].values.base is not None
+    assert res["features"][1] == {
+        "type": "Feature",
+        "geometry": None,
+        "properties": {"id": 1, "forecast_range_iso8601": "R1/2022-10-27T11:00:00.000000Z/PT1H", "no2": [1.0]},
+    }
+    with pytest.raises(ValueError, match="Unknown properties"):
+        store.select(fields=["co2"])
+
+
+def test_feature_store_with_geometries() -> None:
+    """This test asserts that separately stored geometries are joined by id."""
+    # arrange
+    df = get_grid_df(3)
+    store = FeatureStore.from_frame(df.iloc[[0, 2]], get_property_cols("grid"))
+    geometries = GeometryStore.from_frame(df, "Point")
+
+    # act
+    res = store.with_geometries(np.array([0, 1, 2]), geometries).validate(GridResponse)
+
+    # assert
+    assert [feature["geometry"]["coordinates"] for feature in res.features(0, 2)] == [
+        [415725, 5810275],
+        [415725, 5810375],
+    ]
+    with pytest.raises(ValueError, match="No geometry for 1 features"):
+        store.with_geometries(np.array([0, 1]), geometries.take(np.array([0, 1])))
+
+
+def test_feature_store_from_geojson() -> None:
+    """This test asserts that a FeatureCollection of the former cache files is served like a FeatureStore."""
+    # arrange
+    df = get_grid_df(3)
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [row["x"], row["y"]], "crs": "EPSG:25833"},
+                "properties": {name: row[name] for name in get_property_cols("grid")},
+            }
+            for _, row in df.iterrows()
+        ],
+    }
+
+    # act
+    res = FeatureStore.from_geojson(geojson).validate(GridResponse)
+
+    # assert
+    assert res.property_names == get_property_cols("grid")
+    assert res.page() == get_grid_store(3).page()
+    with pytest.raises(ValueError, match="has no features"):
+        FeatureStore.from_geojson({"type": "FeatureCollection", "features": []})
+
+
+def test_feature_store_validate_properties() -> None:
+    """This test asserts that columns not matching the response model are rejected."""
+    # arrange
+    df = get_grid_df(2).rename(columns={"id": "element_nr"})
+    store = FeatureStore.from_frame(df, get_property_cols("streets"), GeometryStore.from_frame(df, "Point"))
+
+    # act & assert
+    with pytest.raises(ValueError, match="do not match the response model"):
+        store.validate(GridResponse)
+
+
+def test_feature_store_validate_rows() -> None:
+    """This test asserts that every row is validated, not only the first and last feature."""
+    # arrange
+    df = get_grid_df(3)
+    df.at[1, "no2"] = [22.4, np.nan]
+    nan_store = FeatureStore.from_frame(df, get_property_cols("grid"), GeometryStore.from_frame(df, "Point"))
+    df = get_grid_df(3)
+    df.loc[1, "x"] = 415725.5
+    float_store = FeatureStore.from_frame(df, get_property_cols("grid"), GeometryStore.from_frame(df, "Point"))
+
+    # act & assert
+    with pytest.raises(ValueError, match="no2 contains missing or infinite forecasts"):
+        nan_store.validate(GridResponse)
+    with pytest.raises(ValueError, match="coordinates has values that are not of type int64"):
+        float_store.validate(GridResponse)
+
+
+def test_value_column_ragged() -> None:
+    """This test asserts that forecasts of different lengths are restored without padding."""
+    # arrange
+    lists = [[1.5, 2.5, 3.5], [4.5], []]
+
+    # act
+    column = ValueColumn.from_lists(lists)
+
+    # assert
+    assert column.values.shape == (3, 3)
+    assert column.to_list(0, 3) == lists
+
+
+def test_value_column_slice() -> None:
+    """This test asserts that sliced ragged forecasts keep their lengths within the slice."""
+    # arrange
+    column = ValueColumn.from_lists([[1.0, 2.0, 3.0], [4.0], []])
+
+    # act
+    res = column.slice(1, 3)
+
+    # assert
+    assert res.to_list(0, 3) == [[2.0, 3.0], [], []]
+
+
+def test_value_column_concat() -> None:
+    """This test asserts that columns with different forecast lengths are appended without padding."""
+    # arrange
+    columns = [ValueColumn.from_lists([[1.5, 2.5]]), ValueColumn.from_lists([[3.5], [4.5, 5.5, 6.5]])]
+
+    # act
+    column = ValueColumn.concat(columns)
+
+    # assert
+    assert column.to_list(0, 3) == [[1.5, 2.5], [3.5], [4.5, 5.5, 6.5]]
+
+
+def test_feature_store_builder() -> None:
+    """This test asserts that blocks appended beyond the expected rows give the concatenated features by id."""
+    # arrange
+    first = get_grid_df(3)
+    second = get_grid_df(4).iloc[1:]
+    second["id"] = [10, 11, 12]
+    second["no2"] = [[1.5], [2.5, 3.5, 4.5], [5.5]]
+    second["forecast_range_iso8601"] = ["R3/2022-10-27T10:00:00.000000Z/PT1H"] * 3
+    builder = FeatureStoreBuilder(expected_rows=2)
+
+    # act
+    for df in [second, first]:
+        builder.append(FeatureStore.from_frame(df, get_property_cols("grid"), GeometryStore.from_frame(df, "Point")))
+    res = builder.build()
+
+    # assert
+    assert res.ids.tolist() == [0, 1, 2, 10, 11, 12]
+    assert res.values["no2"].to_list(2, 5) == [[22.4, 2], [1.5], [2.5, 3.5, 4.5]]
+    assert res.values["pm10"].horizons is None
+    assert res.strings["forecast_range_iso8601"].to_list(2, 4) == [
+        "R2/2022-10-27T10:00:00.000000Z/PT1H", "R3/2022-10-27T10:00:00.000000Z/PT1H",
+    ]
+    assert res.geometries.coordinates(5, 6) == [[415725, 5810425]]
+
+
+def test_feature_store_simplified() -> None:
+    """This test asserts that the simplified geometries are joined by id and selected by level."""
+    # arrange
+    df = get_grid_df(3)
+    store = FeatureStore.from_frame(df.iloc[[2, 0]], get_property_cols("grid"))
+    geometries = GeometryStore.from_frame(df, "Point")
+    simplified = [GeometryStore("Point", geometries.coords + level, []) for level in [1, 2]]
+
+    # act
+    res = store.with_geometries(np.array([0, 1, 2]), geometries, simplified).sort_by_id()
+
+    # assert
+    assert res.simplified(0) is res
+    assert res.simplified(1).geometries.coords.tolist() == [[415726, 5810276], [415726, 5810376]]
+    assert res.simplified(5).geometries.coords.tolist() == [[415727, 5810277], [415727, 5810377]]
+    assert res.select(pollutants=["no2"]).simplified(2).ids.tolist() == [0, 2]
+
+
+def test_simulation_tensor_columns() -> None:
+    """This test asserts that the columns of the simulation are restored from the tensor."""
+    # arrange
+    columns = {
+        "no2_0": ValueColumn.from_lists([[1.0, 2.0], [3.0]]),
+        "no2_10": ValueColumn.from_lists([[5.0, 6.0], [7.0]]),
+        "pm10_0": ValueColumn.from_lists([[1.0], [2.0]]),
+        "pm10_10": ValueColumn.from_lists([[3.0], [4.0]]),
+    }
+
+    # act
+    tensor = SimulationTensor.from_columns(columns)
+
+    # assert
+    assert tensor.values.shape == (2, 2, 2, 2)
+    assert tensor.levels.tolist() == [0, 10]
+    assert {name: column.to_list(0, 2) for name, column in tensor.columns().items()} == {
+        name: column.to_list(0, 2) for name, column in columns.items()
+    }
+    with pytest.raises(ValueError, match="missing"):
+        SimulationTensor.from_columns({"no2_0": columns["no2_0"], "pm10_10": columns["pm10_10"]})
+
+
+def test_simulation_tensor_at_level() -> None:
+    """This test asserts that levels between the simulated ones are interpolated linearly."""
+    # arrange
+    tensor = SimulationTensor.from_columns({
+        "no2_0": ValueColumn.from_lists([[10.0, 20.0], [30.0]]),
+        "no2_10": ValueColumn.from_lists([[20.0, 40.0], [50.0, 60.0]]),
+        "no2_20": ValueColumn.from_lists([[0.0, 0.0], [0.0, 0.0]]),
+    })
+
+    # act
+    res = tensor.at_level(2.5)
+
+    # assert
+    assert {name: column.to_list(0, 2) for name, column in res.items()} == {"no2_2.5": [[12.5, 25.0], [35.0]]}
+    assert tensor.at_level(10)["no2_10"].to_list(0, 2) == [[20.0, 40.0], [50.0, 60.0]]
+    assert tensor.at_level(15)["no2_15"].to_list(0, 2) == [[10.0, 20.0], [25.0, 30.0]]
+    with pytest.raises(ValueError, match="between 0 and 20"):
+        tensor.at_level(25)
+
+
+def test_feature_store_select_at_level() -> None:
+    """This test asserts that a selection of the simulation keeps its tensor, for the selected forecasts."""
+    # arrange
+    columns = {
+        "no2_0": ValueColumn.from_lists([[10.0, 20.0, 30.0], [40.0]]),
+        "no2_10": ValueColumn.from_lists([[20.0, 40.0, 60.0], [60.0]]),
+        "pm10_0": ValueColumn.from_lists([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]),
+        "pm10_10": ValueColumn.from_lists([[3.0, 4.0, 5.0], [6.0, 7.0, 8.0]]),
+    }
+    store = FeatureStore("id", np.array([0, 1]), None, {}, columns).with_simulation_tensor()
+
+    # act
+    leveled = store.at_level(5).select(pollutants=["no2"], hours=(1, 2))
+    selected = store.select(pollutants=["pm10"], hours=(1, 1)).at_level(5)
+
+    # assert
+    assert leveled.tensor is not None
+    assert leveled.tensor.pollutants == ["no2"]
+    assert leveled.at_level(5).values["no2_5"].to_list(0, 2) == leveled.values["no2_5"].to_list(0, 2)
+    assert leveled.values["no2_5"].to_list(0, 2) == [[30.0, 45.0], []]
+    assert leveled.at_level(10).values["no2_10"].to_list(0, 2) == [[40.0, 60.0], []]
+    assert list(selected.values) == ["pm10_5"]
+    assert selected.values["pm10_5"].to_list(0, 2) == [[3.0], [6.0]]
+
+
+def test_feature_store_at_level_simplified() -> None:
+    """This test asserts that the forecasts of a traffic reduction level keep the simplified geometries."""
+    # arrange
+    df = get_grid_df(2)
+    geometries = GeometryStore.from_frame(df, "Point")
+    simplified = [GeometryStore("Point", geometries.coords + 1, [])]
+    columns = {
+        "no2_0": ValueColumn.from_lists([[10.0], [20.0]]),
+        "no2_10": ValueColumn.from_lists([[20.0], [40.0]]),
+    }
+    store = FeatureStore("id", np.array([0, 1]), geometries, {}, columns).with_simulation_tensor()
+    store.simplified_geometries = simplified
+
+    # act
+    res = store.at_level(5)
+
+    # assert
+    assert res.simplified_geometries is simplified
+    assert res.simplified(1).geometries.coords.tolist() == [[415726, 5810276], [415726, 5810326]]
+    assert res.simplified(1).values["no2_5"].to_list(0, 2) == [[15.0], [30.0]]
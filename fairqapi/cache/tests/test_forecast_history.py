@@ -0,0 +1,95 @@
+"""test file for forecast_history.py."""
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.forecast_history import ForecastHistory, ForecastRun
+
+
+def get_grid_store(date_time_forecast: str, offset: float = 0.0, ids: list[int] | None = None) -> FeatureStore:
+    """Create a grid FeatureStore of one forecast run, the last feature has a single forecast value."""
+    ids = np.array(ids or [3, 7, 11])
+    values = np.array([[22.4, 21.7], [36.7, 35.1], [12.3, np.nan]])[:len(ids)] + offset
+    strings = {
+        "date_time_forecast_iso8601": StringColumn.from_values([date_time_forecast] * len(ids)),
+        "forecast_range_iso8601": StringColumn.from_values(["R2/2022-10-27T10:00:00.000000Z/PT1H"] * len(ids)),
+    }
+    no2 = ValueColumn(values, np.array([2, 2, 1])[:len(ids)])
+    store = FeatureStore("id", ids, None, strings, {"no2": no2, "pm10": ValueColumn(values * 2, no2.horizons)})
+    store.version = int(offset)
+    return store
+
+
+def test_forecast_run() -> None:
+    """This test asserts that a run keeps float32 forecasts and finds features by id."""
+    # arrange
+    run = ForecastRun(get_grid_store("2022-10-27T09:14:45+00:00"))
+
+    # act
+    res = run.properties(run.row("7"), ["no2"], (1, 1))
+
+    # assert
+    assert run.store.values["no2"].values.dtype == np.float32
+    assert run.run_time == "2022-10-27T09:14:45+00:00"
+    assert (run.row("3"), run.row("11"), run.row("4"), run.row("abc")) == (0, 2, None, None)
+    assert res == {
+        "date_time_forecast_iso8601": "2022-10-27T09:14:45+00:00",
+        "forecast_range_iso8601": "R1/2022-10-27T11:00:00.000000Z/PT1H",
+        "no2": [35.1],
+    }
+    assert run.properties(2)["no2"] == [12.3]
+
+
+def test_forecast_history_feature_history() -> None:
+    """This test asserts the forecasts of a feature in every run containing it, the oldest first."""
+    # arrange
+    history = ForecastHistory(max_runs=10, max_bytes=1024 ** 2)
+    history.add("grid", get_grid_store("2022-10-27T09:00:00+00:00", 0, [3, 11]))
+    history.add("grid", get_grid_store("2022-10-27T10:00:00+00:00", 1))
+    history.add("grid", get_grid_store("2022-10-27T11:00:00+00:00", 2))
+
+    # act
+    res = history.feature_history("grid", "7", ["no2"], (0, 0))
+    res_newest = history.feature_history("grid", "3", n_runs=1)
+
+    # assert
+    assert res == {
+        "dataset": "grid",
+        "id": 7,
+        "runs": [
+            {
+                "run_time": "2022-10-27T10:00:00+00:00",
+                "date_time_forecast_iso8601": "2022-10-27T10:00:00+00:00",
+                "forecast_range_iso8601": "R1/2022-10-27T10:00:00.000000Z/PT1H",
+                "no2": [37.7],
+            },
+            {
+                "run_time": "2022-10-27T11:00:00+00:00",
+                "date_time_forecast_iso8601": "2022-10-27T11:00:00+00:00",
+                "forecast_range_iso8601": "R1/2022-10-27T10:00:00.000000Z/PT1H",
+                "no2": [38.7],
+            },
+        ],
+    }
+    assert [run["pm10"] for run in res_newest["runs"]] == [[48.8, 47.4]]
+    assert history.feature_history("grid", "8") is None
+    assert history.feature_history("streets", "7") is None
+
+
+def test_forecast_history_eviction() -> None:
+    """This test asserts that runs are evicted by count and bytes, and replaced by a run with the same run time."""
+    # arrange
+    run_bytes = ForecastRun(get_grid_store("2022-10-27T09:00:00+00:00")).nbytes
+    history = ForecastHistory(max_runs=2, max_bytes=3 * run_bytes)
+
+    # act
+    for hour in range(9, 12):
+        history.add("grid", get_grid_store("2022-10-27T{}:00:00+00:00".format(hour), hour))
+    history.add("grid", get_grid_store("2022-10-27T11:00:00+00:00", 20))
+    history.add("lor", get_grid_store("2022-10-27T11:00:00+00:00"))
+    history.add("stations", get_grid_store("2022-10-27T11:00:00+00:00"))
+
+    # assert
+    grid_runs = history.dataset_runs("grid")
+    assert [run.run_time for run in grid_runs] == ["2022-10-27T11:00:00+00:00"]
+    assert grid_runs[0].version == 20
+    assert [dataset for dataset, _ in history.runs] == ["grid", "lor", "stations"]
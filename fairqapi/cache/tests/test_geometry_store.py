@@ -0,0 +1,172 @@
+"""test file for geometry_store.py."""
+import numpy as np
+import pytest
+
+from fairqapi.cache.geometry_store import GeometryStore
+
+
+def test_geometry_store_multipolygon() -> None:
+    """This test asserts that nested MultiPolygon coordinates are restored for a range of features."""
+    # arrange
+    coordinates = [
+        [[[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]]],
+        [
+            [[[2.0, 2.0], [3.0, 2.0], [3.0, 3.0], [2.0, 2.0]], [[2.1, 2.1], [2.2, 2.1], [2.2, 2.2], [2.1, 2.1]]],
+            [[[5.0, 5.0], [6.0, 5.0], [6.0, 6.0], [5.0, 5.0]]],
+        ],
+        [[[[7.0, 7.0], [8.0, 7.0], [8.0, 8.0], [7.0, 7.0]]]],
+    ]
+
+    # act
+    store = GeometryStore.from_coordinates("MultiPolygon", coordinates)
+
+    # assert
+    assert len(store) == 3
+    assert store.coords.shape == (20, 2)
+    assert store.coordinates(0, 3) == coordinates
+    assert store.coordinates(1, 2) == coordinates[1:2]
+    assert store.coordinates(2, 2) == []
+
+
+def test_geometry_store_take() -> None:
+    """This test asserts that selecting geometries keeps their nesting."""
+    # arrange
+    coordinates = [
+        [[0.0, 0.0], [1.0, 1.0]],
+        [[2.0, 2.0], [3.0, 3.0], [4.0, 4.0]],
+        [[5.0, 5.0], [6.0, 6.0]],
+    ]
+    store = GeometryStore.from_coordinates("LineString", coordinates)
+
+    # act
+    res = store.take(np.array([2, 0, 1]))
+
+    # assert
+    assert res.coordinates(0, 3) == [coordinates[2], coordinates[0], coordinates[1]]
+
+
+def test_geometry_store_concat() -> None:
+    """This test asserts that concatenated geometries keep their nesting."""
+    # arrange
+    coordinates = [
+        [[[[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]]]],
+        [[[[2.0, 2.0], [3.0, 2.0], [2.0, 3.0], [2.0, 2.0]]], [[[5.0, 5.0], [6.0, 5.0], [5.0, 6.0], [5.0, 5.0]]]],
+    ]
+    stores = [GeometryStore.from_coordinates("MultiPolygon", [coordinate]) for coordinate in coordinates]
+
+    # act
+    res = GeometryStore.concat(stores)
+
+    # assert
+    assert len(res) == 2
+    assert res.coordinates(0, 2) == coordinates
+    with pytest.raises(ValueError, match="same type and crs"):
+        GeometryStore.concat([res, GeometryStore.from_coordinates("Point", [[0.0, 0.0]])])
+
+
+def test_geometry_store_point() -> None:
+    """This test asserts that Point coordinates keep their integer type."""
+    # arrange
+    coordinates = [[415725, 5810275], [415725, 5810325]]
+
+    # act
+    store = GeometryStore.from_coordinates("Point", coordinates)
+
+    # assert
+    assert store.coordinates(1, 2) == [[415725, 5810325]]
+    assert isinstance(store.coordinates(0, 1)[0][0], int)
+
+
+def test_geometry_store_wrong_type() -> None:
+    """This test asserts that unknown geometry types are rejected."""
+    with pytest.raises(ValueError):
+        GeometryStore.from_coordinates("Circle", [])
+
+
+def test_geometry_store_contains() -> None:
+    """This test asserts point in MultiPolygon checks including holes and several polygons."""
+    # arrange
+    square = [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0], [0.0, 0.0]]
+    hole = [[4.0, 4.0], [6.0, 4.0], [6.0, 6.0], [4.0, 6.0], [4.0, 4.0]]
+    far_square = [[20.0, 0.0], [30.0, 0.0], [30.0, 10.0], [20.0, 0.0]]
+    store = GeometryStore.from_coordinates("MultiPolygon", [[[square, hole], [far_square]], [[hole]]])
+
+    # act & assert
+    np.testing.assert_array_equal(store.contains(1.0, 1.0), [True, False])
+    np.testing.assert_array_equal(store.contains(5.0, 5.0), [False, True])
+    np.testing.assert_array_equal(store.contains(29.0, 1.0), [True, False])
+    np.testing.assert_array_equal(store.contains(15.0, 5.0), [False, False])
+    np.testing.assert_array_equal(store.containing(5.0, 5.0), [1])
+
+
+def test_geometry_store_nearest() -> None:
+    """This test asserts that the nearest LineString is found by its segments, not only its vertices."""
+    # arrange
+    coordinates = [
+        [[0.0, 0.0], [100.0, 0.0]],
+        [[0.0, 20.0], [10.0, 20.0]],
+        [[500.0, 500.0], [510.0, 500.0]],
+    ]
+    store = GeometryStore.from_coordinates("LineString", coordinates)
+
+    # act
+    res = store.nearest(50.0, 15.0)
+
+    # assert
+    assert res == (0, 15.0)
+    np.testing.assert_allclose(store.distances(50.0, 15.0), [15.0, np.hypot(40.0, 5.0), np.hypot(450.0, 485.0)])
+    # far away the distance is rounded, the nearest geometry is still found
+    assert store.nearest(0.0, 1e14)[0] == 2
+    assert store.nearest(0.0, -1e14)[0] == 0
+    assert store.nearest(1e300, 1e300) is not None
+
+
+def test_geometry_store_locate() -> None:
+    """This test asserts that points are located in the first MultiPolygon containing them, holes excluded."""
+    # arrange
+    square = [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0], [0.0, 0.0]]
+    hole = [[4.0, 4.0], [6.0, 4.0], [6.0, 6.0], [4.0, 6.0], [4.0, 4.0]]
+    far_square = [[20.0, 0.0], [30.0, 0.0], [30.0, 10.0], [20.0, 0.0]]
+    store = GeometryStore.from_coordinates("MultiPolygon", [[[square, hole], [far_square]], [[hole]]])
+    points = np.array([[1.0, 1.0], [5.0, 5.0], [29.0, 1.0], [15.0, 5.0], [np.nan, np.nan]])
+
+    # act
+    res = store.locate(points)
+
+    # assert
+    np.testing.assert_array_equal(res, [0, 1, 0, -1, -1])
+
+
+def test_geometry_store_midpoints() -> None:
+    """This test asserts the points halfway along LineStrings and MultiLineStrings."""
+    # arrange
+    lines = GeometryStore.from_coordinates("LineString", [[[0.0, 0.0], [10.0, 0.0], [10.0, 30.0]], [[5.0, 5.0]]])
+    multi_lines = GeometryStore.from_coordinates(
+        "MultiLineString", [[[[0.0, 0.0], [4.0, 0.0]], [[10.0, 0.0], [10.0, 4.0]]]],
+    )
+
+    # act & assert
+    np.testing.assert_allclose(lines.midpoints(), [[10.0, 10.0], [5.0, 5.0]])
+    np.testing.assert_allclose(multi_lines.midpoints(), [[4.0, 0.0]])
+
+
+def test_geometry_store_differs() -> None:
+    """This test asserts that geometries with other coordinates or other parts differ."""
+    # arrange
+    lines = [[[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]], [[5.0, 5.0], [6.0, 6.0], [7.0, 7.0], [8.0, 8.0], [9.0, 9.0]]]
+    store = GeometryStore.from_coordinates(
+        "MultiLineString", [lines, [[[0.0, 0.0], [1.0, 0.0]]], [[[3.0, 3.0], [4.0, 4.0]]], [[[1.0, 1.0], [2.0, 2.0]]]],
+    )
+    other = GeometryStore.from_coordinates(
+        "MultiLineString",
+        [
+            [[*lines[0], *lines[1][:2]], lines[1][2:]],
+            [[[0.0, 0.0], [1.0, 0.0]]],
+            [[[3.0, 3.0], [4.0, 4.0]], [[1.0, 1.0], [1.0, 2.0]]],
+            [[[1.0, 1.0], [2.0, 3.0]]],
+        ],
+    )
+
+    # act & assert
+    np.testing.assert_array_equal(store.differs(other), [True, False, True, True])
+    np.testing.assert_array_equal(store.differs(store), [False, False, False, False])
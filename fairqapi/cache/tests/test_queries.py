@@ -0,0 +1,104 @@
+"""test file for queries.py."""
+import json
+
+import pandas as pd
+import pytest
+
+from fairqapi.cache.queries import FORECAST_INTERVAL_IN_HOURS, forecast_query, forecast_range, iso_datetime
+from fairqapi.internal.data_utils import get_property_cols, get_raw_col, transform_raw_data
+
+
+def test_iso_datetime() -> None:
+    """This test asserts that DateTime columns are formatted like get_iso_format."""
+    # act
+    res = iso_datetime("date_time_forecast")
+
+    # assert
+    assert res == "concat(replaceOne(toString(date_time_forecast), ' ', 'T'), '.000000Z')"
+
+
+def test_forecast_range() -> None:
+    """This test asserts that the forecast range counts the forecast values in steps of the interval."""
+    # act
+    res = forecast_range(24)
+
+    # assert
+    assert res.startswith("concat('R', toString(intDiv(dateDiff('second', first_pred_date_time, last_pred_date_time), 86400) + 1), '/', ")
+    assert res.endswith(", '/PT24H')")
+
+
+def test_forecast_query_grid() -> None:
+    """This test asserts that only the property columns are selected, formatted and renamed."""
+    # act
+    res = forecast_query("grid", since=True)
+
+    # assert
+    assert res.startswith("select id, concat(")
+    assert " as `date_time_forecast_iso8601`, " in res
+    assert " as `forecast_range_iso8601`, " in res
+    assert res.endswith(", no2, pm10, pm25 as `pm2.5` from api_grid final where date_time_forecast >= %(since)s;")
+
+
+def test_forecast_query_stations_and_simulation() -> None:
+    """This test asserts that point columns come first and all simulation levels are renamed."""
+    # act
+    res_stations = forecast_query("stations", point_cols=("x", "y"))
+    res_simulation = forecast_query("simulation")
+
+    # assert
+    assert res_stations.startswith("select x, y, station_id, ")
+    assert res_stations.endswith(" from api_stations final;")
+    assert "/PT24H')" in res_simulation
+    assert "pm25_100 as `pm2.5_100` from api_simulation final;" in res_simulation
+
+
+@pytest.mark.parametrize("endpoint", ["grid", "simulation"])
+def test_forecast_query_like_transform_raw_data(endpoint, tmp_path) -> None:
+    """This test asserts that clickhouse formats the queried rows like the reference implementation transform_raw_data."""
+    # arrange
+    chdb_session = pytest.importorskip("chdb.session")
+    df_raw = get_raw_df(endpoint)
+    session = chdb_session.Session(str(tmp_path))
+    try:
+        create_table(session, endpoint, df_raw)
+
+        # act
+        res = json.loads(session.query(forecast_query(endpoint), "JSONCompact").bytes())
+    finally:
+        session.close()
+
+    # assert
+    expected = transform_raw_data(df_raw, endpoint, FORECAST_INTERVAL_IN_HOURS[endpoint])
+    assert [column["name"] for column in res["meta"]] == get_property_cols(endpoint)
+    assert sorted(res["data"]) == expected[get_property_cols(endpoint)].values.tolist()
+
+
+def get_raw_df(endpoint: str) -> pd.DataFrame:
+    """Create raw forecasts as stored in api_<endpoint>, forecast ranges of one and of several values."""
+    interval = pd.Timedelta(hours=FORECAST_INTERVAL_IN_HOURS[endpoint])
+    first = pd.to_datetime(["2022-10-24 14:00", "2022-10-24 00:00", "2022-10-30 23:00"])
+    horizons = [1, 7, 80]
+    df_raw = pd.DataFrame(
+        {
+            get_property_cols(endpoint)[0]: [3, 1, 2] if endpoint == "grid" else ["3_4.01", "1_2.01", "2_3.01"],
+            "date_time_forecast": pd.to_datetime(["2022-10-24 13:00", "2022-10-23 23:12:05", "2022-10-30 22:00"]),
+            "first_pred_date_time": first,
+            "last_pred_date_time": first + interval * (pd.Series(horizons) - 1),
+        }
+    )
+    for col in get_property_cols(endpoint)[3:]:
+        df_raw[get_raw_col(col)] = [[float(value) + 0.5 for value in range(horizon)] for horizon in horizons]
+    return df_raw
+
+
+def create_table(session, endpoint: str, df_raw: pd.DataFrame) -> None:
+    """Create the table api_<endpoint> in an embedded clickhouse and insert raw forecasts."""
+    types = {"date_time_forecast": "DateTime('UTC')", "first_pred_date_time": "DateTime('UTC')"}
+    types["last_pred_date_time"] = types["first_pred_date_time"]
+    types[df_raw.columns[0]] = "Int64" if endpoint == "grid" else "String"
+    columns = ", ".join(f"`{col}` {types.get(col, 'Array(Float64)')}" for col in df_raw.columns)
+    session.query(f"create table api_{endpoint} ({columns}) engine = ReplacingMergeTree order by `{df_raw.columns[0]}`")
+    rows = df_raw.assign(
+        **{col: df_raw[col].dt.strftime("%Y-%m-%d %H:%M:%S") for col in df_raw.select_dtypes("datetime").columns},
+    ).to_json(orient="records", lines=True)
+    session.query(f"insert into api_{endpoint} format JSONEachRow {rows}")
@@ -0,0 +1,128 @@
+"""test file for response_cache.py."""
+import gzip
+
+import asyncio
+
+from fairqapi.cache.response_cache import (
+    NotModifiedResponse,
+    ResponseCache,
+    StreamedResponse,
+    choose_encoding,
+    request_digest,
+    supported_encodings,
+)
+
+
+def test_choose_encoding() -> None:
+    """This test asserts that the accepted coding with the highest quality is chosen."""
+    # act & assert
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("deflate;q=0.5, *;q=0.1") in {"br", "gzip"}
+    assert choose_encoding("gzip;q=0") == "identity"
+    assert choose_encoding(None) == "identity"
+
+
+def test_response_cache_renders_once() -> None:
+    """This test asserts that a response is rendered and compressed once per version."""
+    # arrange
+    response_cache = ResponseCache(max_bytes=10 ** 6)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return b'{"features":[' + b"0," * 1000 + b"0]}"
+
+    # act
+    first = response_cache.get(("grid", 0), 1, render)
+    second = response_cache.get(("grid", 0), 1, render)
+    updated = response_cache.get(("grid", 0), 2, render)
+
+    # assert
+    assert len(renders) == 2
+    assert first is second
+    assert gzip.decompress(first.variant("gzip")) == first.content
+    assert first.etag("gzip") != updated.etag("gzip")
+    assert first.matches(f'W/{first.etag("identity")}, "other"')
+    assert not updated.matches(first.etag("gzip"))
+
+
+def test_encoded_response_compresses_lazily() -> None:
+    """This test asserts that only the requested content coding is compressed, all of them when precompressed."""
+    # arrange
+    response_cache = ResponseCache(max_bytes=10 ** 6)
+    content = b'{"features":[' + b"0," * 1000 + b"0]}"
+    response = response_cache.get(("grid", 0), 1, lambda: content)
+    precompressed = response_cache.get(("grid", 1), 1, lambda: content).precompress()
+
+    # act
+    cached_variants = list(response.variants)
+    response.to_response("gzip")
+
+    # assert
+    assert cached_variants == ["identity"]
+    assert list(response.variants) == ["identity", "gzip"]
+    assert set(precompressed.variants) == {"identity", *supported_encodings()}
+
+
+def test_response_cache_evicts() -> None:
+    """This test asserts that the least recently used responses are dropped to keep the byte budget."""
+    # arrange
+    response_cache = ResponseCache(max_bytes=400)
+
+    # act
+    for skip in range(5):
+        response_cache.get(("grid", skip), 1, lambda: b"[" + b" " * 90 + b"]")
+
+    # assert
+    assert [key[1] for key in response_cache.responses] == [1, 2, 3, 4]
+
+
+def test_response_cache_not_modified() -> None:
+    """This test asserts that a missing response the client has is answered with 304 without rendering it."""
+    # arrange
+    response_cache = ResponseCache(max_bytes=1024 ** 2)
+    rendered = []
+    etag = '"1-{}-gzip"'.format(request_digest(("grid", 0)))
+
+    def render() -> bytes:
+        rendered.append(True)
+        return b"[]"
+
+    # act
+    not_modified = response_cache.get(("grid", 0), 1, render, if_none_match=etag)
+    not_modified_weak = response_cache.get(("grid", 0), 1, render, if_none_match="W/" + etag)
+    other_version = response_cache.get(("grid", 0), 2, render, if_none_match=etag)
+
+    # assert
+    assert isinstance(not_modified, NotModifiedResponse)
+    assert not_modified.to_response().status_code == 304
+    assert not_modified.to_response().headers["ETag"] == etag
+    assert not_modified_weak.to_response().headers["ETag"] == "W/" + etag
+    assert other_version.content == b"[]"
+    assert len(rendered) == 1
+    assert list(response_cache.responses) == [("grid", 0, 2)]
+
+
+def test_streamed_response() -> None:
+    """This test asserts that a streamed response is sent chunk by chunk, gzip compressed if accepted."""
+    # arrange
+    chunks = [b'{"features":[', *[b"0," * 1000] * 5, b"0]}"]
+    streamed = StreamedResponse(lambda: iter(chunks), 1, "ab")
+
+    # act
+    response = streamed.to_response("gzip")
+    response_identity = streamed.to_response(None)
+    not_modified = streamed.to_response("gzip", if_none_match=response.headers["ETag"])
+
+    # assert
+    assert gzip.decompress(b"".join(asyncio.run(collect(response.body_iterator)))) == b"".join(chunks)
+    assert asyncio.run(collect(response_identity.body_iterator)) == chunks
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"1-ab-gzip"'
+    assert response_identity.headers["ETag"] == '"1-ab"'
+    assert not_modified.status_code == 304
+
+
+async def collect(body_iterator) -> list[bytes]:
+    """Collect the chunks of a streamed body."""
+    return [chunk async for chunk in body_iterator]
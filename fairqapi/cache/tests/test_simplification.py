@@ -0,0 +1,67 @@
+"""test file for simplification.py."""
+import numpy as np
+
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.cache.simplification import level_for_zoom, simplify, simplify_levels
+
+
+def test_simplify_line() -> None:
+    """This test asserts that vertices within the tolerance are removed and the ends of a line are kept."""
+    # arrange
+    coordinates = [
+        [[0.0, 0.0], [5.0, 0.4], [10.0, 0.0], [15.0, 3.0], [20.0, 0.0]],
+        [[0.0, 10.0], [0.2, 15.0]],
+    ]
+    store = GeometryStore.from_coordinates("LineString", coordinates)
+
+    # act
+    res = simplify(store, 1.0, 0)
+
+    # assert
+    assert res.coordinates(0, 2) == [
+        [[0.0, 0.0], [10.0, 0.0], [15.0, 3.0], [20.0, 0.0]],
+        [[0.0, 10.0], [0.0, 15.0]],
+    ]
+
+
+def test_simplify_shared_border() -> None:
+    """This test asserts that the border of neighbouring polygons is simplified the same way in both."""
+    # arrange
+    border = [[100.0 + 0.3 * np.sin(step), 2.0 * step] for step in range(51)]
+    coordinates = [
+        [[[[0.0, 0.0], *border, [0.0, 100.0], [0.0, 0.0]]]],
+        [[[[200.0, 0.0], [200.0, 100.0], *border[::-1], [200.0, 0.0]]]],
+    ]
+    store = GeometryStore.from_coordinates("MultiPolygon", coordinates)
+
+    # act
+    res = simplify(store, 1.0, 1)
+
+    # assert
+    first, second = [np.array(polygons[0][0]) for polygons in res.coordinates(0, 2)]
+    assert len(first) == len(second) == 5
+    np.testing.assert_array_equal(first[1:3], second[2:4][::-1])
+
+
+def test_simplify_small_ring() -> None:
+    """This test asserts that rings smaller than the tolerance keep their vertices instead of collapsing."""
+    # arrange
+    coordinates = [[[[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]]]]
+    store = GeometryStore.from_coordinates("MultiPolygon", coordinates)
+
+    # act
+    res = simplify_levels(store)
+
+    # assert
+    assert res[0].coordinates(0, 1) == coordinates
+    assert len(res[-1].coords) == 5
+
+
+def test_level_for_zoom() -> None:
+    """This test asserts that overview zoom levels get coarser geometries."""
+    # act & assert
+    assert level_for_zoom(18) == 0
+    assert level_for_zoom(16) == 1
+    assert level_for_zoom(12) == 2
+    assert level_for_zoom(10) == 3
+    assert level_for_zoom(0) == 4
@@ -0,0 +1,57 @@
+"""test file for spatial_index.py."""
+import numpy as np
+
+from fairqapi.cache.spatial_index import SpatialIndex
+
+
+def test_spatial_index_query() -> None:
+    """This test asserts that exactly the features whose envelope intersects the bbox are found."""
+    # arrange
+    rng = np.random.default_rng(0)
+    lower = rng.uniform(0, 1000, (500, 2))
+    envelopes = np.hstack([lower, lower + rng.uniform(0, 50, (500, 2))])
+    envelopes[7] = np.nan
+    index = SpatialIndex(envelopes)
+
+    for _ in range(50):
+        minx, miny = rng.uniform(-100, 1000, 2)
+        bbox = (minx, miny, minx + rng.uniform(0, 300), miny + rng.uniform(0, 300))
+
+        # act
+        res = index.query(bbox)
+
+        # assert
+        expected = np.flatnonzero(
+            (envelopes[:, 0] <= bbox[2])
+            & (envelopes[:, 2] >= bbox[0])
+            & (envelopes[:, 1] <= bbox[3])
+            & (envelopes[:, 3] >= bbox[1]),
+        )
+        np.testing.assert_array_equal(res, expected)
+
+
+def test_spatial_index_outside() -> None:
+    """This test asserts empty results for bounding boxes outside all features or with min > max."""
+    # arrange
+    index = SpatialIndex(np.array([[0.0, 0.0, 1.0, 1.0], [5.0, 5.0, 5.0, 5.0]]))
+
+    # act & assert
+    assert len(index.query((10.0, 10.0, 20.0, 20.0))) == 0
+    assert len(index.query((1.0, 1.0, 0.0, 0.0))) == 0
+    assert index.query((1e300, 1e300, 1e300, 1e300)).dtype == np.int64
+    assert len(index.query((1e300, 1e300, 1e300, 1e300))) == 0
+    assert len(index.query((-1e300, -1e300, -1e299, -1e299))) == 0
+    np.testing.assert_array_equal(index.query((-1.0, -1.0, 6.0, 6.0)), [0, 1])
+
+
+def test_spatial_index_points_on_a_line() -> None:
+    """This test asserts that points along a vertical line get a bucket size from the length of the line."""
+    # arrange
+    points = np.column_stack([np.full(1000, 415725.0), 5810275.0 + 50 * np.arange(1000)])
+
+    # act
+    index = SpatialIndex(np.hstack([points, points]))
+
+    # assert
+    assert index.shape.prod() < 1000
+    np.testing.assert_array_equal(index.query((415725, 5810275, 415725, 5810375)), [0, 1, 2])
@@ -0,0 +1,158 @@
+"""Pool of reusable clickhouse connections."""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+from clickhouse_driver import Client
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool():
+    """
+    This class keeps up to max_size clickhouse clients open and lends them out
+    one at a time, so a query does not have to pay for a new (TLS) connection.
+
+    Idle clients are closed after max_idle_seconds. A client idle for longer than
+    health_check_interval is checked with "select 1" before it is lent out and
+    replaced if the check fails. Clients are created with retries and exponential
+    backoff, and dropped if the code using them raised.
+    """
+
+    def __init__(
+        self,
+        create_client: Callable[[], Client],
+        max_size: int = 5,
+        max_idle_seconds: float = 300,
+        health_check_interval: float = 30,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        acquire_timeout: float = 60,
+    ):
+        """
+        :param create_client: function returning a new (not yet connected) client
+        :param int max_size: maximum number of open clients, lent out or idle
+        :param float max_idle_seconds: idle clients are closed after this time
+        :param float health_check_interval: clients idle for longer are checked before they are lent out
+        :param int max_retries: connection attempts after the first failed one
+        :param float backoff_seconds: wait before the first retry, doubled for every further retry
+        :param float acquire_timeout: seconds to wait for a client if max_size clients are lent out
+        """
+        self.create_client = create_client
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.acquire_timeout = acquire_timeout
+
+        # (client, time it was returned), the most recently returned client is lent out first
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        """
+        Lend out a client for the with... block.
+
+        :return: context manager yielding a connected client
+        """
+        client = self.acquire()
+        try:
+            yield client
+        except BaseException:
+            # the client may be in the middle of a query, e.g. an abandoned execute_iter
+            self.discard(client)
+            raise
+        self.release(client)
+
+    def acquire(self) -> Client:
+        """Return an idle client (checked if it was idle for long) or a new one, wait if the pool is exhausted."""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self.condition:
+                self.evict_idle()
+                if self.idle:
+                    client, returned_at = self.idle.pop()
+                elif self.size < self.max_size:
+                    self.size += 1
+                    client, returned_at = None, None
+                else:
+                    if not self.condition.wait(timeout=deadline - time.monotonic()):
+                        raise TimeoutError(f"No database connection available within {self.acquire_timeout}s.")
+                    continue
+
+            if client is None:
+                return self.connect()
+            if time.monotonic() - returned_at <= self.health_check_interval or self.is_healthy(client):
+                return client
+            logger.warning("Replacing a database connection that failed the health check")
+            self.discard(client)
+
+    def release(self, client: Client):
+        """Return a client to the idle clients."""
+        with self.condition:
+            self.idle.append((client, time.monotonic()))
+            self.evict_idle()
+            self.condition.notify()
+
+    def discard(self, client: Client):
+        """Close a client and make room for a new one."""
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+        self.disconnect(client)
+
+    def evict_idle(self):
+        """Close clients idle for longer than max_idle_seconds, must be called holding the condition."""
+        now = time.monotonic()
+        while self.idle and now - self.idle[0][1] > self.max_idle_seconds:
+            client, _ = self.idle.popleft()
+            self.size -= 1
+            self.disconnect(client)
+
+    def close(self):
+        """Close all idle clients, lent out clients are closed when they are returned."""
+        with self.condition:
+            while self.idle:
+                client, _ = self.idle.popleft()
+                self.size -= 1
+                self.disconnect(client)
+
+    def connect(self) -> Client:
+        """Create and connect a new client, retrying with exponential backoff. Frees its slot if all attempts fail."""
+        for attempt in range(self.max_retries + 1):
+            client = self.create_client()
+            try:
+                client.execute("select 1")
+            except Exception:
+                self.disconnect(client)
+                if attempt == self.max_retries:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+                wait = self.backoff_seconds * 2 ** attempt
+                logger.warning(f"Connecting to the database failed, retrying in {wait}s")
+                time.sleep(wait)
+            else:
+                return client
+
+    @staticmethod
+    def is_healthy(client: Client) -> bool:
+        try:
+            client.execute("select 1")
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def disconnect(client: Client):
+        try:
+            client.disconnect()
+        except Exception:
+            logger.debug("Closing a database connection failed", exc_info=True)
@@ -5,14 +5,16 @@ import os
 from clickhouse_driver import Client
 from dotenv import load_dotenv
 
+from fairqapi.db.connection_pool import ConnectionPool
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
-def db_connect() -> Client:
+def create_client() -> Client:
     """
-    Return Client object for db connection to clickhouse.
+    Return a new Client object for db connection to clickhouse, it connects on its first query.
 
     :return: Client object for db connection to clickhouse
     """
@@ -25,3 +27,15 @@ def db_connect() -> Client:
         secure=True,
         settings={"use_numpy": True},
     )
+
+
+pool = ConnectionPool(create_client, max_size=int(os.getenv("DB_POOL_SIZE", 5)))
+
+
+def db_connect():
+    """
+    Lend out a pooled connection to clickhouse, use it as context manager: with db_connect() as db: ...
+
+    :return: context manager yielding a connected Client object
+    """
+    return pool.connection()
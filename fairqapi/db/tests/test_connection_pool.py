@@ -0,0 +1,127 @@
+"""test file for connection_pool.py."""
+import threading
+
+import pytest
+
+from fairqapi.db.connection_pool import ConnectionPool
+
+
+class FakeClient():
+    """Stands in for a clickhouse Client, fails its queries while broken."""
+
+    created = 0
+
+    def __init__(self, broken: bool = False):
+        FakeClient.created += 1
+        self.broken = broken
+        self.connected = False
+
+    def execute(self, query):
+        if self.broken:
+            raise ConnectionError("connection reset")
+        self.connected = True
+        return [(1,)]
+
+    def disconnect(self):
+        self.connected = False
+
+
+@pytest.fixture(autouse=True)
+def reset_created():
+    """Count the created clients per test."""
+    FakeClient.created = 0
+
+
+def test_connection_pool_reuses_clients() -> None:
+    """This test asserts that a returned client is lent out again instead of connecting a new one."""
+    # arrange
+    pool = ConnectionPool(FakeClient, max_size=2)
+
+    # act
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    # assert
+    assert first is second
+    assert first.connected
+    assert FakeClient.created == 1
+
+
+def test_connection_pool_size_limit() -> None:
+    """This test asserts that no more than max_size clients are lent out and waiting callers get returned ones."""
+    # arrange
+    pool = ConnectionPool(FakeClient, max_size=1, acquire_timeout=0.05)
+    lent_out = pool.acquire()
+    threading.Timer(0.2, pool.release, args=[lent_out]).start()
+
+    # act
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.acquire_timeout = 5
+    res = pool.acquire()
+
+    # assert
+    assert res is lent_out
+    assert FakeClient.created == 1
+
+
+def test_connection_pool_health_check_and_errors() -> None:
+    """This test asserts that broken idle clients and clients used by failing code are replaced."""
+    # arrange
+    pool = ConnectionPool(FakeClient, max_size=1, health_check_interval=0)
+    with pool.connection() as first:
+        pass
+    first.broken = True
+
+    # act
+    with pool.connection() as second:
+        pass
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("query failed")
+    with pool.connection() as third:
+        pass
+
+    # assert
+    assert second is not first
+    assert third is not second
+    assert not first.connected
+    assert pool.size == 1
+
+
+def test_connection_pool_idle_eviction() -> None:
+    """This test asserts that clients idle for longer than max_idle_seconds are closed."""
+    # arrange
+    pool = ConnectionPool(FakeClient, max_idle_seconds=0)
+
+    # act
+    with pool.connection() as client:
+        pass
+
+    # assert
+    assert not pool.idle
+    assert pool.size == 0
+    assert not client.connected
+
+
+def test_connection_pool_retries_with_backoff(monkeypatch) -> None:
+    """This test asserts that connecting is retried with growing waits and gives up after max_retries."""
+    # arrange
+    waits = []
+    monkeypatch.setattr("fairqapi.db.connection_pool.time.sleep", waits.append)
+    attempts = iter([True, True, False])
+    pool = ConnectionPool(lambda: FakeClient(broken=next(attempts)), max_retries=2, backoff_seconds=0.5)
+    failing_pool = ConnectionPool(lambda: FakeClient(broken=True), max_retries=1, backoff_seconds=0.5)
+
+    # act
+    with pool.connection() as client:
+        pass
+    with pytest.raises(ConnectionError):
+        failing_pool.acquire()
+
+    # assert
+    assert client.connected
+    assert waits == [0.5, 1.0, 0.5]
+    assert failing_pool.size == 0
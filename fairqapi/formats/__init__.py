@@ -0,0 +1 @@
+"""Binary output formats of the endpoints (Arrow IPC, MessagePack and FlatGeobuf), GeoJSON stays the default."""
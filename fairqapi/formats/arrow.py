@@ -0,0 +1,109 @@
+"""
+Arrow IPC stream of a page. The geometries are GeoArrow native arrays built
+from the coordinate buffer and offsets of the GeometryStore, the forecasts
+are fixed size lists viewing the forecast matrix.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from fairqapi.cache.feature_store import FeatureStore, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, the arrow format is not offered without it
+    pyarrow = None
+
+GEOARROW_TYPES = {
+    "Point": "geoarrow.point",
+    "LineString": "geoarrow.linestring",
+    "Polygon": "geoarrow.polygon",
+    "MultiLineString": "geoarrow.multilinestring",
+    "MultiPolygon": "geoarrow.multipolygon",
+}
+
+
+def is_available() -> bool:
+    """Return True if pyarrow is installed."""
+    return pyarrow is not None
+
+
+def encode_arrow(store: FeatureStore, next_cursor=None, geometry: bool = True, name: str = "") -> bytes:
+    """
+    Encode the features of a store as Arrow IPC stream.
+
+    :param FeatureStore store: features of the page, e.g. FeatureStore.take(rows)
+    :param Cursor next_cursor: cursor of the next page, stored as schema metadata "next"
+    :param bool geometry: include the geometry column
+    :param str name: name of the endpoint, stored as schema metadata "name"
+    :return: Arrow IPC stream with one record batch
+    """
+    columns = {}
+    field_metadata = {}
+    if geometry:
+        columns["geometry"] = geoarrow_array(store.geometries)
+        field_metadata["geometry"] = {
+            "ARROW:extension:name": GEOARROW_TYPES[store.geometries.geometry_type],
+            "ARROW:extension:metadata": json.dumps({"crs": store.geometries.crs}),
+        }
+
+    columns[store.id_name] = pyarrow.array(store.ids)
+    for column_name, column in store.strings.items():
+        if column_name.startswith("date_time"):
+            timestamps = pd.to_datetime(column.categories, utc=True).to_numpy()
+            columns[column_name] = pyarrow.array(timestamps[column.codes]).cast(pyarrow.timestamp("us", tz="UTC"))
+        else:
+            columns[column_name] = pyarrow.DictionaryArray.from_arrays(column.codes, column.categories)
+    for column_name, column in store.values.items():
+        columns[column_name] = value_array(column)
+
+    fields = [
+        pyarrow.field(column_name, array.type, metadata=field_metadata.get(column_name))
+        for column_name, array in columns.items()
+    ]
+    metadata = {"name": name}
+    if next_cursor is not None:
+        metadata["next"] = next_cursor.encode()
+    schema = pyarrow.schema(fields, metadata=metadata)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(pyarrow.record_batch(list(columns.values()), schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+def geoarrow_array(geometries: GeometryStore):
+    """
+    Build the GeoArrow array (interleaved coordinates) of the geometries without copying the coordinates.
+
+    :param GeometryStore geometries: geometries of the page, their offsets must start at 0
+    :return: FixedSizeListArray for Points, else nested ListArrays
+    """
+    coords = np.ascontiguousarray(geometries.coords, dtype=np.float64)
+    array = pyarrow.FixedSizeListArray.from_arrays(pyarrow.array(coords.reshape(-1)), 2)
+    for level_offsets in reversed(geometries.offsets):
+        array = pyarrow.ListArray.from_arrays(pyarrow.array(level_offsets.astype(np.int32)), array)
+    return array
+
+
+def value_array(column: ValueColumn):
+    """
+    Build the array of forecast lists of a ValueColumn.
+
+    :param ValueColumn column: forecasts of the page
+    :return: FixedSizeListArray if all forecasts have the same length, else ListArray (of empty lists if the
+        forecasts were sliced beyond their horizon)
+    """
+    values = np.ascontiguousarray(column.values, dtype=np.float64)
+    if values.shape[1] == 0:
+        # e.g. hours beyond the horizon, pyarrow has no fixed size lists of size 0
+        return pyarrow.array([[]] * len(values), type=pyarrow.list_(pyarrow.float64()))
+    if column.horizons is None:
+        return pyarrow.FixedSizeListArray.from_arrays(pyarrow.array(values.reshape(-1)), values.shape[1])
+
+    offsets = np.zeros(len(values) + 1, dtype=np.int32)
+    np.cumsum(column.horizons, out=offsets[1:])
+    kept = np.arange(values.shape[1]) < column.horizons[:, None]
+    return pyarrow.ListArray.from_arrays(pyarrow.array(offsets), pyarrow.array(values[kept]))
@@ -0,0 +1,147 @@
+"""
+Minimal FlatBuffers serializer for the FlatGeobuf header and features.
+
+Tables, vectors and strings are described by the classes below and written
+front to back: the root offset, then every table followed by the objects it
+references, so all offsets point forward. Scalars and vector elements are
+aligned to their size relative to the start of the buffer, as the FlatBuffers
+verifier requires.
+"""
+import struct
+
+import numpy as np
+
+# struct format of the scalar field types
+SCALAR_FORMATS = {
+    "bool": "<?",
+    "ubyte": "<B",
+    "ushort": "<H",
+    "int": "<i",
+    "uint": "<I",
+    "ulong": "<Q",
+    "double": "<d",
+}
+
+
+class Table():
+    """A table, fields are (slot, type, value) with type one of SCALAR_FORMATS or "offset" for Table, Vector or str."""
+
+    def __init__(self, fields: list[tuple]):
+        """
+        :param list fields: (slot in the schema, type, value), fields with value None are left out
+        """
+        self.fields = [field for field in fields if field[2] is not None]
+
+
+class Vector():
+    """A vector of scalars (numpy array) or of offsets (list of Tables or strs)."""
+
+    def __init__(self, elements, element_type: str = "offset"):
+        """
+        :param elements: numpy array of scalars, or list of Tables or strs
+        :param str element_type: one of SCALAR_FORMATS for scalars, "offset" for tables and strings
+        """
+        self.elements = elements
+        self.element_type = element_type
+
+
+def serialize(root: Table) -> bytes:
+    """
+    Serialize a root table.
+
+    :param Table root: root table of the buffer
+    :return: the flatbuffer (without size prefix)
+    """
+    buffer = bytearray(4)
+    struct.pack_into("<I", buffer, 0, _write(buffer, root))
+    return bytes(buffer)
+
+
+def _align(buffer: bytearray, alignment: int, following: int = 0):
+    """pad the buffer so that the data written after the next `following` bytes is aligned"""
+    buffer.extend(bytes(-(len(buffer) + following) % alignment))
+
+
+def _write(buffer: bytearray, obj) -> int:
+    """append an object and everything it references, return its position"""
+    if isinstance(obj, Table):
+        return _write_table(buffer, obj)
+    if isinstance(obj, Vector):
+        return _write_vector(buffer, obj)
+    return _write_string(buffer, obj)
+
+
+def _write_string(buffer: bytearray, string: str) -> int:
+    encoded = string.encode("utf-8")
+    _align(buffer, 4)
+    position = len(buffer)
+    buffer.extend(struct.pack("<I", len(encoded)))
+    buffer.extend(encoded + b"\0")
+    return position
+
+
+def _write_vector(buffer: bytearray, vector: Vector) -> int:
+    if vector.element_type != "offset":
+        element_format = SCALAR_FORMATS[vector.element_type]
+        element_size = struct.calcsize(element_format)
+        # the length is followed by the elements, both have to be aligned
+        _align(buffer, max(element_size, 4), following=4)
+        position = len(buffer)
+        buffer.extend(struct.pack("<I", len(vector.elements)))
+        buffer.extend(np.ascontiguousarray(vector.elements, dtype=element_format).tobytes())
+        return position
+
+    _align(buffer, 4)
+    position = len(buffer)
+    buffer.extend(struct.pack("<I", len(vector.elements)))
+    slots = []
+    for _ in vector.elements:
+        slots.append(len(buffer))
+        buffer.extend(bytes(4))
+    for slot, element in zip(slots, vector.elements):
+        struct.pack_into("<I", buffer, slot, _write(buffer, element) - slot)
+    return position
+
+
+def _field_size(field_type: str) -> int:
+    if field_type == "offset":
+        return 4
+    return struct.calcsize(SCALAR_FORMATS[field_type])
+
+
+def _write_table(buffer: bytearray, table: Table) -> int:
+    # lay out the fields after the soffset to the vtable, largest first to save padding
+    fields = sorted(table.fields, key=lambda field: -_field_size(field[1]))
+    alignment = max([4, *[_field_size(field[1]) for field in fields]])
+
+    field_positions = {}
+    table_size = 4
+    for field in fields:
+        size = _field_size(field[1])
+        table_size += -table_size % size
+        field_positions[field[0]] = table_size
+        table_size += size
+
+    n_slots = max([field[0] + 1 for field in fields], default=0)
+    vtable = struct.pack(
+        f"<{2 + n_slots}H", 4 + 2 * n_slots, table_size, *[field_positions.get(slot, 0) for slot in range(n_slots)],
+    )
+    _align(buffer, 2)
+    vtable_position = len(buffer)
+    buffer.extend(vtable)
+
+    _align(buffer, alignment)
+    position = len(buffer)
+    buffer.extend(bytes(table_size))
+    struct.pack_into("<i", buffer, position, position - vtable_position)
+
+    references = []
+    for slot, field_type, value in fields:
+        field_position = position + field_positions[slot]
+        if field_type == "offset":
+            references.append((field_position, value))
+        else:
+            struct.pack_into(SCALAR_FORMATS[field_type], buffer, field_position, value)
+    for field_position, value in references:
+        struct.pack_into("<I", buffer, field_position, _write(buffer, value) - field_position)
+    return position
@@ -0,0 +1,147 @@
+"""
+FlatGeobuf encoding of a page: the magic bytes, the header and the features,
+each a size prefixed flatbuffer (https://flatgeobuf.org). The page has no
+spatial index, features are in the order of the page.
+"""
+import json
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, encode_json
+from fairqapi.formats.flatbuffers import Table, Vector, serialize
+
+MAGIC_BYTES = b"fgb\x03fgb\x00"
+
+GEOMETRY_TYPES = {"Unknown": 0, "Point": 1, "LineString": 2, "Polygon": 3, "MultiLineString": 5, "MultiPolygon": 6}
+# column types of the FlatGeobuf schema
+LONG, DOUBLE, STRING, JSON, DATETIME = 7, 10, 11, 12, 13
+
+
+def encode_flatgeobuf(store: FeatureStore, next_cursor=None, geometry: bool = True, name: str = "") -> bytes:
+    """
+    Encode the features of a store as FlatGeobuf.
+
+    :param FeatureStore store: features of the page, e.g. FeatureStore.take(rows)
+    :param Cursor next_cursor: cursor of the next page, stored as header metadata {"next": ...}
+    :param bool geometry: include the geometries, else every feature has no geometry
+    :param str name: name of the endpoint, the name of the layer
+    :return: FlatGeobuf
+    """
+    columns = [(store.id_name, LONG if store.ids.dtype.kind in "iu" else STRING, store.ids.tolist())]
+    for column_name, column in store.strings.items():
+        column_type = DATETIME if column_name.startswith("date_time") else STRING
+        columns.append((column_name, column_type, column.categories[column.codes].tolist()))
+    for column_name, column in store.values.items():
+        columns.append((column_name, JSON, json_lists(column.to_list(0, len(column)))))
+
+    geometry_type = store.geometries.geometry_type if geometry else "Unknown"
+    header = Table([
+        (0, "offset", name),
+        (1, "offset", Vector(envelope(store), "double") if geometry and len(store) else None),
+        (2, "ubyte", GEOMETRY_TYPES[geometry_type]),
+        (7, "offset", Vector([
+            Table([(0, "offset", column_name), (1, "ubyte", column_type), (7, "bool", False)])
+            for column_name, column_type, _ in columns
+        ])),
+        (8, "ulong", len(store)),
+        (9, "ushort", 0),
+        (10, "offset", Table([(0, "offset", "EPSG"), (1, "int", 25833)]) if geometry else None),
+        (13, "offset", None if next_cursor is None else json.dumps({"next": next_cursor.encode()})),
+    ])
+
+    properties = encode_properties(columns)
+    geometries = feature_geometries(store) if geometry else [None] * len(store)
+    parts = [MAGIC_BYTES, size_prefixed(serialize(header))]
+    for feature_geometry, feature_properties in zip(geometries, properties):
+        feature = Table([
+            (0, "offset", feature_geometry),
+            (1, "offset", Vector(np.frombuffer(feature_properties, dtype=np.uint8), "ubyte")),
+        ])
+        parts.append(size_prefixed(serialize(feature)))
+    return b"".join(parts)
+
+
+def size_prefixed(buffer: bytes) -> bytes:
+    return len(buffer).to_bytes(4, "little") + buffer
+
+
+def json_lists(lists: list[list[float]]) -> list[str]:
+    """Encode every list as json, all lists with one call of the encoder."""
+    if not lists:
+        return []
+    return ["[{}]".format(values) for values in encode_json(lists).decode("utf-8")[2:-2].split("],[")]
+
+
+def envelope(store: FeatureStore) -> np.ndarray:
+    """Return the bounding box (minx, miny, maxx, maxy) of all geometries."""
+    coords = store.geometries.coords
+    return np.concatenate([coords.min(axis=0), coords.max(axis=0)]).astype(np.float64)
+
+
+def encode_properties(columns: list[tuple]) -> list[bytes]:
+    """
+    Encode the properties of every feature: the column index (uint16) followed by the value.
+
+    :param list columns: (name, column type, values) of every column
+    :return: properties of every feature
+    """
+    encoded_columns = []
+    for index, (_, column_type, values) in enumerate(columns):
+        column_index = index.to_bytes(2, "little")
+        if column_type == LONG:
+            rows = np.empty(len(values), dtype=[("index", "<u2"), ("value", "<i8")])
+            rows["index"] = index
+            rows["value"] = values
+            encoded = rows.tobytes()
+            encoded_columns.append([encoded[start:start + 10] for start in range(0, len(encoded), 10)])
+        else:
+            encoded_columns.append([
+                column_index + len(value).to_bytes(4, "little") + value
+                for value in (row_value.encode("utf-8") for row_value in values)
+            ])
+    return [b"".join(feature_properties) for feature_properties in zip(*encoded_columns)]
+
+
+def feature_geometries(store: FeatureStore) -> list[Table]:
+    """
+    Build the geometry tables of all features.
+
+    :param FeatureStore store: features with geometries
+    :return: one Geometry table per feature
+    """
+    geometries = store.geometries
+    coords = np.ascontiguousarray(geometries.coords, dtype=np.float64)
+    offsets = geometries.offsets
+    if geometries.geometry_type == "Point":
+        return [Table([(1, "offset", Vector(xy, "double"))]) for xy in coords]
+    if geometries.geometry_type == "LineString":
+        return [_geometry(coords, offsets[0][row:row + 2]) for row in range(len(geometries))]
+    if geometries.geometry_type in ("Polygon", "MultiLineString"):
+        return [_geometry(coords, _part_offsets(offsets[0], offsets[1], row)) for row in range(len(geometries))]
+
+    geometry_tables = []
+    for row in range(len(geometries)):
+        parts = [
+            _geometry(coords, _part_offsets(offsets[1], offsets[2], polygon), GEOMETRY_TYPES["Polygon"])
+            for polygon in range(offsets[0][row], offsets[0][row + 1])
+        ]
+        geometry_tables.append(Table([(7, "offset", Vector(parts))]))
+    return geometry_tables
+
+
+def _part_offsets(outer_offsets: np.ndarray, part_offsets: np.ndarray, row: int) -> np.ndarray:
+    """coordinate offsets of the parts (rings or lines) of one geometry"""
+    return part_offsets[outer_offsets[row]:outer_offsets[row + 1] + 1]
+
+
+def _geometry(coords: np.ndarray, part_offsets: np.ndarray, geometry_type: int | None = None) -> Table:
+    """geometry with the coordinates [part_offsets[0], part_offsets[-1]), parts (rings or lines) end at part_offsets"""
+    start = part_offsets[0]
+    ends = None
+    if len(part_offsets) > 2:
+        ends = Vector(part_offsets[1:] - start, "uint")
+    return Table([
+        (0, "offset", ends),
+        (1, "offset", Vector(coords[start:part_offsets[-1]].reshape(-1), "double")),
+        (6, "ubyte", geometry_type),
+    ])
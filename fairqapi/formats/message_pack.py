@@ -0,0 +1,142 @@
+"""
+MessagePack encoding of a page as a table of columns:
+
+    {"type": "FeatureTable", "name": ..., "length": n, "crs": ..., "geometry_type": ...,
+     "columns": {"geometry": [<wkb>, ...], "<id>": [...], "<property>": [...], ...}, "next": <cursor>}
+
+The columns are encoded with numpy instead of one object at a time: integers
+as int 64, floats as float 64 and repeated strings once per distinct value.
+"""
+import struct
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.formats.wkb import to_wkb
+
+FLOAT_ROW = np.dtype([("tag", "u1"), ("value", ">f8")])
+INT_ROW = np.dtype([("tag", "u1"), ("value", ">i8")])
+
+
+def encode_msgpack(store: FeatureStore, next_cursor=None, geometry: bool = True, name: str = "") -> bytes:
+    """
+    Encode the features of a store as MessagePack table.
+
+    :param FeatureStore store: features of the page, e.g. FeatureStore.take(rows)
+    :param Cursor next_cursor: cursor of the next page, the table has no "next" if None
+    :param bool geometry: include the geometry column (well-known binary)
+    :param str name: name of the endpoint
+    :return: MessagePack map
+    """
+    columns = [(store.id_name, pack_ids(store.ids))]
+    if geometry:
+        columns.insert(0, ("geometry", pack_array([pack(wkb) for wkb in to_wkb(store.geometries)])))
+    columns += [(column_name, pack_strings(column)) for column_name, column in store.strings.items()]
+    columns += [(column_name, pack_values(column)) for column_name, column in store.values.items()]
+
+    table = {
+        "type": "FeatureTable",
+        "name": name,
+        "length": len(store),
+        "crs": None if store.geometries is None else store.geometries.crs,
+        "geometry_type": store.geometries.geometry_type if geometry else None,
+    }
+    trailer = {} if next_cursor is None else {"next": next_cursor.encode()}
+
+    parts = [map_header(len(table) + 1 + len(trailer))]
+    parts += [pack(key) + pack(value) for key, value in table.items()]
+    parts += [pack("columns"), map_header(len(columns))]
+    parts += [pack(column_name) + encoded for column_name, encoded in columns]
+    parts += [pack(key) + pack(value) for key, value in trailer.items()]
+    return b"".join(parts)
+
+
+def pack(obj) -> bytes:
+    """
+    Encode a python object, for the scalars and metadata of the table.
+
+    :param obj: None, bool, int, float, str, bytes, list or dict
+    :return: MessagePack encoding
+    """
+    if obj is None:
+        return b"\xc0"
+    if isinstance(obj, bool):
+        return b"\xc3" if obj else b"\xc2"
+    if isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            return struct.pack("B", obj)
+        return struct.pack(">Bq", 0xd3, obj)
+    if isinstance(obj, float):
+        return struct.pack(">Bd", 0xcb, obj)
+    if isinstance(obj, str):
+        encoded = obj.encode("utf-8")
+        return _sized_header(len(encoded), 0xa0, 32, (0xd9, 0xda, 0xdb)) + encoded
+    if isinstance(obj, bytes):
+        return _sized_header(len(obj), None, 0, (0xc4, 0xc5, 0xc6)) + obj
+    if isinstance(obj, list):
+        return pack_array([pack(element) for element in obj])
+    if isinstance(obj, dict):
+        return map_header(len(obj)) + b"".join(pack(key) + pack(value) for key, value in obj.items())
+    raise TypeError("Cannot encode {} as MessagePack.".format(type(obj).__name__))
+
+
+def _sized_header(size: int, fix_tag: int | None, fix_limit: int, tags: tuple) -> bytes:
+    """header of a str/bin/array/map: fix tag for small sizes, else the tag of an 8, 16 or 32 bit size"""
+    if size < fix_limit:
+        return struct.pack("B", fix_tag | size)
+    tag_8, tag_16, tag_32 = tags
+    if tag_8 is not None and size < 0x100:
+        return struct.pack(">BB", tag_8, size)
+    if size < 0x10000:
+        return struct.pack(">BH", tag_16, size)
+    return struct.pack(">BI", tag_32, size)
+
+
+def array_header(size: int) -> bytes:
+    return _sized_header(size, 0x90, 16, (None, 0xdc, 0xdd))
+
+
+def map_header(size: int) -> bytes:
+    return _sized_header(size, 0x80, 16, (None, 0xde, 0xdf))
+
+
+def pack_array(encoded_elements: list[bytes]) -> bytes:
+    """Encode an array of already encoded elements."""
+    return array_header(len(encoded_elements)) + b"".join(encoded_elements)
+
+
+def pack_ids(ids: np.ndarray) -> bytes:
+    """Encode the ids, integers all as int 64."""
+    if ids.dtype.kind not in "iu":
+        return pack_array([pack(feature_id) for feature_id in ids.tolist()])
+
+    rows = np.empty(len(ids), dtype=INT_ROW)
+    rows["tag"] = 0xd3
+    rows["value"] = ids
+    return array_header(len(ids)) + rows.tobytes()
+
+
+def pack_strings(column: StringColumn) -> bytes:
+    """Encode the strings of a column, every distinct string is encoded once."""
+    categories = np.array([pack(category) for category in column.categories.tolist()], dtype=object)
+    return array_header(len(column)) + b"".join(categories[column.codes].tolist())
+
+
+def pack_values(column: ValueColumn) -> bytes:
+    """Encode the forecast lists of a column as arrays of float 64."""
+    n_rows, width = column.values.shape
+    if column.horizons is None:
+        header = np.frombuffer(array_header(width), dtype=np.uint8)
+        rows = np.empty(n_rows, dtype=[("header", "u1", (len(header),)), ("values", FLOAT_ROW, (width,))])
+        rows["header"] = header
+        rows["values"]["tag"] = 0xcb
+        rows["values"]["value"] = column.values
+        return array_header(n_rows) + rows.tobytes()
+
+    values = np.empty((n_rows, width), dtype=FLOAT_ROW)
+    values["tag"] = 0xcb
+    values["value"] = column.values
+    parts = [array_header(n_rows)]
+    for row, horizon in zip(values, column.horizons.tolist()):
+        parts += [array_header(horizon), row[:horizon].tobytes()]
+    return b"".join(parts)
@@ -0,0 +1,89 @@
+"""Choice of the output format by query parameter or Accept header, and encoding of pages in it."""
+from fastapi import HTTPException
+
+from fairqapi.formats import arrow
+from fairqapi.formats.flatgeobuf import encode_flatgeobuf
+from fairqapi.formats.message_pack import encode_msgpack
+
+DEFAULT_FORMAT = "geojson"
+# media types of the formats, the first one is the Content-Type of the response
+MEDIA_TYPES = {
+    "geojson": ["application/json", "application/geo+json"],
+    "arrow": ["application/vnd.apache.arrow.stream"],
+    "msgpack": ["application/msgpack", "application/x-msgpack"],
+    "fgb": ["application/flatgeobuf"],
+}
+# encoders of the binary formats, geojson is encoded by the FeatureStore itself
+ENCODERS = {
+    "arrow": arrow.encode_arrow,
+    "msgpack": encode_msgpack,
+    "fgb": encode_flatgeobuf,
+}
+
+
+def available_formats() -> list[str]:
+    """Return the formats in order of preference, arrow only if pyarrow is installed."""
+    return [name for name in MEDIA_TYPES if name != "arrow" or arrow.is_available()]
+
+
+def media_type(output_format: str) -> str:
+    """Return the Content-Type of a format."""
+    return MEDIA_TYPES[output_format][0]
+
+
+def choose_format(format_param: str | None = None, accept: str | None = None) -> str:
+    """
+    Choose the output format, the query parameter takes precedence over the Accept header.
+
+    Wildcards like */* only accept geojson, binary formats have to be asked for explicitly.
+
+    :param str format_param: value of the query parameter "format", e.g. "arrow"
+    :param str accept: value of the Accept header, e.g. "application/msgpack, application/json;q=0.5"
+    :return: name of the format, geojson if no available format is accepted
+    """
+    if format_param is not None:
+        if format_param not in available_formats():
+            raise HTTPException(status_code=406, detail="Format '{}' is not available.".format(format_param))
+        return format_param
+    if not accept:
+        return DEFAULT_FORMAT
+
+    qualities = {}
+    for media_range in accept.split(","):
+        name, *params = media_range.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    wildcard_quality = qualities.get("application/*", qualities.get("*/*", 0))
+    candidates = []
+    for preference, name in enumerate(available_formats()):
+        quality = max(qualities.get(media, 0) for media in MEDIA_TYPES[name])
+        if name == DEFAULT_FORMAT:
+            quality = max(quality, wildcard_quality)
+        candidates.append((quality, -preference, name))
+
+    quality, _, name = max(candidates)
+    if quality <= 0:
+        return DEFAULT_FORMAT
+    return name
+
+
+def encode_page(output_format: str, store, next_cursor=None, geometry: bool = True, name: str = "") -> bytes:
+    """
+    Encode the features of a page in a binary format.
+
+    :param str output_format: one of ENCODERS
+    :param FeatureStore store: features of the page, e.g. FeatureStore.take(rows)
+    :param Cursor next_cursor: cursor of the next page, None if there are no further features
+    :param bool geometry: include the geometries
+    :param str name: name of the endpoint
+    :return: encoded page
+    """
+    return ENCODERS[output_format](store, next_cursor, geometry, name)
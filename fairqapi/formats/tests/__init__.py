@@ -0,0 +1 @@
+"""Formats tests."""
@@ -0,0 +1,60 @@
+"""test file for arrow.py."""
+import numpy as np
+import pytest
+
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.feature_store import ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.cache.tests.test_feature_store import get_grid_store
+from fairqapi.formats.arrow import encode_arrow, geoarrow_array, value_array
+
+pyarrow = pytest.importorskip("pyarrow")
+
+
+def test_encode_arrow() -> None:
+    """This test asserts that a page is one record batch with typed columns and the cursor as metadata."""
+    # arrange
+    store = get_grid_store(20)
+    store.values["no2"] = ValueColumn(store.values["no2"].values, np.array([2, 1] * 10))
+
+    # act
+    res = pyarrow.ipc.open_stream(encode_arrow(store, Cursor(1, 19, 19), name="grid")).read_all()
+
+    # assert
+    assert res.num_rows == 20
+    assert res.schema.metadata[b"next"] == Cursor(1, 19, 19).encode().encode("utf-8")
+    assert res.schema.field("geometry").metadata[b"ARROW:extension:name"] == b"geoarrow.point"
+    assert res.column("geometry").to_pylist()[1] == [415725, 5810325]
+    assert res.column("id").to_pylist() == list(range(20))
+    assert str(res.schema.field("date_time_forecast_iso8601").type) == "timestamp[us, tz=UTC]"
+    assert res.column("forecast_range_iso8601").to_pylist() == ["R2/2022-10-27T10:00:00.000000Z/PT1H"] * 20
+    assert res.column("no2").to_pylist()[:2] == [[22.4, 0.0], [22.4]]
+    assert res.schema.field("pm10").type == pyarrow.list_(pyarrow.float64(), 2)
+
+
+def test_geoarrow_array() -> None:
+    """This test asserts that nested geometries keep their parts."""
+    # arrange
+    ring = [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]]
+    coordinates = [[[ring], [ring, ring]], [[ring]]]
+
+    # act
+    res = geoarrow_array(GeometryStore.from_coordinates("MultiPolygon", coordinates))
+
+    # assert
+    assert res.to_pylist() == coordinates
+
+
+def test_value_array_beyond_horizon() -> None:
+    """This test asserts that forecasts sliced beyond their horizon are empty lists."""
+    # arrange
+    values = np.zeros((3, 0))
+
+    # act
+    res = value_array(ValueColumn(values))
+    res_horizons = value_array(ValueColumn(values, np.zeros(3, dtype=int)))
+
+    # assert
+    assert res.to_pylist() == [[], [], []]
+    assert res_horizons.to_pylist() == [[], [], []]
+    assert res.type == pyarrow.list_(pyarrow.float64())
@@ -0,0 +1,61 @@
+"""test file for flatgeobuf.py."""
+import io
+import json
+
+import numpy as np
+import pytest
+
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.cache.tests.test_feature_store import get_grid_store
+from fairqapi.formats.flatgeobuf import MAGIC_BYTES, encode_flatgeobuf
+
+pyogrio_raw = pytest.importorskip("pyogrio.raw")
+
+
+def test_encode_flatgeobuf() -> None:
+    """This test asserts that GDAL reads the features, their properties and the cursor of a page."""
+    # arrange
+    store = get_grid_store(20)
+
+    # act
+    encoded = encode_flatgeobuf(store, Cursor(1, 19, 19), name="grid")
+    meta, _, geometries, fields = pyogrio_raw.read(io.BytesIO(encoded))
+
+    # assert
+    assert encoded.startswith(MAGIC_BYTES)
+    assert meta["geometry_type"] == "Point"
+    assert meta["crs"] == "EPSG:25833"
+    assert list(meta["fields"]) == [
+        "id", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2", "pm10", "pm2.5",
+    ]
+    assert len(geometries) == 20
+    assert list(fields[0]) == list(range(20))
+    assert json.loads(fields[3][1]) == [22.4, 1.0]
+
+
+def test_encode_flatgeobuf_multipolygon() -> None:
+    """This test asserts that MultiPolygons with holes are read back with all their rings."""
+    # arrange
+    outer = [[0.0, 0.0], [4.0, 0.0], [4.0, 4.0], [0.0, 4.0], [0.0, 0.0]]
+    hole = [[1.0, 1.0], [1.0, 2.0], [2.0, 2.0], [1.0, 1.0]]
+    coordinates = [[[outer, hole], [outer]], [[outer]]]
+    store = FeatureStore(
+        "PLR_ID",
+        np.array(["a", "b"]),
+        GeometryStore.from_coordinates("MultiPolygon", coordinates),
+        {"forecast_range_iso8601": StringColumn.from_values(["R1/2022-10-27T00:00:00+00:00/PT24H"] * 2)},
+        {"no2": ValueColumn(np.array([[1.0, 2.0], [3.0, np.nan]]), np.array([2, 1]))},
+    )
+
+    # act
+    meta, _, geometries, fields = pyogrio_raw.read(io.BytesIO(encode_flatgeobuf(store, name="lor")), return_fids=False)
+
+    # assert
+    assert meta["geometry_type"] == "MultiPolygon"
+    assert list(fields[0]) == ["a", "b"]
+    assert [json.loads(values) for values in fields[2]] == [[1.0, 2.0], [3.0]]
+    # WKB of the first MultiPolygon: 2 polygons, the first with 2 rings
+    assert geometries[0][5:9] == (2).to_bytes(4, "little")
+    assert geometries[0][14:18] == (2).to_bytes(4, "little")
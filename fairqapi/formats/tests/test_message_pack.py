@@ -0,0 +1,48 @@
+"""test file for message_pack.py."""
+import numpy as np
+import pytest
+
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.feature_store import ValueColumn
+from fairqapi.cache.tests.test_feature_store import get_grid_store
+from fairqapi.formats.message_pack import encode_msgpack, pack
+from fairqapi.formats.wkb import to_wkb
+
+msgpack = pytest.importorskip("msgpack")
+
+
+def test_pack() -> None:
+    """This test asserts that python objects are encoded like the msgpack package encodes them."""
+    # arrange
+    obj = {"a": [None, True, 1, -1, 2 ** 40, 0.5, "x" * 40, b"\x00" * 300], "b": list(range(20))}
+
+    # act
+    res = msgpack.unpackb(pack(obj))
+
+    # assert
+    assert res == obj
+
+
+def test_encode_msgpack() -> None:
+    """This test asserts that the columns of a page are encoded with their values and the cursor."""
+    # arrange
+    store = get_grid_store(20)
+    store.values["no2"] = ValueColumn(store.values["no2"].values, np.array([2, 1] * 10))
+
+    # act
+    res = msgpack.unpackb(encode_msgpack(store, Cursor(1, 19, 19), name="grid"))
+    res_without_geometry = msgpack.unpackb(encode_msgpack(store, geometry=False))
+
+    # assert
+    assert res["length"] == 20
+    assert res["next"] == Cursor(1, 19, 19).encode()
+    assert list(res["columns"]) == [
+        "geometry", "id", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2", "pm10", "pm2.5",
+    ]
+    assert res["columns"]["geometry"] == to_wkb(store.geometries)
+    assert res["columns"]["id"] == list(range(20))
+    assert res["columns"]["date_time_forecast_iso8601"] == ["2022-10-27T09:14:45+00:00"] * 20
+    assert res["columns"]["no2"][:2] == [[22.4, 0.0], [22.4]]
+    assert res["columns"]["pm10"] == [[23.5, 21.8]] * 20
+    assert "geometry" not in res_without_geometry["columns"]
+    assert "next" not in res_without_geometry
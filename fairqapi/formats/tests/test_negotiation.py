@@ -0,0 +1,30 @@
+"""test file for negotiation.py."""
+import pytest
+from fastapi import HTTPException
+
+from fairqapi.formats import arrow
+from fairqapi.formats.negotiation import choose_format
+
+
+def test_choose_format() -> None:
+    """This test asserts that the format parameter wins and the accepted format with the highest quality is chosen."""
+    # act & assert
+    assert choose_format() == "geojson"
+    assert choose_format(accept="*/*") == "geojson"
+    assert choose_format(accept="application/msgpack") == "msgpack"
+    assert choose_format(accept="application/flatgeobuf;q=0.5, application/json;q=0.9") == "geojson"
+    assert choose_format(accept="application/json;q=0.5, application/x-msgpack") == "msgpack"
+    assert choose_format(accept="text/html") == "geojson"
+    assert choose_format("fgb", "application/msgpack") == "fgb"
+
+
+def test_choose_format_unavailable(monkeypatch) -> None:
+    """This test asserts that arrow is not offered without pyarrow."""
+    # arrange
+    monkeypatch.setattr(arrow, "pyarrow", None)
+
+    # act & assert
+    assert choose_format(accept="application/vnd.apache.arrow.stream") == "geojson"
+    with pytest.raises(HTTPException) as error:
+        choose_format("arrow")
+    assert error.value.status_code == 406
@@ -0,0 +1,38 @@
+"""test file for wkb.py."""
+import struct
+
+import numpy as np
+
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.formats.wkb import to_wkb
+
+
+def test_to_wkb_point() -> None:
+    """This test asserts that points are encoded as little endian WKB."""
+    # arrange
+    geometries = GeometryStore("Point", np.array([[1.0, 2.0], [3.0, 4.0]]), [])
+
+    # act
+    res = to_wkb(geometries)
+
+    # assert
+    assert res == [struct.pack("<BIdd", 1, 1, 1.0, 2.0), struct.pack("<BIdd", 1, 1, 3.0, 4.0)]
+
+
+def test_to_wkb_multipolygon() -> None:
+    """This test asserts that the polygons and rings of a MultiPolygon are nested in its WKB."""
+    # arrange
+    ring = [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.0, 0.0]]
+    geometries = GeometryStore.from_coordinates("MultiPolygon", [[[ring], [ring, ring]]])
+
+    # act
+    res = to_wkb(geometries)
+
+    # assert
+    encoded_ring = struct.pack("<I", 4) + np.array(ring).tobytes()
+    expected = b"".join([
+        struct.pack("<BII", 1, 6, 2),
+        struct.pack("<BII", 1, 3, 1), encoded_ring,
+        struct.pack("<BII", 1, 3, 2), encoded_ring, encoded_ring,
+    ])
+    assert res == [expected]
@@ -0,0 +1,74 @@
+"""Well-known binary (little endian) of the geometries of a GeometryStore."""
+import struct
+
+import numpy as np
+
+from fairqapi.cache.geometry_store import GeometryStore
+
+WKB_TYPES = {"Point": 1, "LineString": 2, "Polygon": 3, "MultiLineString": 5, "MultiPolygon": 6}
+
+
+def to_wkb(geometries: GeometryStore) -> list[bytes]:
+    """
+    Encode every geometry as well-known binary.
+
+    :param GeometryStore geometries: geometries to encode
+    :return: one WKB per geometry
+    """
+    coords = np.ascontiguousarray(geometries.coords, dtype="<f8")
+    if geometries.geometry_type == "Point":
+        points = np.empty(len(coords), dtype=[("order", "u1"), ("type", "<u4"), ("xy", "<f8", (2,))])
+        points["order"] = 1
+        points["type"] = WKB_TYPES["Point"]
+        points["xy"] = coords
+        encoded = points.tobytes()
+        size = points.dtype.itemsize
+        return [encoded[start:start + size] for start in range(0, len(encoded), size)]
+
+    coords = coords.tobytes()
+    offsets = [level_offsets.tolist() for level_offsets in geometries.offsets]
+    write = {
+        "LineString": _linestring,
+        "Polygon": _polygon,
+        "MultiLineString": _multilinestring,
+        "MultiPolygon": _multipolygon,
+    }[geometries.geometry_type]
+    return [b"".join(write(coords, offsets, row)) for row in range(len(geometries))]
+
+
+def _header(geometry_type: str, count: int) -> bytes:
+    return struct.pack("<BII", 1, WKB_TYPES[geometry_type], count)
+
+
+def _points(coords: bytes, start: int, end: int) -> list[bytes]:
+    return [struct.pack("<I", end - start), coords[16 * start:16 * end]]
+
+
+def _linestring(coords: bytes, offsets: list[list[int]], row: int) -> list[bytes]:
+    start, end = offsets[0][row], offsets[0][row + 1]
+    return [_header("LineString", end - start), coords[16 * start:16 * end]]
+
+
+def _polygon(coords: bytes, offsets: list[list[int]], row: int) -> list[bytes]:
+    ring_offsets = offsets[-1]
+    first, last = offsets[-2][row], offsets[-2][row + 1]
+    parts = [_header("Polygon", last - first)]
+    for ring in range(first, last):
+        parts += _points(coords, ring_offsets[ring], ring_offsets[ring + 1])
+    return parts
+
+
+def _multilinestring(coords: bytes, offsets: list[list[int]], row: int) -> list[bytes]:
+    first, last = offsets[0][row], offsets[0][row + 1]
+    parts = [_header("MultiLineString", last - first)]
+    for line in range(first, last):
+        parts += _linestring(coords, offsets[1:], line)
+    return parts
+
+
+def _multipolygon(coords: bytes, offsets: list[list[int]], row: int) -> list[bytes]:
+    first, last = offsets[0][row], offsets[0][row + 1]
+    parts = [_header("MultiPolygon", last - first)]
+    for polygon in range(first, last):
+        parts += _polygon(coords, offsets, polygon)
+    return parts
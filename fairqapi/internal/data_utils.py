@@ -1,38 +1,115 @@
+import datetime
+import re
+
 import numpy as np
 import pandas as pd
 
 
+ENDPOINTS = ["stations", "grid", "streets", "lor", "simulation"]
+
+# traffic reduction levels in percent the simulation is computed for
+SIMULATION_LEVELS = list(range(0, 101, 10))
+
+
 def transform_raw_data(df_raw: pd.DataFrame, endpoint: str, forecast_interval_in_hours: int) -> pd.DataFrame:
     """
     Formats raw api data and makes it ready for json conversion.
 
+    Only the positions of the rows are sorted, every column of the result is
+    copied once. Each distinct timestamp is formatted once.
+
     :param pd.DataFrame df_raw: raw api data as queried from fairq_prod_output.api_* tables
     :param str endpoint:
     :param forecast_interval_in_hours: integer determines in which time interval the prediction is updated in hours.
     :return: pd.Dataframe: transformed api data as DataFrame, ready for json conversion
     """
-    df = add_forecast_range_iso(df=df_raw, forecast_interval_in_hours=forecast_interval_in_hours)
-    df = add_date_time_forecast_iso(df=df).rename(columns={"pm25": "pm2.5"})
-
-    if endpoint == "stations":
-        df = df.sort_values(["station_id"]).loc[:, ["x", "y", *get_property_cols(endpoint)]]
-    elif endpoint == "grid":
-        df = df.sort_values(["id"]).loc[:, ["x", "y", *get_property_cols(endpoint)]]
-    elif endpoint == "streets":
-        df = df.sort_values(["element_nr"]).loc[:, ["geometry", *get_property_cols(endpoint)]]
-    elif endpoint == "lor":
-        df = df.sort_values(["PLR_ID"]).loc[:, ["geometry", *get_property_cols(endpoint)]]
-    elif endpoint == "simulation":
-        df = df.rename(columns={"pm25_0": "pm2.5_0","pm25_10": "pm2.5_10", "pm25_20": "pm2.5_20",
-        "pm25_30": "pm2.5_30", "pm25_40": "pm2.5_40", "pm25_50": "pm2.5_50", "pm25_60": "pm2.5_60",
-        "pm25_70": "pm2.5_70", "pm25_80": "pm2.5_80", "pm25_90": "pm2.5_90", "pm25_100": "pm2.5_100"})
-        df = df.sort_values(["element_nr"]).loc[:, ["geometry", *get_property_cols(endpoint)]]
-    else:
+    if endpoint not in ENDPOINTS:
         raise ValueError(
-            "Incorrect endpoint '{}' was given. Possible endpoints are 'stations', 'grid', 'streets', 'lor', 'simulation'".format(endpoint)
+            "Incorrect endpoint '{}' was given. "
+            "Possible endpoints are 'stations', 'grid', 'streets', 'lor', 'simulation'".format(endpoint),
         )
 
-    return df
+    iso = get_iso_format()
+    property_cols = get_property_cols(endpoint)
+    formatted = {
+        "date_time_forecast_" + iso["name"]: format_datetimes(df_raw["date_time_forecast"]),
+        "forecast_range_" + iso["name"]: format_forecast_ranges(
+            df_raw["first_pred_date_time"], df_raw["last_pred_date_time"], forecast_interval_in_hours,
+        ),
+    }
+
+    # geometries are only part of the raw data if they were queried together with the forecasts
+    location_cols = ["x", "y"] if endpoint in {"stations", "grid"} else ["geometry"]
+    location_cols = [col for col in location_cols if col in df_raw.columns]
+
+    order = np.argsort(df_raw[property_cols[0]].to_numpy(), kind="stable")
+    columns = {}
+    for col in [*location_cols, *property_cols]:
+        if col in formatted:
+            values = formatted[col]
+        else:
+            raw_col = get_raw_col(col)
+            values = df_raw[raw_col if raw_col in df_raw.columns else col].to_numpy()
+        columns[col] = values[order]
+
+    # copy=False keeps the columns as they are instead of copying them into blocks of the same dtype
+    return pd.DataFrame(columns, index=df_raw.index[order], copy=False)
+
+
+def factorize_datetimes(columns: list[pd.Series]) -> tuple[np.ndarray, list[pd.Series]]:
+    """
+    Find the distinct combinations of the values of datetime columns.
+
+    :param list columns: datetime64 columns of the same length
+    :return: code of every row's combination and the distinct combinations, one series per column
+    """
+    # the integer view turns NaT into an ordinary value, so it is formatted like the other values
+    codes_and_uniques = [pd.factorize(column.to_numpy(dtype="datetime64[ns]").view(np.int64)) for column in columns]
+    shape = [len(uniques) for _, uniques in codes_and_uniques]
+    codes, combinations = pd.factorize(np.ravel_multi_index([codes for codes, _ in codes_and_uniques], shape))
+    positions = np.unravel_index(combinations, shape)
+    distinct = [
+        pd.Series(uniques[position].view("datetime64[ns]"))
+        for (_, uniques), position in zip(codes_and_uniques, positions)
+    ]
+    return codes, distinct
+
+
+def format_datetimes(datetimes: pd.Series) -> np.ndarray:
+    """
+    Format datetimes in iso format, each distinct value once.
+
+    :param pd.Series datetimes: datetime64 column
+    :return: object array of the formatted datetimes
+    """
+    iso = get_iso_format()
+    codes, (distinct,) = factorize_datetimes([datetimes])
+    return distinct.dt.strftime(iso["format"]).astype(str).to_numpy(dtype=object)[codes]
+
+
+def format_forecast_ranges(
+    first_pred_date_time: pd.Series,
+    last_pred_date_time: pd.Series,
+    forecast_interval_in_hours: int,
+) -> np.ndarray:
+    """
+    Format forecast ranges in iso format (for example "R3/2022-10-24T14:00:00.000000Z/PT1H"), each distinct range once.
+
+    :param pd.Series first_pred_date_time: datetime64 column of the first predictions
+    :param pd.Series last_pred_date_time: datetime64 column of the last predictions
+    :param forecast_interval_in_hours: integer determines in which time interval the prediction is updated in hours.
+    :return: object array of the formatted forecast ranges
+    """
+    iso = get_iso_format()
+    codes, (first, last) = factorize_datetimes([first_pred_date_time, last_pred_date_time])
+
+    # forecast horizon in hours plus 1 to match length of list of pollutant predictions:
+    forecast_horizon_h = ((last - first) / np.timedelta64(forecast_interval_in_hours, "h")).astype("Int64") + 1
+    forecast_ranges = (
+        "R" + forecast_horizon_h.astype(str) + "/" + first.dt.strftime(iso["format"]).astype(str) +
+        "/PT" + str(forecast_interval_in_hours) + "H"
+    )
+    return forecast_ranges.to_numpy(dtype=object)[codes]
 
 
 def get_iso_format() -> dict:
@@ -53,27 +130,33 @@ def add_forecast_range_iso(df: pd.DataFrame, forecast_interval_in_hours: int) ->
     :return: pd.DataFrame just like input df but with one additional last column "forecast_range_isoXXXX" (object)
     """
     iso = get_iso_format()
+    df["forecast_range_" + iso["name"]] = format_forecast_ranges(
+        df["first_pred_date_time"], df["last_pred_date_time"], forecast_interval_in_hours,
+    )
+    return df
 
-    df["forecast_horizon_delta"] = df["last_pred_date_time"] - df["first_pred_date_time"]
 
-    # forecast horizon in hours plus 1 to match length of list of pollutant predictions:
-    df["forecast_horizon_h"] = (df["forecast_horizon_delta"] / np.timedelta64(forecast_interval_in_hours, "h")).astype("Int64") + 1
-    df["forecast_horizon_h"] = df["forecast_horizon_h"].astype(str)
+def slice_forecast_range(forecast_range: str, start: int, stop: int) -> str:
+    """
+    Adapts a forecast range in iso format to the forecast values [start, stop).
 
-    df["first_pred_date_time_iso"] = df["first_pred_date_time"].dt.strftime(iso["format"]).astype(str)
-    df["forecast_range_" + iso["name"]] = (
-        "R" + df["forecast_horizon_h"] + "/" + df["first_pred_date_time_iso"] + "/PT" + str(forecast_interval_in_hours) + "H"
-    )
-    df = df.drop(
-        columns=[
-            "forecast_horizon_delta",
-            "forecast_horizon_h",
-            "first_pred_date_time_iso",
-        ]
+    :param str forecast_range: for example "R80/2022-10-24T14:00:00.000000Z/PT1H"
+    :param int start: first forecast value to keep
+    :param int stop: end of the kept forecast values (exclusive)
+    :return: for example "R6/2022-10-24T16:00:00.000000Z/PT1H" for start=2, stop=8, unchanged if it is no forecast range
+    """
+    iso = get_iso_format()
+    match = re.fullmatch(r"R(\d+)/([^/]+)/PT(\d+)H", forecast_range)
+    if match is None:
+        return forecast_range
+
+    horizon, first_pred_date_time, forecast_interval_in_hours = match.groups()
+    first = datetime.datetime.strptime(first_pred_date_time, iso["format"])
+    first += datetime.timedelta(hours=start * int(forecast_interval_in_hours))
+    return "R{}/{}/PT{}H".format(
+        max(min(int(horizon), stop) - start, 0), first.strftime(iso["format"]), forecast_interval_in_hours,
     )
 
-    return df
-
 
 def add_date_time_forecast_iso(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -85,7 +168,7 @@ def add_date_time_forecast_iso(df: pd.DataFrame) -> pd.DataFrame:
     """
     iso = get_iso_format()
 
-    df["date_time_forecast"] = df["date_time_forecast"].dt.strftime(iso["format"]).astype(str)
+    df["date_time_forecast"] = format_datetimes(df["date_time_forecast"])
     df = df.rename(columns={"date_time_forecast": "date_time_forecast_" + iso["name"]})
 
     return df
@@ -102,10 +185,8 @@ def get_property_cols(endpoint: str) -> list[str]:
     date_time_forecast_iso = "date_time_forecast_" + iso["name"]
     forecast_range_iso = "forecast_range_" + iso["name"]
     pollutants = ["no2", "pm10", "pm2.5"]
-    simulation_columns = ["no2_0", "no2_10", "no2_20", "no2_30", "no2_40", "no2_50", "no2_60", "no2_70", "no2_80", "no2_90", "no2_100",
-                          "pm10_0", "pm10_10", "pm10_20", "pm10_30", "pm10_40", "pm10_50", "pm10_60", "pm10_70", "pm10_80", "pm10_90", "pm10_100",
-                          "pm2.5_0", "pm2.5_10", "pm2.5_20", "pm2.5_30", "pm2.5_40", "pm2.5_50", "pm2.5_60", "pm2.5_70", "pm2.5_80", "pm2.5_90", "pm2.5_100"
-    ]
+    # the forecasts of every traffic reduction level, e.g. "pm2.5_10", ordered by pollutant
+    simulation_columns = [f"{pollutant}_{level}" for pollutant in pollutants for level in SIMULATION_LEVELS]
 
     standard_property_cols = [date_time_forecast_iso, forecast_range_iso, *pollutants]
 
@@ -123,3 +204,13 @@ def get_property_cols(endpoint: str) -> list[str]:
         raise ValueError("Incorrect endpoint name {} was given to pick property columns.".format(endpoint))
 
     return property_cols
+
+
+def get_raw_col(col: str) -> str:
+    """
+    Returns the name a property column has in the fairq_prod_output.api_* tables.
+
+    :param str col: property column, e.g. "pm2.5_10"
+    :return: column of the table, e.g. "pm25_10"
+    """
+    return col.replace("pm2.5", "pm25")
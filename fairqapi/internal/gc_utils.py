@@ -0,0 +1,21 @@
+"""Garbage collector helper functions."""
+import gc
+from contextlib import contextmanager
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building many small objects at once.
+
+    Every few hundred new lists/dicts trigger a collection that traverses all tracked objects,
+    including the large frames and caches already in memory, which makes bulk construction
+    quadratic. Reference counting still frees objects while the collector is paused.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
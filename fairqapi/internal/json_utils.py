@@ -1,50 +1,60 @@
 """Internal json helper functions."""
-import ast
+import json
+
+from fairqapi.internal.gc_utils import paused_gc
 
 
 def df_to_geojson(df, properties, geometry_type="Point"):
     """
     Transform pandas df into geojson format.
 
-    :param pd.DataFrame df: pandas df containing either Point or LineString geometries
+    The features are assembled column by column: coordinates and properties are
+    taken from whole columns at once and all geometry strings are parsed by one json call.
+
+    :param pd.DataFrame df: pandas df containing either Point, LineString or MultiPolygon geometries
     :param list properties: list of column names to be put into properties
-    :param string geometry_type: "Point" or "LineString"
+    :param string geometry_type: "Point", "LineString" or "MultiPolygon"
     """
-    geojson = {"type": "FeatureCollection", "features": []}
-
-    for _, row in df.iterrows():
-        feature = {
-            "type": "Feature",
-            "geometry": {"type": [], "coordinates": [], "crs": "EPSG:25833"},
-            "properties": {},
-        }
-
+    with paused_gc():
         if geometry_type == "Point":
-            if not row.index.isin(["x", "y"]).sum() == 2:
+            if not {"x", "y"}.issubset(df.columns):
                 raise ValueError("Point coordinates 'x' and/or 'y' are missing in df")
-            feature["geometry"]["type"] = "Point"
-            feature["geometry"]["coordinates"] = [row["x"], row["y"]]
-
-        elif geometry_type == "LineString":
-            geometry = dict(ast.literal_eval(row["geometry"]))
-            if geometry["type"] != "LineString":
-                raise ValueError("Geometry type in df is not 'LineString', but {}.".format(geometry["type"]))
-            feature["geometry"]["type"] = geometry["type"]
-            feature["geometry"]["coordinates"] = geometry["coordinates"]
-
-        elif geometry_type == "MultiPolygon":
-            geometry = dict(ast.literal_eval(row["geometry"]))
-            if geometry["type"] != "MultiPolygon":
-                raise ValueError("Geometry type in df is not 'MultiPolygon', but {}.".format(geometry["type"]))
-            feature["geometry"]["type"] = geometry["type"]
-            feature["geometry"]["coordinates"] = geometry["coordinates"]
+            coordinates = [[x, y] for x, y in zip(df["x"].tolist(), df["y"].tolist())]
+
+        elif geometry_type in {"LineString", "MultiPolygon"}:
+            coordinates = parse_geometries(df["geometry"].tolist(), geometry_type)
 
         else:
-            raise ValueError("Geometry type can only be 'Point' or 'LineString'.")
+            raise ValueError("Geometry type can only be 'Point', 'LineString' or 'MultiPolygon'.")
 
-        for prop in properties:
-            feature["properties"][prop] = row[prop]
+        columns = [df[prop].tolist() for prop in properties]
+        property_rows = zip(*columns) if columns else [()] * len(df)
 
-        geojson["features"].append(feature)
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": geometry_type, "coordinates": feature_coordinates, "crs": "EPSG:25833"},
+                "properties": dict(zip(properties, property_row)),
+            }
+            for feature_coordinates, property_row in zip(coordinates, property_rows)
+        ]
 
-    return geojson
+    return {"type": "FeatureCollection", "features": features}
+
+
+def parse_geometries(geometries, geometry_type):
+    """
+    Parse geojson geometry strings and return their coordinates.
+
+    :param list geometries: geojson geometry strings, e.g. '{"type":"LineString","coordinates":[[1.0,2.0],[3.0,4.0]]}'
+    :param string geometry_type: the type all geometries must have
+    :return: list of nested coordinate lists, one per geometry
+    """
+    with paused_gc():
+        parsed = json.loads("[" + ",".join(geometries) + "]")
+        wrong_types = {geometry["type"] for geometry in parsed} - {geometry_type}
+        if wrong_types:
+            raise ValueError(
+                "Geometry type in df is not '{}', but {}.".format(geometry_type, ", ".join(sorted(wrong_types))),
+            )
+        return [geometry["coordinates"] for geometry in parsed]
@@ -1,6 +1,8 @@
-"""Stopwatch context manager that logs the passed time for given label."""
+"""Stopwatch context manager that logs the passed time for given label and timings of several stages."""
 import logging
-from time import time
+import threading
+from contextlib import contextmanager
+from time import perf_counter, time
 
 
 class Stopwatch(object):
@@ -26,3 +28,37 @@ class Stopwatch(object):
         """After finishing the with... block, safe the elapsed time."""
         self.elapsed_time = round(time() - self.elapsed_time, 1)
         logging.debug({"label": self.label, "elapsed_time": self.elapsed_time})
+
+
+class StageTimings(object):
+    """Sum up the time spent in the stages (e.g. query, transform) of several tasks, also across threads."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, task: str, stage: str):
+        """Add the time spent in the with... block to the stage of the task.
+        :param str task: name of the task, e.g. "grid"
+        :param str stage: name of the stage, e.g. "transform"
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                key = (task, stage)
+                self.seconds[key] = self.seconds.get(key, 0) + perf_counter() - start
+
+    def report(self) -> str:
+        """Return one line per task with the seconds spent in each of its stages."""
+        lines = []
+        for task in dict.fromkeys(task for task, _ in self.seconds):
+            stages = ", ".join(
+                "{stage} {seconds:.2f}s".format(stage=stage, seconds=seconds)
+                for (stage_task, stage), seconds in self.seconds.items()
+                if stage_task == task
+            )
+            lines.append("{task}: {stages}".format(task=task, stages=stages))
+        return "\n".join(lines)
@@ -8,6 +8,8 @@ from pandas.testing import assert_frame_equal
 from fairqapi.internal.data_utils import (
     add_date_time_forecast_iso,
     add_forecast_range_iso,
+    get_property_cols,
+    slice_forecast_range,
     transform_raw_data,
 )
 
@@ -200,3 +202,27 @@ def test_transform_raw_data_streets() -> None:  # noqa: WPS210 WPS218
 
     # 3. assert
     assert_frame_equal(res, expected_df)
+
+
+def test_slice_forecast_range() -> None:
+    """This test asserts that the forecast range matches the sliced forecast values."""
+    # 1. act
+    res = slice_forecast_range("R80/2022-10-30T14:00:00.000000Z/PT1H", start=2, stop=8)
+    res_daily = slice_forecast_range("R3/2022-10-30T00:00:00.000000Z/PT24H", start=1, stop=10)
+    res_beyond = slice_forecast_range("R3/2022-10-30T00:00:00.000000Z/PT24H", start=5, stop=10)
+
+    # 2. assert
+    assert res == "R6/2022-10-30T16:00:00.000000Z/PT1H"
+    assert res_daily == "R2/2022-10-31T00:00:00.000000Z/PT24H"
+    assert res_beyond == "R0/2022-11-04T00:00:00.000000Z/PT24H"
+
+
+def test_get_property_cols_simulation() -> None:
+    """This test asserts that the simulation has the forecasts of every pollutant and traffic reduction level."""
+    # 1. act
+    res = get_property_cols("simulation")
+
+    # 2. assert
+    assert res[:4] == ["element_nr", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2_0"]
+    assert res[-1] == "pm2.5_100"
+    assert len(res) == 3 + 3 * 11
@@ -1,7 +1,8 @@
 """test file for json_utils.py."""
 import pandas as pd
+import pytest
 
-from fairqapi.internal.json_utils import df_to_geojson
+from fairqapi.internal.json_utils import df_to_geojson, parse_geometries
 
 
 def test_df_to_geojson_point() -> None:
@@ -154,3 +155,80 @@ def test_df_to_geojson_linestring() -> None:
 
     # assert
     assert res == expected_dict
+
+
+def test_df_to_geojson_multipolygon() -> None:
+    """This test asserts correct geometry for df_to_geojson of geometry type 'MultiPolygon'."""
+    # arrange
+    df = pd.DataFrame(
+        {
+            "geometry": [
+                '{"type":"MultiPolygon","coordinates":[[[[390000.0,5815000.0],[390500.0,5815000.0],'
+                "[390500.0,5815500.0],[390000.0,5815000.0]]]]}",
+            ],
+            "PLR_ID": ["01100101"],
+        }
+    )
+
+    expected_geometry = {
+        "type": "MultiPolygon",
+        "coordinates": [[[[390000.0, 5815000.0], [390500.0, 5815000.0], [390500.0, 5815500.0], [390000.0, 5815000.0]]]],
+        "crs": "EPSG:25833",
+    }
+
+    # act
+    res = df_to_geojson(df, ["PLR_ID"], geometry_type="MultiPolygon")
+
+    # assert
+    assert res["features"][0]["geometry"] == expected_geometry
+    assert res["features"][0]["properties"] == {"PLR_ID": "01100101"}
+
+
+def test_df_to_geojson_wrong_geometry_type() -> None:
+    """This test asserts that geometries not matching geometry_type are rejected."""
+    # arrange
+    df = pd.DataFrame(
+        {
+            "geometry": [
+                '{"type":"LineString","coordinates":[[378710.2,5823451.6],[378745.3,5823439.2]]}',
+                '{"type":"Point","coordinates":[378710.2,5823451.6]}',
+            ],
+            "element_nr": ["33580039_33580041.02", "38690008_38690007.02"],
+        }
+    )
+
+    # act & assert
+    with pytest.raises(ValueError, match="not 'LineString', but Point"):
+        df_to_geojson(df, ["element_nr"], geometry_type="LineString")
+
+
+def test_parse_geometries_multipolygon() -> None:
+    """This test asserts that the coordinates of MultiPolygon geometry strings are returned."""
+    # arrange
+    geometries = [
+        '{"type":"MultiPolygon","coordinates":[[[[390000.0,5815000.0],[390500.0,5815000.0],'
+        "[390500.0,5815500.0],[390000.0,5815000.0]]]]}",
+    ]
+
+    expected_coordinates = [
+        [[[[390000.0, 5815000.0], [390500.0, 5815000.0], [390500.0, 5815500.0], [390000.0, 5815000.0]]]],
+    ]
+
+    # act
+    res = parse_geometries(geometries, "MultiPolygon")
+
+    # assert
+    assert res == expected_coordinates
+
+
+def test_parse_geometries_wrong_geometry_type() -> None:
+    """This test asserts that geometries not matching geometry_type are rejected."""
+    # arrange
+    geometries = [
+        '{"type":"LineString","coordinates":[[378710.2,5823451.6],[378745.3,5823439.2]]}',
+        '{"type":"Point","coordinates":[378710.2,5823451.6]}',
+    ]
+
+    # act & assert
+    with pytest.raises(ValueError, match="not 'LineString', but Point"):
+        parse_geometries(geometries, "LineString")
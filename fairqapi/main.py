@@ -6,12 +6,17 @@ from starlette_prometheus import PrometheusMiddleware, metrics
 
 from fairqapi.cache.cache import cache
 from fairqapi.routers import (  # noqa: WPS300
+    aggregate,
+    changes,
     grid,
     health_check,
+    history,
+    lookup,
     lor,
     simulation,
     stations,
     streets,
+    tiles,
 )
 
 app = FastAPI()
@@ -25,6 +30,11 @@ app.include_router(streets.router)
 app.include_router(grid.router)
 app.include_router(lor.router)
 app.include_router(simulation.router)
+app.include_router(lookup.router)
+app.include_router(tiles.router)
+app.include_router(aggregate.router)
+app.include_router(history.router)
+app.include_router(changes.router)
 
 
 @app.on_event("startup")
@@ -33,5 +43,7 @@ async def update_cache_periodically():
     Start a coroutine which checks every minute if
     an update to the cache is necessary.
     """
+    if not cache.reload_periodically:
+        return
     loop = asyncio.get_event_loop()
     loop.create_task(cache.load_cache_files_loop())
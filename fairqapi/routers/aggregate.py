@@ -0,0 +1,28 @@
+"""Endpoint /aggregate functionality."""
+
+import logging
+from logging.config import dictConfig
+
+from fastapi import APIRouter, Depends
+
+from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import aggregate_response
+from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.aggregate_response import AggregateResponse
+from fairqapi.schemas.request import AggregateRequest, ConditionalHeaders
+
+dictConfig(get_logger_config())
+
+router = APIRouter()
+
+
+@router.get("/aggregate", response_model=AggregateResponse)
+async def aggregate(request: AggregateRequest = Depends(), headers: ConditionalHeaders = Depends()):
+    """
+    Aggregate endpoint: statistics of the grid or street forecasts of every LOR or district, one value per
+    forecast value. Grid cells belong to the LOR containing their centre, streets to the LOR containing
+    their midpoint.
+    """
+    aggregate_out = aggregate_response(cache.snapshot, request, headers.if_none_match)
+    logging.info("access aggregate")
+    return aggregate_out.to_response(headers.accept_encoding, headers.if_none_match)
@@ -0,0 +1,42 @@
+"""Endpoint /{dataset}/changes functionality."""
+
+import logging
+from logging.config import dictConfig
+
+from fastapi import APIRouter, Depends, Path
+
+from fairqapi.cache.cache import cache
+from fairqapi.cache.changes import CHANGE_DATASETS
+from fairqapi.cache.response_cache import changes_response
+from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.changes_response import ChangesResponse
+from fairqapi.schemas.request import ChangesRequest, ConditionalHeaders
+
+dictConfig(get_logger_config())
+
+router = APIRouter()
+
+CHANGE_DATASET_PATTERN = r"^({})$".format("|".join(CHANGE_DATASETS))
+
+
+@router.get(
+    "/{dataset}/changes",
+    response_model=ChangesResponse,
+    responses={410: {"description": "The changes since the version are not kept anymore."}},
+)
+async def changes(
+    dataset: str = Path(..., regex=CHANGE_DATASET_PATTERN, description="streets, grid, lor or simulation"),
+    request: ChangesRequest = Depends(),
+    headers: ConditionalHeaders = Depends(),
+):
+    """
+    Changes endpoint: the features of a paged endpoint that changed since a version, and the ids of the removed
+    features. Pass the returned 'version' as 'since' to get the next changes. If the changes since the version are
+    not kept anymore (410), fetch the features from the paged endpoint instead.
+    """
+    snapshot = cache.snapshot
+    changes_out = changes_response(
+        dataset, getattr(snapshot, dataset), snapshot.change_logs[dataset], request, headers.if_none_match,
+    )
+    logging.info("access changes")
+    return changes_out.to_response(headers.accept_encoding, headers.if_none_match)
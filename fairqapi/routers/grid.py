@@ -5,9 +5,11 @@ from logging.config import dictConfig
 from fastapi import APIRouter, Depends
 
 from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import page_response
+from fairqapi.formats.negotiation import choose_format
 from fairqapi.logging_config.logger_config import get_logger_config
 from fairqapi.schemas.grid_response import GridResponse
-from fairqapi.schemas.request import Request
+from fairqapi.schemas.request import ConditionalHeaders, Request
 
 dictConfig(get_logger_config())
 
@@ -15,12 +17,9 @@ router = APIRouter()
 
 
 @router.get("/grid", response_model=GridResponse)
-async def grid(request: Request = Depends()):
+async def grid(request: Request = Depends(), headers: ConditionalHeaders = Depends()):
     """Grid endpoint."""
-
-    grid_out = {
-        "type": "FeatureCollection",
-        "features": cache.grid["features"][request.skip:(request.skip + request.limit)]
-    }
+    output_format = choose_format(request.format, headers.accept)
+    grid_out = page_response("grid", cache.snapshot.grid, request, output_format, headers.if_none_match)
     logging.info("access grid")
-    return grid_out
+    return grid_out.to_response(headers.accept_encoding, headers.if_none_match)
@@ -0,0 +1,38 @@
+"""Endpoint /history functionality."""
+
+import logging
+from logging.config import dictConfig
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Response
+
+from fairqapi.cache.feature_store import encode_json
+from fairqapi.cache.forecast_history import HISTORY_DATASETS, forecast_history
+from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.history_response import HistoryResponse
+from fairqapi.schemas.request import HistoryRequest
+
+dictConfig(get_logger_config())
+
+router = APIRouter()
+
+HISTORY_DATASET_PATTERN = r"^({})$".format("|".join(HISTORY_DATASETS))
+
+
+@router.get("/history/{dataset}/{feature_id}", response_model=HistoryResponse)
+async def history(
+    dataset: str = Path(..., regex=HISTORY_DATASET_PATTERN, description="stations, streets, grid, lor or simulation"),
+    feature_id: str = Path(..., description="id of the feature, e.g. the element_nr of a street"),
+    request: HistoryRequest = Depends(),
+):
+    """
+    History endpoint: the forecasts of one feature in the last forecast runs kept in memory, the oldest first.
+    """
+    history_out = forecast_history.feature_history(
+        dataset, feature_id, request.pollutant_list, request.hour_range, request.runs,
+    )
+    if history_out is None:
+        detail = "Feature '{}' not found in the {} history.".format(feature_id, dataset)
+        raise HTTPException(status_code=404, detail=detail)
+
+    logging.info("access history")
+    return Response(content=encode_json(history_out), media_type="application/json")
@@ -0,0 +1,34 @@
+"""Endpoint /lookup functionality."""
+
+import logging
+from logging.config import dictConfig
+
+from fastapi import APIRouter, Depends, Response
+
+from fairqapi.cache.cache import cache
+from fairqapi.cache.feature_store import encode_json
+from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.lookup_response import LookupResponse
+from fairqapi.schemas.request import LookupRequest
+
+dictConfig(get_logger_config())
+
+router = APIRouter()
+
+
+@router.get("/lookup", response_model=LookupResponse)
+async def lookup(request: LookupRequest = Depends()):
+    """
+    Lookup endpoint: forecasts at a location. Returns the LOR containing the point and
+    the nearest grid cell, street segment and station with their distance in meters.
+    """
+    snapshot = cache.snapshot
+    lors = snapshot.lor.containing(request.x, request.y)
+    lookup_out = {
+        "lor": lors[0] if lors else None,
+        "grid": snapshot.grid.nearest(request.x, request.y),
+        "streets": snapshot.streets.nearest(request.x, request.y),
+        "stations": snapshot.stations.nearest(request.x, request.y),
+    }
+    logging.info("access lookup")
+    return Response(content=encode_json(lookup_out), media_type="application/json")
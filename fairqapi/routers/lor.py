@@ -6,9 +6,11 @@ from logging.config import dictConfig
 from fastapi import APIRouter, Depends
 
 from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import page_response
+from fairqapi.formats.negotiation import choose_format
 from fairqapi.logging_config.logger_config import get_logger_config
 from fairqapi.schemas.lor_response import LorResponse
-from fairqapi.schemas.request import Request
+from fairqapi.schemas.request import ConditionalHeaders, Request
 
 dictConfig(get_logger_config())
 
@@ -16,11 +18,9 @@ router = APIRouter()
 
 
 @router.get("/lor", response_model=LorResponse)
-async def lor(request: Request = Depends()):
+async def lor(request: Request = Depends(), headers: ConditionalHeaders = Depends()):
     """LOR (LebensOrientierte Räume) endpoint."""
-    lor_out = {
-        "type": "FeatureCollection",
-        "features": cache.lor["features"][request.skip:(request.skip + request.limit)]
-    }
+    output_format = choose_format(request.format, headers.accept)
+    lor_out = page_response("lor", cache.snapshot.lor, request, output_format, headers.if_none_match)
     logging.info("access lor")
-    return lor_out
+    return lor_out.to_response(headers.accept_encoding, headers.if_none_match)
@@ -6,8 +6,10 @@ from logging.config import dictConfig
 from fastapi import APIRouter, Depends
 
 from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import page_response
+from fairqapi.formats.negotiation import choose_format
 from fairqapi.logging_config.logger_config import get_logger_config
-from fairqapi.schemas.request import Request
+from fairqapi.schemas.request import ConditionalHeaders, Request
 from fairqapi.schemas.simulation_response import SimulationResponse
 
 dictConfig(get_logger_config())
@@ -16,11 +18,11 @@ router = APIRouter()
 
 
 @router.get("/simulation", response_model=SimulationResponse)
-async def simulation(request: Request = Depends()):
+async def simulation(request: Request = Depends(), headers: ConditionalHeaders = Depends()):
     """Simulation endpoint."""
-    simulation_out = {
-        "type": "FeatureCollection",
-        "features": cache.simulation["features"][request.skip:(request.skip + request.limit)]
-    }
+    output_format = choose_format(request.format, headers.accept)
+    simulation_out = page_response(
+        "simulation", cache.snapshot.simulation, request, output_format, headers.if_none_match,
+    )
     logging.info("access simulation")
-    return simulation_out
+    return simulation_out.to_response(headers.accept_encoding, headers.if_none_match)
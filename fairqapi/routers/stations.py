@@ -2,9 +2,12 @@
 import logging
 from logging.config import dictConfig
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import page_response
+from fairqapi.formats.negotiation import choose_format
+from fairqapi.schemas.request import ConditionalHeaders
 from fairqapi.schemas.stations_response import StationsResponse
 from fairqapi.logging_config.logger_config import get_logger_config
 
@@ -14,7 +17,11 @@ router = APIRouter()
 
 
 @router.get("/stations", response_model=StationsResponse)
-async def stations():
+async def stations(headers: ConditionalHeaders = Depends()):
     """stations endpoint."""
     logging.info("access stations")
-    return cache.stations
+    output_format = choose_format(accept=headers.accept)
+    stations_out = page_response(
+        "stations", cache.snapshot.stations, output_format=output_format, if_none_match=headers.if_none_match,
+    )
+    return stations_out.to_response(headers.accept_encoding, headers.if_none_match)
@@ -6,8 +6,10 @@ from logging.config import dictConfig
 from fastapi import APIRouter, Depends
 
 from fairqapi.cache.cache import cache
+from fairqapi.cache.response_cache import page_response
+from fairqapi.formats.negotiation import choose_format
 from fairqapi.logging_config.logger_config import get_logger_config
-from fairqapi.schemas.request import Request
+from fairqapi.schemas.request import ConditionalHeaders, Request
 from fairqapi.schemas.streets_response import StreetsResponse
 
 dictConfig(get_logger_config())
@@ -16,11 +18,9 @@ router = APIRouter()
 
 
 @router.get("/streets", response_model=StreetsResponse)
-async def streets(request: Request = Depends()):
+async def streets(request: Request = Depends(), headers: ConditionalHeaders = Depends()):
     """Streets endpoint."""
-    streets_out = {
-        "type": "FeatureCollection",
-        "features": cache.streets["features"][request.skip:(request.skip + request.limit)]
-    }
+    output_format = choose_format(request.format, headers.accept)
+    streets_out = page_response("streets", cache.snapshot.streets, request, output_format, headers.if_none_match)
     logging.info("access streets")
-    return streets_out
+    return streets_out.to_response(headers.accept_encoding, headers.if_none_match)
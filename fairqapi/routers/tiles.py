@@ -0,0 +1,50 @@
+"""Endpoint /tiles functionality."""
+import logging
+from logging.config import dictConfig
+
+from fastapi import APIRouter, Depends, Path, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic.error_wrappers import ErrorWrapper
+
+from fairqapi.cache.cache import cache
+from fairqapi.logging_config.logger_config import get_logger_config
+from fairqapi.schemas.request import ConditionalHeaders, TileRequest
+from fairqapi.tiles.projection import MAX_ZOOM
+from fairqapi.tiles.tile_cache import MEDIA_TYPE, TILE_LAYERS, tile_response
+
+dictConfig(get_logger_config())
+
+router = APIRouter()
+
+TILE_LAYER_PATTERN = r"^({})$".format("|".join(TILE_LAYERS))
+
+
+@router.get(
+    "/tiles/{layer}/{z}/{x}/{y}",
+    response_class=Response,
+    responses={
+        200: {"content": {MEDIA_TYPE: {}}, "description": "Mapbox Vector Tile with one layer named like the endpoint."},
+    },
+)
+def tiles(
+    layer: str = Path(..., regex=TILE_LAYER_PATTERN, description="streets, grid, lor or simulation"),
+    z: int = Path(..., ge=0, le=MAX_ZOOM, description="zoom level"),
+    x: int = Path(..., ge=0, description="column of the tile, from the west"),
+    y: int = Path(..., ge=0, description="row of the tile, from the north"),
+    request: TileRequest = Depends(),
+    headers: ConditionalHeaders = Depends(),
+):
+    """
+    Tiles endpoint: vector tiles of a layer in WebMercator, the features carry the forecast values
+    of one hour. Tiles without features are empty. Not async, so tiles are rendered in the threadpool
+    instead of the event loop.
+    """
+    for name, tile in [("x", x), ("y", y)]:
+        if tile >= 2 ** z:
+            raise RequestValidationError(
+                [ErrorWrapper(ValueError(f"Tile {name} must be less than {2 ** z} at zoom {z}."), loc=("path", name))],
+            )
+
+    tile_out = tile_response(layer, getattr(cache.snapshot, layer), z, x, y, request.hour)
+    logging.info("access tiles")
+    return tile_out.to_response(headers.accept_encoding, headers.if_none_match)
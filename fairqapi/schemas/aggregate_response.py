@@ -0,0 +1,19 @@
+"""Response model for aggregate endpoint."""
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Extra
+
+
+class Group(BaseModel, extra=Extra.allow):
+    PLR_ID: Optional[str] = None  # by=lor
+    BEZ: Optional[str] = None  # by=district
+    count: int  # grid cells or streets of the group
+    # further properties <pollutant>_<stat>, e.g. no2_mean: List[Optional[float]], one value per forecast value
+
+
+class AggregateResponse(BaseModel):
+    source: str
+    by: str
+    forecast_range_iso8601: Optional[str] = None
+    groups: List[Group]
@@ -0,0 +1,19 @@
+"""Response model for the changes of the paged endpoints."""
+
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+
+class Feature(BaseModel):
+    type: str = "Feature"
+    geometry: Optional[Dict[str, Any]]  # null if the geometries are not requested
+    properties: Dict[str, Any]  # the properties of the endpoint, e.g. see GridResponse
+
+
+class ChangesResponse(BaseModel):
+    type: str = "FeatureCollection"
+    version: int  # current version, pass it as since to get the next changes
+    since: int  # version of the log the changes are relative to, the newest one not newer than the requested
+    removed: List[Union[int, str]]  # ids of the removed features
+    features: List[Feature]  # new and changed features
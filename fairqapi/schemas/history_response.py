@@ -0,0 +1,18 @@
+"""Response model for history endpoint."""
+
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Extra
+
+
+class Run(BaseModel, extra=Extra.allow):
+    run_time: Union[str, int]  # newest date_time_forecast of the run
+    date_time_forecast_iso8601: Optional[str] = None
+    forecast_range_iso8601: Optional[str] = None
+    # further properties: the forecasts of the feature, e.g. no2: List[float] or no2_30 for the simulation
+
+
+class HistoryResponse(BaseModel):
+    dataset: str
+    id: Union[int, str]
+    runs: List[Run]  # the oldest first
@@ -0,0 +1,29 @@
+"""Response model for lookup endpoint."""
+
+from typing import Optional
+
+from pydantic import BaseModel
+
+from fairqapi.schemas import grid_response, lor_response, stations_response, streets_response
+
+
+class NearestGridCell(BaseModel):
+    distance: float
+    feature: grid_response.Feature
+
+
+class NearestStreet(BaseModel):
+    distance: float
+    feature: streets_response.Feature
+
+
+class NearestStation(BaseModel):
+    distance: float
+    feature: stations_response.Feature
+
+
+class LookupResponse(BaseModel):
+    lor: Optional[lor_response.Feature]
+    grid: Optional[NearestGridCell]
+    streets: Optional[NearestStreet]
+    stations: Optional[NearestStation]
@@ -1,10 +1,272 @@
-"""Request model for streets & grid endpoints."""
-from fastapi import Query
-from pydantic import BaseModel
+"""Request models for the paged endpoints, their changes, the other endpoints and conditional requests."""
+from fastapi import Header, Query
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError, validator
+from pydantic.error_wrappers import ErrorWrapper
 
+from fairqapi.cache.aggregation import AGGREGATION_GROUPS, AGGREGATION_SOURCES, STATS_PATTERN
+from fairqapi.cache.cursor import Cursor
+from fairqapi.cache.simplification import SIMPLIFICATION_LEVELS, level_for_zoom
+from fairqapi.tiles.projection import MAX_ZOOM
 
-class Request(BaseModel):
-    """Request class for grid and streets endpoints"""
+NUMBER_PATTERN = r"-?\d+(\.\d+)?"
+BBOX_PATTERN = r"^{number}(,{number}){{3}}$".format(number=NUMBER_PATTERN)
+POLLUTANT_PATTERN = r"(no2|pm10|pm2\.5)"
+POLLUTANTS_PATTERN = r"^{pollutant}(,{pollutant})*$".format(pollutant=POLLUTANT_PATTERN)
+HOURS_PATTERN = r"^\d{1,4}(-\d{1,4})?$"
+FIELDS_PATTERN = r"^[\w.]+(,[\w.]+)*$"
+FORMAT_PATTERN = r"^(geojson|arrow|msgpack|fgb)$"
+# projected bounds of EPSG:25833 (ETRS89 / UTM zone 33N), rounded outwards
+EASTING_BOUNDS = (0, 1_000_000)
+NORTHING_BOUNDS = (0, 10_000_000)
 
-    skip: int = Query(default=0, ge=0, le=400000)
+
+class ForecastRequest(BaseModel):
+    """Base class of the requests selecting pollutants and forecast values"""
+
+    pollutants: str | None = Query(
+        default=None,
+        regex=POLLUTANTS_PATTERN,
+        description="Pollutants whose forecasts are returned, e.g. 'no2' or 'no2,pm2.5'. All pollutants by default.",
+    )
+    hours: str | None = Query(
+        default=None,
+        regex=HOURS_PATTERN,
+        description=(
+            "Forecast values 'first-last' (inclusive) or 'first' counted from the first prediction, e.g. '0-6'."
+        ),
+    )
+
+    def __init__(self, **query_parameters):
+        # fastapi answers invalid query parameters with 422, but errors of the models built from them with 500
+        try:
+            super().__init__(**query_parameters)
+        except ValidationError as error:
+            raise RequestValidationError(
+                [ErrorWrapper(wrapper.exc, loc=("query", *wrapper.loc_tuple())) for wrapper in error.raw_errors],
+            )
+
+    @validator("hours")
+    def first_hour_not_after_last(cls, hours: str | None) -> str | None:
+        """the first forecast value must not come after the last one"""
+        first, _, last = (hours or "").partition("-")
+        if last and int(first) > int(last):
+            raise ValueError("The first hour must not be after the last hour.")
+        return hours
+
+    @property
+    def pollutant_list(self) -> list[str] | None:
+        """The selected pollutants."""
+        if self.pollutants is None:
+            return None
+        return self.pollutants.split(",")
+
+    @property
+    def hour_range(self) -> tuple[int, int] | None:
+        """The selected forecast values as (first, last)."""
+        if self.hours is None:
+            return None
+        first, _, last = self.hours.partition("-")
+        return int(first), int(last or first)
+
+
+class PropertyRequest(ForecastRequest):
+    """Base class of the requests selecting properties, pollutants and forecast values"""
+
+    fields: str | None = Query(
+        default=None,
+        regex=FIELDS_PATTERN,
+        description="Properties to return, e.g. 'no2,date_time_forecast_iso8601'. The id is always returned.",
+    )
+
+    @property
+    def field_list(self) -> list[str] | None:
+        """The selected properties."""
+        if self.fields is None:
+            return None
+        return self.fields.split(",")
+
+
+class Request(PropertyRequest):
+    """Request class for the paged endpoints (grid, streets, lor and simulation)"""
+
+    skip: int = Query(default=0, ge=0, le=400000, description="Number of features to skip (after the cursor).")
     limit: int = Query(default=1000, ge=10, le=400000)
+    bbox: str | None = Query(
+        default=None,
+        regex=BBOX_PATTERN,
+        description=(
+            "Bounding box 'minx,miny,maxx,maxy' in EPSG:25833. Only features whose envelope intersects it are returned."
+        ),
+    )
+    cursor: Cursor | None = Query(
+        default=None,
+        description=(
+            "Cursor 'next' of the previous page. Pages follow each other by id, also if the data is updated in between."
+        ),
+    )
+    hours: str | None = Query(
+        default=None,
+        regex=HOURS_PATTERN,
+        description=(
+            "Forecast values 'first-last' (inclusive) or 'first' counted from the first prediction, e.g. '0-6'. "
+            "Values are hourly for grid and streets and daily for lor and simulation. The forecast range is adapted."
+        ),
+    )
+    geometry: bool = Query(
+        default=True, description="Return the geometries, if false the geometry of every feature is null.",
+    )
+    format: str | None = Query(
+        default=None,
+        regex=FORMAT_PATTERN,
+        description=(
+            "Output format: 'geojson' (default), 'arrow' (Arrow IPC stream), 'msgpack' (MessagePack) "
+            "or 'fgb' (FlatGeobuf). Takes precedence over the Accept header."
+        ),
+    )
+    simplify: int | None = Query(
+        default=None,
+        ge=0,
+        le=max(SIMPLIFICATION_LEVELS),
+        description=(
+            "Simplification level of the line and polygon geometries, 0 (default) for the full geometries. "
+            "The levels {} simplify with a tolerance of {} metres. Takes precedence over zoom.".format(
+                ", ".join(map(str, SIMPLIFICATION_LEVELS)),
+                ", ".join(str(tolerance) for tolerance, _ in SIMPLIFICATION_LEVELS.values()),
+            )
+        ),
+    )
+    level: float | None = Query(
+        default=None,
+        ge=0,
+        le=100,
+        description=(
+            "Traffic reduction level in percent (simulation only). Returns the forecasts <pollutant>_<level> of "
+            "this level instead of all levels, levels between the simulated ones (0, 10, ..., 100) are "
+            "interpolated linearly."
+        ),
+    )
+    zoom: int | None = Query(
+        default=None,
+        ge=0,
+        le=MAX_ZOOM,
+        description="Zoom level of the map showing the features, picks the simplification level of a pixel's size.",
+    )
+
+    @property
+    def bbox_bounds(self) -> tuple[float, float, float, float] | None:
+        """The bounding box as (minx, miny, maxx, maxy)."""
+        if self.bbox is None:
+            return None
+        return tuple(float(bound) for bound in self.bbox.split(","))
+
+    @property
+    def simplification_level(self) -> int:
+        """The simplification level of the geometries, chosen by simplify or zoom."""
+        if self.simplify is not None:
+            return self.simplify
+        if self.zoom is not None:
+            return level_for_zoom(self.zoom)
+        return 0
+
+
+class ChangesRequest(PropertyRequest):
+    """Request class for the changes of the paged endpoints"""
+
+    since: int = Query(
+        ...,
+        ge=0,
+        description=(
+            "Version the client knows ('version' of the previous changes). Returns the features that changed or "
+            "were removed since then, 410 if the changes are not kept anymore, e.g. since=0."
+        ),
+    )
+    geometry: bool = Query(default=True, description="Return the geometries.")
+
+
+class TileRequest(BaseModel):
+    """Request class for the tile endpoint"""
+
+    hour: int = Query(
+        default=0,
+        ge=0,
+        le=9999,
+        description=(
+            "Forecast value carried by the features, counted from the first prediction "
+            "(hours for streets and grid, days for lor and simulation)."
+        ),
+    )
+
+
+class LookupRequest(BaseModel):
+    """Request class for lookup endpoint"""
+
+    x: float = Query(
+        ...,
+        ge=EASTING_BOUNDS[0],
+        le=EASTING_BOUNDS[1],
+        description="x coordinate (easting) in EPSG:25833, e.g. 392000 in Berlin",
+    )
+    y: float = Query(
+        ...,
+        ge=NORTHING_BOUNDS[0],
+        le=NORTHING_BOUNDS[1],
+        description="y coordinate (northing) in EPSG:25833, e.g. 5820000 in Berlin",
+    )
+
+
+class AggregateRequest(ForecastRequest):
+    """Request class for the aggregate endpoint"""
+
+    source: str = Query(
+        default="grid",
+        regex="^({})$".format("|".join(AGGREGATION_SOURCES)),
+        description="Features whose forecasts are aggregated: 'grid' (by cell centre) or 'streets' (by midpoint).",
+    )
+    by: str = Query(
+        default="lor",
+        regex="^({})$".format("|".join(AGGREGATION_GROUPS)),
+        description="Groups: 'lor' (PLR_ID) or 'district' (BEZ, the first two digits of the PLR_ID).",
+    )
+    stat: str = Query(
+        default="mean",
+        regex=STATS_PATTERN,
+        description="Statistics of every group and forecast value, e.g. 'mean,max,p95'. Percentiles are p0 to p99.",
+    )
+    pollutants: str | None = Query(
+        default=None,
+        regex=POLLUTANTS_PATTERN,
+        description="Pollutants whose forecasts are aggregated, e.g. 'no2'. All pollutants by default.",
+    )
+
+    @property
+    def stat_list(self) -> list[str]:
+        """The distinct statistics in order."""
+        return list(dict.fromkeys(self.stat.split(",")))
+
+
+class HistoryRequest(ForecastRequest):
+    """Request class for the history endpoint"""
+
+    runs: int | None = Query(
+        default=None, ge=1, le=1000, description="Number of the newest runs. All kept runs by default.",
+    )
+    hours: str | None = Query(
+        default=None,
+        regex=HOURS_PATTERN,
+        description="Forecast values 'first-last' (inclusive) or 'first' counted from the first prediction of a run.",
+    )
+
+
+class ConditionalHeaders():
+    """Request headers for the output format, compressed and conditional responses"""
+
+    def __init__(
+        self,
+        accept: str | None = Header(default=None),
+        accept_encoding: str | None = Header(default=None),
+        if_none_match: str | None = Header(default=None),
+    ):
+        self.accept = accept
+        self.accept_encoding = accept_encoding
+        self.if_none_match = if_none_match
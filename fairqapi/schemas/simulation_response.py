@@ -1,7 +1,7 @@
 """Response model for simulation endpoint."""
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -14,48 +14,49 @@ class Geometry(BaseModel):
 
 class Properties(BaseModel):
     element_nr: str
-    date_time_forecast_iso8601: datetime
-    forecast_range_iso8601: str
-    no2_0: List[float]
-    no2_10: List[float]
-    no2_20: List[float]
-    no2_30: List[float]
-    no2_40: List[float]
-    no2_50: List[float]
-    no2_60: List[float]
-    no2_70: List[float]
-    no2_80: List[float]
-    no2_90: List[float]
-    no2_100: List[float]
-    pm10_0: List[float]
-    pm10_10: List[float]
-    pm10_20: List[float]
-    pm10_30: List[float]
-    pm10_40: List[float]
-    pm10_50: List[float]
-    pm10_60: List[float]
-    pm10_70: List[float]
-    pm10_80: List[float]
-    pm10_90: List[float]
-    pm10_100: List[float]
-    pm25_0: List[float] = Field(..., alias="pm2.5_0")
-    pm25_10: List[float] = Field(..., alias="pm2.5_10")
-    pm25_20: List[float] = Field(..., alias="pm2.5_20")
-    pm25_30: List[float] = Field(..., alias="pm2.5_30")
-    pm25_40: List[float] = Field(..., alias="pm2.5_40")
-    pm25_50: List[float] = Field(..., alias="pm2.5_50")
-    pm25_60: List[float] = Field(..., alias="pm2.5_60")
-    pm25_70: List[float] = Field(..., alias="pm2.5_70")
-    pm25_80: List[float] = Field(..., alias="pm2.5_80")
-    pm25_90: List[float] = Field(..., alias="pm2.5_90")
-    pm25_100: List[float] = Field(..., alias="pm2.5_100")
+    date_time_forecast_iso8601: Optional[datetime] = None
+    forecast_range_iso8601: Optional[str] = None
+    no2_0: Optional[List[float]] = None
+    no2_10: Optional[List[float]] = None
+    no2_20: Optional[List[float]] = None
+    no2_30: Optional[List[float]] = None
+    no2_40: Optional[List[float]] = None
+    no2_50: Optional[List[float]] = None
+    no2_60: Optional[List[float]] = None
+    no2_70: Optional[List[float]] = None
+    no2_80: Optional[List[float]] = None
+    no2_90: Optional[List[float]] = None
+    no2_100: Optional[List[float]] = None
+    pm10_0: Optional[List[float]] = None
+    pm10_10: Optional[List[float]] = None
+    pm10_20: Optional[List[float]] = None
+    pm10_30: Optional[List[float]] = None
+    pm10_40: Optional[List[float]] = None
+    pm10_50: Optional[List[float]] = None
+    pm10_60: Optional[List[float]] = None
+    pm10_70: Optional[List[float]] = None
+    pm10_80: Optional[List[float]] = None
+    pm10_90: Optional[List[float]] = None
+    pm10_100: Optional[List[float]] = None
+    pm25_0: Optional[List[float]] = Field(None, alias="pm2.5_0")
+    pm25_10: Optional[List[float]] = Field(None, alias="pm2.5_10")
+    pm25_20: Optional[List[float]] = Field(None, alias="pm2.5_20")
+    pm25_30: Optional[List[float]] = Field(None, alias="pm2.5_30")
+    pm25_40: Optional[List[float]] = Field(None, alias="pm2.5_40")
+    pm25_50: Optional[List[float]] = Field(None, alias="pm2.5_50")
+    pm25_60: Optional[List[float]] = Field(None, alias="pm2.5_60")
+    pm25_70: Optional[List[float]] = Field(None, alias="pm2.5_70")
+    pm25_80: Optional[List[float]] = Field(None, alias="pm2.5_80")
+    pm25_90: Optional[List[float]] = Field(None, alias="pm2.5_90")
+    pm25_100: Optional[List[float]] = Field(None, alias="pm2.5_100")
 
 class Feature(BaseModel):
     type: str = "Feature"
-    geometry: Geometry
+    geometry: Optional[Geometry]  # null if the geometries are not requested
     properties: Properties
 
 
 class SimulationResponse(BaseModel):
     type: str = "FeatureCollection"
     features: List[Feature]
+    next: Optional[str] = None  # cursor of the next page, only if there are further features
@@ -1,7 +1,7 @@
 """Response model for streets endpoint."""
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -14,19 +14,20 @@ class Geometry(BaseModel):
 
 class Properties(BaseModel):
     element_nr: str
-    date_time_forecast_iso8601: datetime
-    forecast_range_iso8601: str  # weiter eingrenzbar?
-    no2: List[float]
-    pm10: List[float]
-    pm2_5: List[float] = Field(..., alias="pm2.5")
+    date_time_forecast_iso8601: Optional[datetime] = None
+    forecast_range_iso8601: Optional[str] = None  # weiter eingrenzbar?
+    no2: Optional[List[float]] = None
+    pm10: Optional[List[float]] = None
+    pm2_5: Optional[List[float]] = Field(None, alias="pm2.5")
 
 
 class Feature(BaseModel):
     type: str = "Feature"
-    geometry: Geometry
+    geometry: Optional[Geometry]  # null if the geometries are not requested
     properties: Properties
 
 
 class StreetsResponse(BaseModel):
     type: str = "FeatureCollection"
     features: List[Feature]
+    next: Optional[str] = None  # cursor of the next page, only if there are further features
@@ -0,0 +1,200 @@
+"""
+Multi-worker entry point of the API: python -m fairqapi.serve --host 0.0.0.0 --port 8000 --workers 4
+
+A supervisor process loads the cache, binds the socket and forks the uvicorn
+workers afterwards, so the workers share the loaded cache (memory mapped cache
+files and copy-on-write pages of everything built on load) instead of loading
+their own copy. The supervisor checks the cache files every minute. If they
+changed it loads them once, forks a new generation of workers and lets the
+previous workers finish their requests and exit. The metrics of all workers
+are aggregated with the multiprocess mode of prometheus_client.
+
+Every worker fills its own response and tile cache, RESPONSE_CACHE_MAX_BYTES
+(default 256 MiB) and TILE_CACHE_MAX_BYTES (default 64 MiB) are the budgets
+of all workers together and split evenly between them.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+
+RELOAD_INTERVAL = 60
+# total byte budgets of the caches every worker fills on its own, with their defaults
+CACHE_BUDGETS = {"RESPONSE_CACHE_MAX_BYTES": 256 * 1024 ** 2, "TILE_CACHE_MAX_BYTES": 64 * 1024 ** 2}
+
+
+def prepare_metrics_dir():
+    """
+    Enable the multiprocess mode of prometheus_client. This has to happen before
+    prometheus_client is imported, i.e. before the app is imported.
+    """
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="fairqapi-metrics-")
+    os.makedirs(metrics_dir, exist_ok=True)
+    for filename in os.listdir(metrics_dir):
+        os.remove(os.path.join(metrics_dir, filename))
+
+    # starlette_prometheus only checks the lower case name
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    os.environ["prometheus_multiproc_dir"] = metrics_dir
+
+
+def split_cache_budgets(n_workers: int):
+    """
+    Split the total budgets of the response and tile cache between the workers.
+    This has to happen before the caches are imported, i.e. before the app is imported.
+
+    :param int n_workers: number of worker processes
+    """
+    for name, default in CACHE_BUDGETS.items():
+        total = int(os.environ.get(name, default))
+        os.environ[name] = str(max(total // n_workers, 1))
+
+
+class Supervisor():
+    """
+    This class forks the uvicorn workers of the API, restarts crashed ones
+    and replaces all of them after the cache was reloaded.
+    """
+
+    def __init__(self, app, cache, sock: socket.socket, n_workers: int, reload_interval: float = RELOAD_INTERVAL):
+        """
+        :param app: the fastAPI app
+        :param Cache cache: the cache used by the app, loaded by the supervisor only
+        :param socket.socket sock: bound socket the workers accept connections on
+        :param int n_workers: number of worker processes
+        :param float reload_interval: seconds between checks of the cache files
+        """
+        self.app = app
+        self.cache = cache
+        self.sock = sock
+        self.n_workers = n_workers
+        self.reload_interval = reload_interval
+        self.workers = set()
+        self.retiring_workers = set()
+        self.running = True
+
+        cache.reload_periodically = False
+
+    def run(self):
+        """serve until SIGTERM or SIGINT, then stop all workers"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.spawn_workers(self.n_workers)
+        next_reload = time.monotonic() + self.reload_interval
+        while self.running:
+            time.sleep(0.5)
+            self.reap_workers()
+            if time.monotonic() >= next_reload:
+                self.reload()
+                next_reload = time.monotonic() + self.reload_interval
+
+        for pid in self.workers | self.retiring_workers:
+            os.kill(pid, signal.SIGTERM)
+        while self.workers or self.retiring_workers:
+            self.reap_workers(block=True)
+
+    def stop(self, signum, frame):
+        logging.info("Stopping workers")
+        self.running = False
+
+    def spawn_workers(self, n_workers: int):
+        """fork n_workers uvicorn workers sharing the memory of the supervisor"""
+        # objects allocated so far are never collected, so collections in the workers
+        # do not write to (and copy) the pages holding them. The objects frozen for the
+        # previous workers are unfrozen first, so the garbage of replaced snapshots is collected
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        for _ in range(n_workers):
+            pid = os.fork()
+            if pid == 0:
+                self.run_worker()
+            self.workers.add(pid)
+        logging.info(f"Started workers {sorted(self.workers)}")
+
+    def run_worker(self):
+        """serve the app in a forked worker, never returns"""
+        import uvicorn  # noqa: WPS433 (only needed in the workers)
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            uvicorn.Server(uvicorn.Config(self.app, log_config=None)).run(sockets=[self.sock])
+        except BaseException:
+            logging.exception("Worker failed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def reap_workers(self, block: bool = False):
+        """collect exited workers, crashed workers of the current generation are replaced"""
+        from prometheus_client import multiprocess  # noqa: WPS433 (imported after prepare_metrics_dir)
+
+        while self.workers or self.retiring_workers:
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            multiprocess.mark_process_dead(pid)
+            self.retiring_workers.discard(pid)
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if self.running:
+                    logging.warning(f"Worker {pid} exited unexpectedly, starting a new one")
+                    self.spawn_workers(1)
+            if block:
+                return
+
+    def reload(self):
+        """load modified cache files and replace the workers by workers sharing the new cache"""
+        if not self.cache.updates_available():
+            return
+
+        try:
+            self.cache.load_cache_files()
+        except Exception:
+            logging.exception("Something went wrong when loading cache files, keeping the workers")
+            return
+
+        self.retiring_workers |= self.workers
+        self.workers = set()
+        self.spawn_workers(self.n_workers)
+        # uvicorn finishes the requests in progress before it exits
+        for pid in self.retiring_workers:
+            os.kill(pid, signal.SIGTERM)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the fairq API with several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    args = parser.parse_args()
+
+    prepare_metrics_dir()
+    split_cache_budgets(args.workers)
+    # importing the app loads the cache
+    from fairqapi.cache.cache import cache  # noqa: WPS433
+    from fairqapi.main import app  # noqa: WPS433
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logging.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+
+    Supervisor(app, cache, sock, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
 """Integration testing for fairqapi: performance."""
 
+import asyncio
+import gzip
 import logging
+import time
+import tracemalloc
 
+import httpx
+import numpy as np
+import pandas as pd
 from fastapi.testclient import TestClient
 from numpy import average
 
+from fairqapi.cache.cache import cache
+from fairqapi.cache.cache_updater import CacheUpdater
+from fairqapi.formats.negotiation import available_formats, encode_page
+from fairqapi.internal.data_utils import get_property_cols, transform_raw_data
 from fairqapi.internal.stopwatch import Stopwatch
 from fairqapi.main import app
 
@@ -89,6 +100,255 @@ def test_simulation_performance() -> None:
     assert_timings(endpoint, logged_time, target_time)
 
 
+def test_reload_performance(monkeypatch) -> None:
+    """Test that requests are answered without delay while all cache files are reloaded."""
+    # arrange
+    target_time = 0.1
+    endpoint = "grid?limit=10"
+    monkeypatch.setattr(cache, "update_needed", lambda filename: True)
+    old_snapshot = cache.snapshot
+
+    # act
+    logged_time = asyncio.run(ping_endpoint_during_reload(endpoint))
+
+    # assert
+    assert cache.snapshot is not old_snapshot
+    assert cache.cache_is_loaded()
+    # a reload blocking the event loop would only let one request through
+    assert len(logged_time) > 1
+    assert max(logged_time) < target_time
+
+
+def test_transform_raw_data_performance() -> None:
+    """Benchmark runtime and peak memory of the reference transform_raw_data on 500k simulated streets."""
+    # arrange
+    target_time = 3
+    target_memory_mib = 100
+    n_rows = 500_000
+
+    df_raw = get_raw_streets_df(n_rows)
+
+    # act
+    start = time.perf_counter()
+    transform_raw_data(df_raw, endpoint="streets", forecast_interval_in_hours=1)
+    elapsed_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        transform_raw_data(df_raw, endpoint="streets", forecast_interval_in_hours=1)
+        peak_memory_mib = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+    # assert
+    logging.info(
+        f"Transforming {n_rows} rows took {elapsed_time:.2f} seconds and {peak_memory_mib:.0f} MiB at peak.",
+    )
+    assert elapsed_time < target_time
+    assert peak_memory_mib < target_memory_mib
+
+
+def test_query_feature_store_performance(monkeypatch) -> None:
+    """Benchmark runtime and peak memory of storing 500k queried streets rows, streamed in blocks, in columns."""
+    # arrange
+    target_time = 30
+    # the forecasts of the result take 275 MiB as float64, one sorted column (92 MiB) and one block of python rows
+    # come on top
+    target_memory_mib = 520
+    n_rows = 500_000
+    block_rows = 10_000
+    updater = CacheUpdater()
+    monkeypatch.setattr(
+        updater,
+        "query_blocks",
+        lambda task, query, params=None: (
+            get_streets_block(block_start, block_rows) for block_start in range(0, n_rows, block_rows)
+        ),
+    )
+
+    # act
+    start = time.perf_counter()
+    updater.query_feature_store("streets", "", None, expected_rows=n_rows)
+    elapsed_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        updater.query_feature_store("streets", "", None, expected_rows=n_rows)
+        peak_memory_mib = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+    # assert
+    logging.info(
+        f"Storing {n_rows} rows took {elapsed_time:.2f} seconds and {peak_memory_mib:.0f} MiB at peak.",
+    )
+    assert elapsed_time < target_time
+    assert peak_memory_mib < target_memory_mib
+
+
+def test_streaming_memory_performance() -> None:
+    """Test that the memory of a streamed page does not grow with the number of features."""
+    # arrange
+    streets = cache.snapshot.streets
+    peak_memory = []
+
+    # act
+    for limit in [300, 1200]:
+        rows, next_cursor = streets.page_rows(limit=limit)
+        tracemalloc.start()
+        try:
+            for _ in streets.iter_page(rows, next_cursor, features_per_chunk=100):
+                pass
+            peak_memory.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    # assert
+    logging.info(f"Streaming 300 and 1200 streets took {peak_memory[0]} and {peak_memory[1]} bytes at peak.")
+    assert peak_memory[1] < 1.5 * peak_memory[0]
+
+
+def test_binary_formats_performance() -> None:
+    """Benchmark encoding time and payload size of all streets in the binary formats against geojson."""
+    # arrange
+    streets = cache.snapshot.streets
+    page = streets.take(np.arange(len(streets)))
+    formats = [output_format for output_format in available_formats() if output_format != "geojson"]
+
+    # act
+    start = time.perf_counter()
+    geojson_size = len(gzip.compress(streets.page(), compresslevel=6))
+    geojson_time = time.perf_counter() - start
+    timings = {}
+    for output_format in formats:
+        start = time.perf_counter()
+        size = len(gzip.compress(encode_page(output_format, page, name="streets"), compresslevel=6))
+        timings[output_format] = (time.perf_counter() - start, size)
+
+    # assert
+    for output_format, (elapsed_time, size) in timings.items():
+        logging.info(
+            f"Encoding {len(streets)} streets as {output_format} took {elapsed_time:.3f} seconds and "
+            f"{size} bytes gzip compressed, geojson {geojson_time:.3f} seconds and {geojson_size} bytes.",
+        )
+    for output_format in {"arrow", "msgpack"}.intersection(timings):
+        assert timings[output_format][0] < geojson_time
+
+
+def test_lor_simplified_performance() -> None:
+    """Test lor endpoint performance with the simplified geometries of an overview map."""
+    # arrange
+    target_time = 3
+    endpoint = "lor?zoom=10"
+
+    # act
+    logged_time = ping_endpoint(endpoint, 3)
+
+    # assert
+    assert_timings(endpoint, logged_time, target_time)
+
+
+def test_tiles_performance() -> None:
+    """Test tiles endpoint performance, tiles that are not pre-rendered included."""
+    # arrange
+    target_time = 0.5
+    endpoint = "tiles/grid/15/17601/10749?hour=1"
+
+    # act
+    logged_time = ping_endpoint(endpoint, 3)
+
+    # assert
+    assert_timings(endpoint, logged_time, target_time)
+
+
+def test_aggregate_performance() -> None:
+    """Test aggregate endpoint performance with percentiles of the grid cells of every LOR."""
+    # arrange
+    target_time = 1
+    endpoint = "aggregate?source=grid&by=lor&stat=mean,max,p95"
+
+    # act
+    logged_time = ping_endpoint(endpoint, 3)
+
+    # assert
+    assert_timings(endpoint, logged_time, target_time)
+
+
+def test_history_performance() -> None:
+    """Test history endpoint performance."""
+    # arrange
+    target_time = 0.5
+    endpoint = "history/streets/{}".format(cache.snapshot.streets.ids[-1])
+
+    # act
+    logged_time = ping_endpoint(endpoint, 3)
+
+    # assert
+    assert_timings(endpoint, logged_time, target_time)
+
+
+def test_changes_performance() -> None:
+    """Test performance of the changes of the streets since the oldest kept version."""
+    # arrange
+    target_time = 3
+    endpoint = "streets/changes?since={}".format(cache.snapshot.change_logs["streets"].first_version)
+
+    # act
+    logged_time = ping_endpoint(endpoint, 3)
+
+    # assert
+    assert_timings(endpoint, logged_time, target_time)
+
+
+def get_raw_streets_df(n_rows: int) -> pd.DataFrame:
+    """Simulate raw streets forecasts of one forecast run, the rows share their forecast lists."""
+    rng = np.random.default_rng(0)
+    computed_at = pd.Timestamp("2022-10-30 13:00")
+    forecast = [40.5] * 80
+    return pd.DataFrame(
+        {
+            "element_nr": np.array(["{}_{}.01".format(idx, idx + 1) for idx in rng.permutation(n_rows)], dtype=object),
+            "date_time_forecast": computed_at + pd.to_timedelta(rng.integers(0, 4, n_rows) * 13, "min"),
+            "first_pred_date_time": pd.Series([computed_at + pd.Timedelta(hours=1)] * n_rows),
+            "last_pred_date_time": pd.Series([computed_at + pd.Timedelta(hours=80)] * n_rows),
+            "no2": [forecast] * n_rows,
+            "pm10": [forecast] * n_rows,
+            "pm25": [forecast] * n_rows,
+        }
+    )
+
+
+def get_streets_block(start: int, n_rows: int) -> pd.DataFrame:
+    """Simulate a block of streets forecasts as the forecast query returns them, every row with its own lists."""
+    rng = np.random.default_rng(start)
+    properties = get_property_cols("streets")
+    block = {
+        "element_nr": ["{}_{}.01".format(idx, idx + 1) for idx in range(start, start + n_rows)],
+        properties[1]: [
+            "2022-10-30T13:{:02d}:00.000000Z".format(minute) for minute in rng.integers(0, 4, n_rows) * 13
+        ],
+        properties[2]: ["R24/2022-10-30T14:00:00.000000Z/PT1H"] * n_rows,
+    }
+    for pollutant in properties[3:]:
+        block[pollutant] = rng.uniform(0, 80, (n_rows, 24)).round(1).tolist()
+    return pd.DataFrame(block)
+
+
+async def ping_endpoint_during_reload(endpoint: str):
+    """Ping endpoint until a reload of all cache files is done and measure how long each request takes."""
+    logged_time = []
+    async with httpx.AsyncClient(app=app, base_url="http://test") as async_client:
+        await async_client.get(endpoint)
+        reload = asyncio.create_task(cache.reload())
+        while not reload.done():
+            start = time.perf_counter()
+            response = await async_client.get(endpoint)
+            assert response.status_code == 200
+            logged_time.append(time.perf_counter() - start)
+        await reload
+    return logged_time
+
+
 def ping_endpoint(endpoint: str, times: int):
     """Ping endpoint repeatedly (n = times) and measure how long it takes (logged_time) to respond."""
     logged_time = []
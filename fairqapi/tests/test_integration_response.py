@@ -1,7 +1,13 @@
 """Integration testing for fairqapi: responses."""
 
+import numpy as np
+import pytest
 from fastapi.testclient import TestClient
 
+from fairqapi.cache import response_cache
+from fairqapi.cache.cache import cache
+from fairqapi.cache.forecast_history import forecast_history
+from fairqapi.formats.negotiation import available_formats, media_type
 from fairqapi.main import app
 
 client = TestClient(app)
@@ -97,3 +103,435 @@ def test_simulation_response_limit():
     assert response.status_code == 200
     assert response.encoding == "utf-8"
     assert len(response.json()["features"]) == 10
+
+
+def test_grid_response_bbox():
+    """Test grid endpoint response with bounding box."""
+    # arrange
+    minx, miny, maxx, maxy = 390000, 5815000, 391000, 5816000
+
+    # act
+    response = client.get(f"grid?bbox={minx},{miny},{maxx},{maxy}")
+
+    # assert
+    assert response.status_code == 200
+    for feature in response.json()["features"]:
+        x, y = feature["geometry"]["coordinates"]
+        assert minx <= x <= maxx and miny <= y <= maxy
+
+
+def test_streets_response_cursor():
+    """Test that streets pages linked by their next cursor contain every street once."""
+    # act
+    ids = []
+    response = client.get("streets?limit=5000")
+    while True:
+        assert response.status_code == 200
+        ids.extend(feature["properties"]["element_nr"] for feature in response.json()["features"])
+        if "next" not in response.json():
+            break
+        response = client.get("streets?limit=5000&cursor={}".format(response.json()["next"]))
+
+    # assert
+    assert len(ids) == len(client.get("streets?limit=400000").json()["features"])
+    assert ids == sorted(set(ids))
+
+
+def test_grid_response_selection():
+    """Test that selecting one pollutant for a few hours without geometries shrinks the grid response."""
+    # act
+    response_all = client.get("grid?limit=1000")
+    response = client.get("grid?limit=1000&pollutants=no2&hours=0-5&geometry=false")
+
+    # assert
+    assert response.status_code == 200
+    feature = response.json()["features"][0]
+    assert feature["geometry"] is None
+    assert list(feature["properties"]) == ["id", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2"]
+    assert len(feature["properties"]["no2"]) == 6
+    assert len(response.content) * 5 < len(response_all.content)
+
+
+def test_grid_response_selection_invalid():
+    """Test grid endpoint response with unknown properties and a reversed hour range."""
+    # act & assert
+    assert client.get("grid?fields=co2").status_code == 422
+    assert client.get("grid?hours=6-0").json()["detail"][0]["loc"] == ["query", "hours"]
+    assert client.get("grid?pollutants=co2").status_code == 422
+
+
+def test_streets_response_streamed(monkeypatch):
+    """Test that a streamed streets page is the page encoded at once."""
+    # arrange
+    monkeypatch.setattr(response_cache, "STREAMING_MIN_FEATURES", 100)
+    expected = cache.snapshot.streets.page(skip=10, limit=1000)
+
+    # act
+    response = client.get("streets?skip=10&limit=1000", headers={"Accept-Encoding": "gzip"})
+    response_identity = client.get("streets?skip=10&limit=1000", headers={"Accept-Encoding": "identity"})
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert response.content == expected
+    assert response_identity.content == expected
+
+
+def test_grid_response_cursor_invalid():
+    """Test grid endpoint response with a malformed cursor and a cursor of another endpoint."""
+    # act
+    response = client.get("grid?cursor=abc")
+    response_other_endpoint = client.get("grid?cursor={}".format(client.get("streets?limit=10").json()["next"]))
+
+    # assert
+    assert response.status_code == 422
+    assert response_other_endpoint.status_code == 422
+
+
+def test_streets_response_formats():
+    """Test that the streets page is served in the format asked for by query parameter or Accept header."""
+    # arrange
+    msgpack = pytest.importorskip("msgpack")
+
+    # act
+    response_json = client.get("streets?limit=20", headers={"Accept": "*/*"})
+    response = client.get("streets?limit=20", headers={"Accept": "application/msgpack"})
+    response_format = client.get("streets?limit=20&format=msgpack", headers={"Accept": "application/json"})
+    response_fgb = client.get("streets?limit=20&format=fgb")
+
+    # assert
+    assert response_json.headers["Content-Type"] == "application/json"
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/msgpack"
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+    assert response.headers["ETag"] != response_json.headers["ETag"]
+    assert response.content == response_format.content
+    table = msgpack.unpackb(response.content)
+    assert table["columns"]["element_nr"] == [
+        feature["properties"]["element_nr"] for feature in response_json.json()["features"]
+    ]
+    assert table["next"] == response_json.json()["next"]
+    assert response_fgb.headers["Content-Type"] == "application/flatgeobuf"
+    assert client.get("streets?format=csv").status_code == 422
+
+
+def test_grid_response_arrow():
+    """Test that a grid selection is served as Arrow IPC stream."""
+    # arrange
+    pyarrow = pytest.importorskip("pyarrow")
+
+    # act
+    headers = {"Accept": "application/vnd.apache.arrow.stream"}
+    response = client.get("grid?limit=10&pollutants=no2&hours=0-5", headers=headers)
+
+    # assert
+    assert response.status_code == 200
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["geometry", "id", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2"]
+    assert table.num_rows == 10
+    assert table.schema.field("no2").type == pyarrow.list_(pyarrow.float64(), 6)
+
+
+@pytest.mark.parametrize("output_format", available_formats())
+@pytest.mark.parametrize("endpoint", ["grid?hours=500-600", "streets?hours=500", "lor?hours=5-9", "simulation?hours=5-9"])
+def test_response_hours_beyond_horizon(endpoint, output_format):
+    """Test that every format serves pages whose hours are beyond the forecast horizon, without forecast values."""
+    # act
+    response = client.get("{}&limit=10&format={}".format(endpoint, output_format))
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == media_type(output_format)
+
+
+def test_simulation_response_level():
+    """Test that the simulation is served with the forecasts of one (interpolated) traffic reduction level."""
+    # act
+    response = client.get("simulation?limit=10")
+    response_level = client.get("simulation?limit=10&level=35")
+
+    # assert
+    assert response_level.status_code == 200
+    properties = response.json()["features"][0]["properties"]
+    properties_level = response_level.json()["features"][0]["properties"]
+    assert list(properties_level) == [
+        "element_nr", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2_35", "pm10_35", "pm2.5_35",
+    ]
+    np.testing.assert_allclose(properties_level["no2_35"], np.add(properties["no2_30"], properties["no2_40"]) / 2)
+    properties_simulated = client.get("simulation?limit=10&level=30").json()["features"][0]["properties"]
+    assert properties_simulated["pm10_30"] == properties["pm10_30"]
+    assert client.get("grid?level=30").status_code == 422
+
+
+def test_streets_response_simplified():
+    """Test that streets are served with the simplified geometries of a zoom level."""
+    # act
+    response = client.get("streets?limit=100")
+    response_simplified = client.get("streets?limit=100&zoom=10")
+
+    # assert
+    assert response_simplified.status_code == 200
+    features, features_simplified = response.json()["features"], response_simplified.json()["features"]
+    assert [feature["properties"] for feature in features] == [feature["properties"] for feature in features_simplified]
+    for feature, feature_simplified in zip(features, features_simplified):
+        coordinates = feature_simplified["geometry"]["coordinates"]
+        assert 2 <= len(coordinates) <= len(feature["geometry"]["coordinates"])
+        assert all(x == round(x) and y == round(y) for x, y in coordinates)
+
+
+def test_lor_response_simplify_invalid():
+    """Test lor endpoint response with unknown simplification and zoom levels."""
+    # act & assert
+    assert client.get("lor?simplify=5").status_code == 422
+    assert client.get("lor?zoom=23").status_code == 422
+
+
+def test_tiles_response():
+    """Test that the tiles endpoint serves gzip compressed vector tiles of the layers."""
+    # arrange
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+    # act
+    endpoint = "tiles/streets/12/2200/1343?hour=2"
+    response = client.get(endpoint, headers={"Accept-Encoding": "gzip"})
+    response_not_modified = client.get(endpoint, headers={"If-None-Match": response.headers["ETag"]})
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    assert response.headers["Content-Encoding"] == "gzip"
+    features = mapbox_vector_tile.decode(response.content)["streets"]["features"]
+    assert len(features) > 0
+    assert {"element_nr", "no2", "pm10", "pm2.5"}.issubset(features[0]["properties"])
+    assert response_not_modified.status_code == 304
+
+
+def test_tiles_response_invalid():
+    """Test tiles endpoint response with an unknown layer and tiles outside of the zoom level."""
+    # act & assert
+    assert client.get("tiles/stations/12/2200/1343").status_code == 422
+    assert client.get("tiles/grid/2/4/0").status_code == 422
+    assert client.get("tiles/grid/23/0/0").status_code == 422
+
+
+def test_aggregate_response():
+    """Test that the aggregate endpoint serves statistics of the grid cells of every LOR and district."""
+    # act
+    response = client.get("aggregate?source=grid&by=lor&stat=mean,max,p95&pollutants=no2&hours=0-5")
+    response_district = client.get("aggregate?source=streets&by=district&stat=min")
+
+    # assert
+    assert response.status_code == 200
+    content = response.json()
+    assert (content["source"], content["by"]) == ("grid", "lor")
+    assert content["forecast_range_iso8601"].startswith("R6/")
+    groups = content["groups"]
+    assert sum(group["count"] for group in groups) <= len(cache.snapshot.grid)
+    assert set(groups[0]) == {"PLR_ID", "count", "no2_mean", "no2_max", "no2_p95"}
+    for group in groups:
+        assert len(group["no2_mean"]) == 6
+        for mean, p95, maximum in zip(group["no2_mean"], group["no2_p95"], group["no2_max"]):
+            assert maximum is None or max(mean, p95) <= maximum
+    assert response_district.status_code == 200
+    assert all(len(group["BEZ"]) == 2 for group in response_district.json()["groups"])
+
+
+def test_aggregate_response_invalid():
+    """Test aggregate endpoint response with unknown sources, groups and statistics."""
+    # act & assert
+    assert client.get("aggregate?source=simulation").status_code == 422
+    assert client.get("aggregate?by=street").status_code == 422
+    assert client.get("aggregate?stat=mean,p100").status_code == 422
+    assert client.get("aggregate?hours=5-2").status_code == 422
+
+
+def test_history_response():
+    """Test that the history endpoint serves the forecasts of a feature in the kept forecast runs."""
+    # arrange
+    feature = client.get("grid?limit=10&pollutants=no2&hours=0-3").json()["features"][3]["properties"]
+
+    # act
+    response = client.get("history/grid/{}?pollutants=no2&hours=0-3".format(feature["id"]))
+
+    # assert
+    assert response.status_code == 200
+    content = response.json()
+    assert (content["dataset"], content["id"]) == ("grid", feature["id"])
+    newest = content["runs"][-1]
+    assert newest["forecast_range_iso8601"] == feature["forecast_range_iso8601"]
+    np.testing.assert_allclose(newest["no2"], feature["no2"], rtol=1e-6)
+    assert set(newest) == {"run_time", "date_time_forecast_iso8601", "forecast_range_iso8601", "no2"}
+
+
+def test_history_response_invalid():
+    """Test history endpoint response with unknown datasets and features."""
+    # act & assert
+    assert client.get("history/tiles/1").status_code == 422
+    assert client.get("history/grid/unknown").status_code == 404
+    assert client.get("history/grid/1?runs=0").status_code == 422
+    assert client.get("history/grid/1?hours=3-1").status_code == 422
+
+
+def test_history_after_swap(monkeypatch):
+    """Test that the runs of a reload are added to the history once its snapshot replaced the current one."""
+    # arrange
+    monkeypatch.setattr(cache, "snapshot", cache.snapshot)
+    monkeypatch.setattr(forecast_history, "runs", forecast_history.runs.copy())
+    monkeypatch.setattr(cache, "update_needed", lambda filename: filename == "grid")
+    runs = list(forecast_history.runs.values())
+
+    # act
+    snapshot = cache.build_snapshot()
+    runs_before_swap = list(forecast_history.runs.values())
+    cache.swap_snapshot(snapshot)
+
+    # assert
+    assert runs_before_swap == runs
+    assert list(snapshot.forecast_runs) == ["grid"]
+    grid_run = snapshot.forecast_runs["grid"]
+    assert forecast_history.runs[("grid", grid_run.run_time)] is grid_run
+
+
+def test_grid_changes_response(monkeypatch):
+    """Test that the changes of the grid after a reload are its changed and removed features."""
+    # arrange
+    # the snapshot and the history of this test's reload are dropped afterwards
+    monkeypatch.setattr(cache, "snapshot", cache.snapshot)
+    monkeypatch.setattr(forecast_history, "runs", forecast_history.runs.copy())
+    grid = cache.snapshot.grid
+    load_cache_file = cache.load_cache_file
+
+    def load_changed_grid(filename):
+        stored = load_cache_file(filename)
+        if filename != "grid":
+            return stored
+        # the first feature is removed, the forecasts of the next two change
+        changed = stored.take(np.arange(1, len(stored)))
+        changed.values["no2"].values[:2] += 1
+        return changed
+
+    monkeypatch.setattr(cache, "update_needed", lambda filename: filename == "grid")
+    monkeypatch.setattr(cache, "load_cache_file", load_changed_grid)
+    # the changed grid file is newer
+    file_version = cache.file_version
+    monkeypatch.setattr(cache, "file_version", lambda filename: file_version(filename) + (filename == "grid"))
+    stored = load_cache_file("grid")
+
+    # act
+    cache.load_cache_files()
+    response = client.get("grid/changes?since={}&geometry=false".format(grid.version))
+    response_current = client.get("grid/changes?since={}".format(cache.snapshot.grid.version))
+    monkeypatch.setattr(response_cache, "STREAMING_MIN_FEATURES", 2)
+    response_streamed = client.get("grid/changes?since={}&geometry=false".format(grid.version))
+
+    # assert
+    assert response.status_code == 200
+    content = response.json()
+    assert content["version"] == cache.snapshot.grid.version > grid.version
+    assert content["since"] == grid.version
+    assert content["removed"] == [stored.ids[0].item()]
+    assert sorted(feature["properties"]["id"] for feature in content["features"]) == sorted(stored.ids[1:3].tolist())
+    assert response_current.json()["features"] == []
+    assert response_current.json()["removed"] == []
+    assert "Content-Length" not in response_streamed.headers
+    assert response_streamed.content == response.content
+
+
+def test_grid_changes_response_gone():
+    """Test that the changes since a version older than the change log are gone and the other errors."""
+    # arrange
+    grid = cache.snapshot.grid
+
+    # act
+    response = client.get("grid/changes?since=0&fields=no2&hours=0")
+    response_current = client.get("grid/changes?since={}&fields=no2&hours=0".format(grid.version))
+
+    # assert
+    assert response.status_code == 410
+    assert str(grid.version) in response.json()["detail"]
+    assert response_current.status_code == 200
+    assert response_current.json()["since"] == grid.version
+    assert client.get("grid/changes?since={}".format(cache.snapshot.grid.version + 1)).status_code == 422
+    assert client.get("stations/changes?since=0").status_code == 422
+    assert client.get("grid/changes?since=0&hours=6-0").status_code == 422
+
+
+def test_grid_response_bbox_invalid():
+    """Test grid endpoint response with malformed bounding box."""
+    # act
+    response = client.get("grid?bbox=390000,5815000")
+
+    # assert
+    assert response.status_code == 422
+
+
+def test_lookup_response():
+    """Test lookup endpoint response."""
+    # act
+    response = client.get("lookup?x=390150&y=5815150")
+
+    # assert
+    assert response.status_code == 200
+    assert set(response.json()) == {"lor", "grid", "streets", "stations"}
+    assert response.json()["grid"]["distance"] >= 0
+
+
+@pytest.mark.parametrize("query", ["x=nan&y=5815150", "x=inf&y=5815150", "x=0&y=100000000000000", "x=1e300&y=1e300"])
+def test_lookup_response_invalid(query):
+    """Test that coordinates that are not finite or outside of EPSG:25833 are rejected."""
+    # act
+    response = client.get(f"lookup?{query}")
+
+    # assert
+    assert response.status_code == 422
+
+
+def test_grid_response_compressed():
+    """Test that grid is gzip compressed if the client accepts it."""
+    # act
+    response = client.get("grid", headers={"Accept-Encoding": "gzip"})
+    response_identity = client.get("grid", headers={"Accept-Encoding": "identity"})
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] != response_identity.headers["ETag"]
+    assert "Content-Encoding" not in response_identity.headers
+    assert response.content == response_identity.content
+
+
+def test_grid_response_not_modified():
+    """Test that grid returns 304 without body if the client has the current version."""
+    # arrange
+    etag = client.get("grid?limit=20").headers["ETag"]
+
+    # act
+    response = client.get("grid?limit=20", headers={"If-None-Match": etag})
+    response_other_page = client.get("grid?limit=30", headers={"If-None-Match": etag})
+
+    # assert
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert response_other_page.status_code == 200
+
+
+def test_streets_response_not_modified_streamed(monkeypatch):
+    """Test that a streamed page and a binary page the client has are answered with 304 without rendering them."""
+    # arrange
+    monkeypatch.setattr(response_cache, "STREAMING_MIN_FEATURES", 100)
+    etag = client.get("streets?limit=500").headers["ETag"]
+    etag_gzip = client.get("grid?limit=30&format=msgpack", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    monkeypatch.setattr(response_cache.response_cache, "responses", response_cache.response_cache.responses.copy())
+    response_cache.response_cache.responses.clear()
+
+    # act
+    response = client.get("streets?limit=500", headers={"If-None-Match": etag})
+    response_binary = client.get("grid?limit=30&format=msgpack", headers={"If-None-Match": etag_gzip})
+
+    # assert
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response_binary.status_code == 304
+    assert response_cache.response_cache.responses == {}
@@ -0,0 +1,97 @@
+"""Integration testing for fairqapi: multi-worker serving."""
+import gc
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import types
+import weakref
+
+import httpx
+
+from fairqapi.cache.cache import CacheSnapshot
+from fairqapi.serve import Supervisor, split_cache_budgets
+
+
+def get_free_port() -> int:
+    """Find a free local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(url: str, timeout: float = 60) -> None:
+    """Poll the health endpoint until the API answers."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"API at {url} did not get healthy within {timeout}s")
+
+
+def test_serve_workers_metrics():
+    """Test that several workers serve the API and /metrics counts the requests of all of them."""
+    # arrange
+    port = get_free_port()
+    url = f"http://127.0.0.1:{port}"
+    supervisor = subprocess.Popen(
+        [sys.executable, "-m", "fairqapi.serve", "--port", str(port), "--workers", "2"],
+        env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": ""},
+    )
+
+    try:
+        wait_until_healthy(url)
+
+        # act
+        responses = [httpx.get(f"{url}/grid?limit=10") for _ in range(6)]
+        metrics = httpx.get(f"{url}/metrics/").text
+    finally:
+        supervisor.send_signal(signal.SIGTERM)
+        exit_code = supervisor.wait(timeout=30)
+
+    # assert
+    assert all(response.status_code == 200 for response in responses)
+    assert 'starlette_requests_total{method="GET",path_template="/grid"} 6.0' in metrics
+    assert exit_code == 0
+
+
+def test_split_cache_budgets(monkeypatch):
+    """Test that the cache budgets are split between the workers."""
+    # arrange
+    monkeypatch.setenv("RESPONSE_CACHE_MAX_BYTES", "1000")
+    monkeypatch.delenv("TILE_CACHE_MAX_BYTES", raising=False)
+
+    # act
+    split_cache_budgets(4)
+
+    # assert
+    assert os.environ["RESPONSE_CACHE_MAX_BYTES"] == "250"
+    assert os.environ["TILE_CACHE_MAX_BYTES"] == str(16 * 1024 ** 2)
+
+
+def test_spawn_workers_collects_previous_snapshots():
+    """Test that the garbage frozen for the previous workers is collected when new workers are spawned."""
+    # arrange
+    supervisor = Supervisor(None, types.SimpleNamespace(), None, n_workers=0)
+    # a reference cycle, only collected by the garbage collector
+    snapshot = CacheSnapshot()
+    snapshot.memberships = {"snapshot": snapshot}
+    snapshot_ref = weakref.ref(snapshot)
+
+    try:
+        supervisor.spawn_workers(0)
+        del snapshot
+
+        # act
+        supervisor.spawn_workers(0)
+    finally:
+        gc.unfreeze()
+
+    # assert
+    assert snapshot_ref() is None
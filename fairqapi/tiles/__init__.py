@@ -0,0 +1 @@
+"""Vector tiles (Mapbox Vector Tile) of the streets, grid, LOR and simulation layers."""
@@ -0,0 +1,108 @@
+"""Clipping of geometries in tile coordinates to the (buffered) tile."""
+import numpy as np
+
+
+def clip_points(coords: np.ndarray, bounds: tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Find the points inside of bounds.
+
+    :param np.ndarray coords: points with shape (n, 2)
+    :param tuple bounds: (minx, miny, maxx, maxy)
+    :return: boolean mask of the points inside
+    """
+    minx, miny, maxx, maxy = bounds
+    return (coords[:, 0] >= minx) & (coords[:, 0] <= maxx) & (coords[:, 1] >= miny) & (coords[:, 1] <= maxy)
+
+
+def clip_lines(
+    coords: np.ndarray,
+    offsets: np.ndarray,
+    bounds: tuple[float, float, float, float],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Clip lines to bounds with the Liang-Barsky algorithm, all segments at once. A line leaving
+    and re-entering the bounds is split into parts.
+
+    :param np.ndarray coords: coordinates of all lines with shape (n, 2)
+    :param np.ndarray offsets: line i has the coordinates [offsets[i], offsets[i + 1])
+    :param tuple bounds: (minx, miny, maxx, maxy)
+    :return: coordinates of the parts, their offsets and the line of every part
+    """
+    minx, miny, maxx, maxy = bounds
+    # a segment starts at every coordinate except for the last coordinate of every line
+    is_segment_start = np.ones(len(coords), dtype=bool)
+    is_segment_start[offsets[1:][np.diff(offsets) > 0] - 1] = False
+    starts = np.flatnonzero(is_segment_start)
+    segment_line = np.searchsorted(offsets, starts, side="right") - 1
+
+    start_points = coords[starts]
+    deltas = coords[starts + 1] - start_points
+    lower = np.zeros(len(starts))
+    upper = np.ones(len(starts))
+    visible = np.ones(len(starts), dtype=bool)
+    for direction, distance in [
+        (-deltas[:, 0], start_points[:, 0] - minx),
+        (deltas[:, 0], maxx - start_points[:, 0]),
+        (-deltas[:, 1], start_points[:, 1] - miny),
+        (deltas[:, 1], maxy - start_points[:, 1]),
+    ]:
+        parallel = direction == 0
+        visible &= ~(parallel & (distance < 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = distance / direction
+        lower = np.where(direction < 0, np.maximum(lower, ratio), lower)
+        upper = np.where(direction > 0, np.minimum(upper, ratio), upper)
+    visible &= lower <= upper
+
+    # a part starts at a visible segment whose start is clipped or that does not continue a visible segment
+    continues = np.zeros(len(starts), dtype=bool)
+    continues[1:] = (
+        visible[:-1] & (upper[:-1] >= 1) & (starts[1:] == starts[:-1] + 1) & (segment_line[1:] == segment_line[:-1])
+    )
+    part_starts = visible & ~(continues & (lower <= 0))
+
+    segments = np.flatnonzero(visible)
+    first_points = start_points[segments] + lower[segments, None] * deltas[segments]
+    last_points = start_points[segments] + upper[segments, None] * deltas[segments]
+    points = np.stack([first_points, last_points], axis=1)
+    emitted = np.column_stack([part_starts[segments], np.ones(len(segments), dtype=bool)])
+    clipped_coords = points[emitted]
+
+    point_counts = emitted.sum(axis=1)
+    segment_offsets = np.cumsum(point_counts) - point_counts
+    part_segments = np.flatnonzero(part_starts[segments])
+    part_offsets = np.append(segment_offsets[part_segments], len(clipped_coords)).astype(np.int64)
+    return clipped_coords, part_offsets, segment_line[segments[part_segments]]
+
+
+def clip_ring(ring: np.ndarray, bounds: tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Clip a polygon ring to bounds with the Sutherland-Hodgman algorithm, one edge of the bounds after another.
+
+    :param np.ndarray ring: coordinates of the ring with shape (n, 2), closed or not
+    :param tuple bounds: (minx, miny, maxx, maxy)
+    :return: coordinates of the clipped ring, not closed, empty if the ring lies outside
+    """
+    minx, miny, maxx, maxy = bounds
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+
+    for axis, bound, keep_lower in [(0, minx, False), (0, maxx, True), (1, miny, False), (1, maxy, True)]:
+        if not len(ring):
+            break
+        inside = ring[:, axis] <= bound if keep_lower else ring[:, axis] >= bound
+        if inside.all():
+            continue
+        previous = np.roll(ring, 1, axis=0)
+        previous_inside = np.roll(inside, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = (bound - previous[:, axis]) / (ring[:, axis] - previous[:, axis])
+            crossings = previous + ratio[:, None] * (ring - previous)
+        crossings[:, axis] = bound
+
+        # for every edge (previous, vertex): the crossing if it crosses the bound, then the vertex if inside
+        points = np.stack([crossings, ring], axis=1)
+        emitted = np.column_stack([inside != previous_inside, inside])
+        ring = points[emitted]
+
+    return ring
@@ -0,0 +1,164 @@
+"""
+Protocol buffers encoding of Mapbox Vector Tiles (version 2.1), see
+https://github.com/mapbox/vector-tile-spec. Geometries are given in tile
+coordinates as lists of parts, each an integer array with shape (n, 2).
+"""
+import struct
+
+import numpy as np
+
+EXTENT = 4096
+GEOMETRY_TYPES = {"Point": 1, "LineString": 2, "Polygon": 3}
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+# wire types of protocol buffers
+VARINT, FIXED64, LENGTH_DELIMITED = 0, 1, 2
+
+
+def varint(value: int) -> bytes:
+    """Encode a non-negative integer as varint."""
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def encode_varints(values: np.ndarray, counts: np.ndarray) -> list[bytes]:
+    """
+    Encode groups of unsigned integers as packed varints, all groups at once.
+
+    :param np.ndarray values: non-negative integers of all groups, one group after another
+    :param np.ndarray counts: number of integers of every group
+    :return: encoded integers of every group, e.g. the packed repeated field of every feature
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for group in range(1, 10):
+        n_bytes += values >= np.uint64(1 << (7 * group))
+
+    encoded = np.empty(n_bytes.sum(), dtype=np.uint8)
+    starts = np.cumsum(n_bytes) - n_bytes
+    for group in range(n_bytes.max(initial=0)):
+        has_group = n_bytes > group
+        group_bits = (values[has_group] >> np.uint64(7 * group)) & np.uint64(0x7f)
+        more = (n_bytes[has_group] > group + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[has_group] + group] = group_bits | more
+
+    encoded = encoded.tobytes()
+    value_ends = np.cumsum(counts)
+    byte_ends = np.concatenate([[0], np.cumsum(n_bytes)])[value_ends].tolist()
+    return [encoded[start:end] for start, end in zip([0, *byte_ends[:-1]], byte_ends)]
+
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    """Map signed integers to unsigned ones (0, -1, 1, -2 ... to 0, 1, 2, 3 ...)."""
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def field(number: int, wire_type: int, payload) -> bytes:
+    """
+    Encode a field of a message.
+
+    :param int number: field number
+    :param int wire_type: VARINT (payload int), FIXED64 (payload float) or LENGTH_DELIMITED (payload bytes)
+    :param payload: value of the field
+    :return: key and value of the field
+    """
+    key = varint(number << 3 | wire_type)
+    if wire_type == VARINT:
+        return key + varint(payload)
+    if wire_type == FIXED64:
+        return key + struct.pack("<d", payload)
+    return key + varint(len(payload)) + payload
+
+
+def geometry_commands(geometry_type: str, parts: list[np.ndarray]) -> np.ndarray:
+    """
+    Encode the parts of a geometry as command integers.
+
+    :param str geometry_type: "Point", "LineString" (parts are lines) or "Polygon" (parts are rings, not closed)
+    :param list parts: integer coordinates of every part with shape (n, 2)
+    :return: command integers and zigzag encoded coordinate deltas
+    """
+    points = np.concatenate(parts)
+    # the cursor moves on from the last point of the previous part
+    deltas = zigzag(np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=points.dtype)))
+    if geometry_type == "Point":
+        return np.concatenate([command(MOVE_TO, len(points)), deltas.reshape(-1)])
+
+    commands = []
+    start = 0
+    for part in parts:
+        part_deltas = deltas[start:start + len(part)]
+        start += len(part)
+        commands += [command(MOVE_TO, 1), part_deltas[0], command(LINE_TO, len(part) - 1), part_deltas[1:].reshape(-1)]
+        if geometry_type == "Polygon":
+            commands.append(command(CLOSE_PATH, 1))
+    return np.concatenate(commands)
+
+
+def command(command_id: int, count: int) -> np.ndarray:
+    """Return the command integer of a command repeated count times."""
+    return np.array([command_id | count << 3], dtype=np.uint64)
+
+
+def encode_value(value) -> bytes:
+    """Encode an attribute value as Value message."""
+    if isinstance(value, str):
+        return field(1, LENGTH_DELIMITED, value.encode("utf-8"))
+    if isinstance(value, bool):
+        return field(7, VARINT, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return field(5, VARINT, value)
+        return field(6, VARINT, -2 * value - 1)
+    return field(3, FIXED64, float(value))
+
+
+def encode_layer(name: str, features: list[tuple], extent: int = EXTENT) -> bytes:
+    """
+    Encode a layer.
+
+    :param str name: name of the layer
+    :param list features: (id or None, attributes dict, geometry type, command integers) of every feature
+    :param int extent: tile extent of the coordinates
+    :return: Layer message
+    """
+    keys = {}
+    values = {}
+    tags = []
+    for _, attributes, _, _ in features:
+        for key, value in attributes.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            # 1 and 1.0 are distinct values
+            tags.append(values.setdefault((type(value), value), len(values)))
+
+    encoded_tags = encode_varints(tags, [2 * len(attributes) for _, attributes, _, _ in features])
+    encoded_commands = encode_varints(
+        np.concatenate([commands for *_, commands in features]) if features else [],
+        [len(commands) for *_, commands in features],
+    )
+    encoded_features = []
+    for feature, feature_tags, feature_commands in zip(features, encoded_tags, encoded_commands):
+        feature_id, _, geometry_type, _ = feature
+        encoded = b"" if feature_id is None else field(1, VARINT, feature_id)
+        encoded += field(2, LENGTH_DELIMITED, feature_tags)
+        encoded += field(3, VARINT, GEOMETRY_TYPES[geometry_type])
+        encoded += field(4, LENGTH_DELIMITED, feature_commands)
+        encoded_features.append(field(2, LENGTH_DELIMITED, encoded))
+
+    return b"".join([
+        field(15, VARINT, 2),
+        field(1, LENGTH_DELIMITED, name.encode("utf-8")),
+        *encoded_features,
+        *[field(3, LENGTH_DELIMITED, key.encode("utf-8")) for key in keys],
+        *[field(4, LENGTH_DELIMITED, encode_value(value)) for _, value in values],
+        field(5, VARINT, extent),
+    ])
+
+
+def encode_tile(layers: list[bytes]) -> bytes:
+    """Encode a tile from its encoded layers."""
+    return b"".join(field(3, LENGTH_DELIMITED, layer) for layer in layers)
@@ -0,0 +1,115 @@
+"""
+Projection of the EPSG:25833 (ETRS89 / UTM zone 33N) coordinates to WebMercator
+(EPSG:3857) and the tile grid of WebMercator.
+
+The inverse transverse mercator uses the Krüger series to the third order of
+the third flattening, which is accurate to the millimeter within the zone.
+"""
+import math
+
+import numpy as np
+
+# GRS80 ellipsoid of ETRS89
+SEMI_MAJOR_AXIS = 6378137.0
+FLATTENING = 1 / 298.257222101
+# UTM zone 33N
+CENTRAL_MERIDIAN = math.radians(15)
+SCALE_FACTOR = 0.9996
+FALSE_EASTING = 500000.0
+# half of the circumference of the WebMercator world
+WEB_MERCATOR_HALF_WORLD = math.pi * SEMI_MAJOR_AXIS
+# deepest zoom level of the tile grid
+MAX_ZOOM = 22
+
+_N = FLATTENING / (2 - FLATTENING)
+_RECTIFYING_RADIUS = SEMI_MAJOR_AXIS / (1 + _N) * (1 + _N ** 2 / 4 + _N ** 4 / 64)
+_BETA = [
+    _N / 2 - 2 / 3 * _N ** 2 + 37 / 96 * _N ** 3,
+    _N ** 2 / 48 + _N ** 3 / 15,
+    17 / 480 * _N ** 3,
+]
+_DELTA = [
+    2 * _N - 2 / 3 * _N ** 2 - 2 * _N ** 3,
+    7 / 3 * _N ** 2 - 8 / 5 * _N ** 3,
+    56 / 15 * _N ** 3,
+]
+
+
+def utm33_to_lonlat(coords: np.ndarray) -> np.ndarray:
+    """
+    Convert EPSG:25833 coordinates to longitude and latitude.
+
+    :param np.ndarray coords: (easting, northing) with shape (n, 2)
+    :return: (longitude, latitude) in degrees with shape (n, 2)
+    """
+    xi = coords[:, 1] / (SCALE_FACTOR * _RECTIFYING_RADIUS)
+    eta = (coords[:, 0] - FALSE_EASTING) / (SCALE_FACTOR * _RECTIFYING_RADIUS)
+
+    xi_prime = xi.copy()
+    eta_prime = eta.copy()
+    for order, beta in enumerate(_BETA, start=1):
+        xi_prime -= beta * np.sin(2 * order * xi) * np.cosh(2 * order * eta)
+        eta_prime -= beta * np.cos(2 * order * xi) * np.sinh(2 * order * eta)
+
+    chi = np.arcsin(np.sin(xi_prime) / np.cosh(eta_prime))
+    latitude = chi.copy()
+    for order, delta in enumerate(_DELTA, start=1):
+        latitude += delta * np.sin(2 * order * chi)
+    longitude = CENTRAL_MERIDIAN + np.arctan2(np.sinh(eta_prime), np.cos(xi_prime))
+
+    return np.degrees(np.column_stack([longitude, latitude]))
+
+
+def lonlat_to_web_mercator(coords: np.ndarray) -> np.ndarray:
+    """
+    Convert longitude and latitude to WebMercator.
+
+    :param np.ndarray coords: (longitude, latitude) in degrees with shape (n, 2)
+    :return: (x, y) in meters with shape (n, 2)
+    """
+    longitude = np.radians(coords[:, 0])
+    latitude = np.radians(coords[:, 1])
+    return np.column_stack([
+        SEMI_MAJOR_AXIS * longitude,
+        SEMI_MAJOR_AXIS * np.log(np.tan(np.pi / 4 + latitude / 2)),
+    ])
+
+
+def utm33_to_web_mercator(coords: np.ndarray) -> np.ndarray:
+    """Convert EPSG:25833 coordinates with shape (n, 2) to WebMercator."""
+    return lonlat_to_web_mercator(utm33_to_lonlat(coords))
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """
+    Return the WebMercator bounds of a tile.
+
+    :param int z: zoom level
+    :param int x: column of the tile, from the west
+    :param int y: row of the tile, from the north
+    :return: (minx, miny, maxx, maxy)
+    """
+    size = 2 * WEB_MERCATOR_HALF_WORLD / 2 ** z
+    minx = -WEB_MERCATOR_HALF_WORLD + x * size
+    maxy = WEB_MERCATOR_HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(z: int, bounds: tuple[float, float, float, float]) -> tuple[range, range]:
+    """
+    Return the tiles of a zoom level that intersect WebMercator bounds.
+
+    :param int z: zoom level
+    :param tuple bounds: (minx, miny, maxx, maxy)
+    :return: range of the tile columns and range of the tile rows
+    """
+    size = 2 * WEB_MERCATOR_HALF_WORLD / 2 ** z
+    minx, miny, maxx, maxy = bounds
+
+    def tile(coordinate: float) -> int:
+        return min(max(int(coordinate // size), 0), 2 ** z - 1)
+
+    return (
+        range(tile(minx + WEB_MERCATOR_HALF_WORLD), tile(maxx + WEB_MERCATOR_HALF_WORLD) + 1),
+        range(tile(WEB_MERCATOR_HALF_WORLD - maxy), tile(WEB_MERCATOR_HALF_WORLD - miny) + 1),
+    )
@@ -0,0 +1 @@
+"""Tiles tests."""
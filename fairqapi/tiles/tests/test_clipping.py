@@ -0,0 +1,47 @@
+"""test file for clipping.py."""
+import numpy as np
+
+from fairqapi.tiles.clipping import clip_lines, clip_points, clip_ring
+
+BOUNDS = (0, 0, 10, 10)
+
+
+def test_clip_points() -> None:
+    """This test asserts that points outside of the bounds are dropped."""
+    # act
+    res = clip_points(np.array([[5, 5], [10, 0], [11, 5]]), BOUNDS)
+
+    # assert
+    assert res.tolist() == [True, True, False]
+
+
+def test_clip_lines() -> None:
+    """This test asserts that lines are cut at the bounds and split where they leave and re-enter them."""
+    # arrange
+    coords = np.array(
+        [[-5, 5], [5, 5], [15, 5], [15, 8], [5, 8], [-5, 8], [1, 1], [2, 2], [20, 20], [30, 30]],
+        dtype=float,
+    )
+    offsets = np.array([0, 6, 8, 10])
+
+    # act
+    clipped, part_offsets, part_lines = clip_lines(coords, offsets, BOUNDS)
+
+    # assert
+    parts = [clipped[start:end].tolist() for start, end in zip(part_offsets[:-1], part_offsets[1:])]
+    assert parts == [[[0, 5], [5, 5], [10, 5]], [[10, 8], [5, 8], [0, 8]], [[1, 1], [2, 2]]]
+    assert part_lines.tolist() == [0, 0, 1]
+
+
+def test_clip_ring() -> None:
+    """This test asserts that rings are cut along the bounds and dropped outside of them."""
+    # arrange
+    ring = np.array([[-5, -5], [5, -5], [5, 5], [-5, 5], [-5, -5]], dtype=float)
+
+    # act
+    res = clip_ring(ring, BOUNDS)
+    res_outside = clip_ring(ring + 20, BOUNDS)
+
+    # assert
+    assert sorted(map(tuple, res.tolist())) == [(0, 0), (0, 5), (5, 0), (5, 5)]
+    assert len(res_outside) == 0
@@ -0,0 +1,50 @@
+"""test file for mvt.py."""
+import numpy as np
+import pytest
+
+from fairqapi.tiles.mvt import encode_layer, encode_tile, encode_varints, geometry_commands, zigzag
+
+
+def test_encode_varints() -> None:
+    """This test asserts that groups of integers are encoded as packed varints."""
+    # act
+    res = encode_varints(np.array([1, 300, 150, 0]), [2, 0, 2])
+
+    # assert
+    assert res == [b"\x01\xac\x02", b"", b"\x96\x01\x00"]
+
+
+def test_geometry_commands() -> None:
+    """This test asserts the command integers of the examples of the vector tile specification."""
+    # act
+    point = geometry_commands("Point", [np.array([[25, 17]])])
+    line = geometry_commands("LineString", [np.array([[2, 2], [2, 10], [10, 10]])])
+    polygon = geometry_commands("Polygon", [np.array([[3, 6], [8, 12], [20, 34]])])
+
+    # assert
+    assert zigzag(np.array([0, -1, 1, -2])).tolist() == [0, 1, 2, 3]
+    assert point.tolist() == [9, 50, 34]
+    assert line.tolist() == [9, 4, 4, 18, 0, 16, 16, 0]
+    assert polygon.tolist() == [9, 6, 12, 18, 10, 12, 24, 44, 15]
+
+
+def test_encode_tile() -> None:
+    """This test asserts that a decoder reads the features and attributes of a tile."""
+    # arrange
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+    features = [
+        (7, {"id": 7, "no2": 22.4, "name": "a"}, "Point", geometry_commands("Point", [np.array([[25, 17]])])),
+        (None, {"no2": -1}, "LineString", geometry_commands("LineString", [np.array([[2, 2], [2, 10]])])),
+    ]
+
+    # act
+    tile = encode_tile([encode_layer("grid", features)])
+    res = mapbox_vector_tile.decode(tile, default_options={"y_coord_down": True})
+
+    # assert
+    assert res["grid"]["extent"] == 4096
+    assert res["grid"]["features"][0]["id"] == 7
+    assert res["grid"]["features"][0]["properties"] == {"id": 7, "no2": 22.4, "name": "a"}
+    assert res["grid"]["features"][0]["geometry"] == {"type": "Point", "coordinates": [25, 17]}
+    assert res["grid"]["features"][1]["properties"] == {"no2": -1}
+    assert res["grid"]["features"][1]["geometry"]["coordinates"] == [[2, 2], [2, 10]]
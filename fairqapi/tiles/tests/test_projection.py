@@ -0,0 +1,32 @@
+"""test file for projection.py."""
+import numpy as np
+
+from fairqapi.tiles.projection import tile_bounds, tile_range, utm33_to_lonlat, utm33_to_web_mercator
+
+
+def test_utm33_to_web_mercator() -> None:
+    """This test asserts that EPSG:25833 coordinates are projected like proj projects them."""
+    # arrange
+    coords = np.array([[389905.0, 5819708.0], [500000.0, 0.0]])
+
+    # act
+    res = utm33_to_web_mercator(coords)
+
+    # assert
+    np.testing.assert_allclose(utm33_to_lonlat(coords)[1], [15, 0], atol=1e-9)
+    np.testing.assert_allclose(res[0], [1489177.4846, 6894032.4540], atol=0.01)
+
+
+def test_tile_range() -> None:
+    """This test asserts that the tiles of a zoom level cover the bounds."""
+    # arrange
+    bounds = (1489177.4846, 6894032.4540, 1489177.4846, 6894032.4540)
+
+    # act
+    columns, rows = tile_range(12, bounds)
+
+    # assert
+    assert (columns, rows) == (range(2200, 2201), range(1343, 1344))
+    minx, miny, maxx, maxy = tile_bounds(12, 2200, 1343)
+    assert minx <= bounds[0] <= maxx and miny <= bounds[1] <= maxy
+    assert tile_bounds(0, 0, 0) == (-20037508.342789244, -20037508.342789244, 20037508.342789244, 20037508.342789244)
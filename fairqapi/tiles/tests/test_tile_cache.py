@@ -0,0 +1,46 @@
+"""test file for tile_cache.py."""
+from fairqapi.cache.tests.test_feature_store import get_grid_store
+from fairqapi.tiles.tile_cache import parse_zoom_range, prerender_tiles, tile_cache, tile_response
+from fairqapi.tiles.tile_layer import tile_layers
+
+
+def test_prerender_tiles() -> None:
+    """This test asserts that the tiles of the pre-rendered zoom levels are served from the tile cache."""
+    # arrange
+    store = get_grid_store(20)
+    store.version = 7
+
+    # act
+    n_tiles = prerender_tiles("test", store, parse_zoom_range("13-14"))
+
+    # assert
+    cached = [key for key in tile_cache.responses if key[:2] == ("tiles", "test") and key[-1] == 7]
+    assert n_tiles == len(cached) >= 2
+    _, _, z, x, y, hour, _ = cached[0]
+    response = tile_response("test", store, z, x, y, hour)
+    assert response is tile_cache.responses[cached[0]]
+    assert response.media_type == "application/vnd.mapbox-vector-tile"
+    assert tile_layers.get("test", store).feature_store is store
+
+
+def test_prerender_tiles_max_tiles() -> None:
+    """This test asserts that at most max_tiles tiles are rendered, the lower zoom levels first."""
+    # arrange
+    store = get_grid_store(20)
+    store.version = 8
+
+    # act
+    n_tiles = prerender_tiles("test", store, parse_zoom_range("10-16"), max_tiles=3)
+
+    # assert
+    cached = [key for key in tile_cache.responses if key[:2] == ("tiles", "test") and key[-1] == 8]
+    assert n_tiles == len(cached) == 3
+    assert min(key[2] for key in cached) == 10
+
+
+def test_parse_zoom_range() -> None:
+    """This test asserts that zoom ranges are inclusive."""
+    # act & assert
+    assert parse_zoom_range("10-12") == range(10, 13)
+    assert parse_zoom_range("8") == range(8, 9)
+    assert parse_zoom_range("") == range(0)
@@ -0,0 +1,153 @@
+"""test file for tile_layer.py."""
+import threading
+
+import numpy as np
+import pytest
+
+from fairqapi.cache.feature_store import FeatureStore, StringColumn, ValueColumn
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.cache.tests.test_feature_store import get_grid_store
+from fairqapi.tiles.projection import tile_range
+from fairqapi.tiles import tile_layer
+from fairqapi.tiles.tile_layer import TileLayer, TileLayers, orient_ring, tile_layers
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+
+def test_tile_layer_render() -> None:
+    """This test asserts that a tile contains the features within it with the forecast values of one hour."""
+    # arrange
+    layer = TileLayer("grid", get_grid_store(20))
+    columns, rows = tile_range(16, layer.bounds)
+
+    # act
+    tiles = [layer.render(16, x, y, hour=1) for x in columns for y in rows]
+    empty_tile = layer.render(16, columns[0] - 2, rows[0])
+
+    # assert
+    features = [
+        feature for tile in tiles if tile for feature in mapbox_vector_tile.decode(tile)["grid"]["features"]
+    ]
+    assert len({feature["id"] for feature in features}) == 20
+    assert features[0]["properties"]["no2"] == features[0]["id"]
+    assert features[0]["properties"]["pm10"] == 21.8
+    assert features[0]["properties"]["date_time_forecast_iso8601"] == "2022-10-27T09:14:45+00:00"
+    assert empty_tile == b""
+
+
+def test_tile_layer_render_polygons() -> None:
+    """This test asserts that polygons are clipped to the buffered tile and their holes are kept."""
+    # arrange
+    outer = [[389000.0, 5819000.0], [391000.0, 5819000.0], [391000.0, 5821000.0], [389000.0, 5821000.0]]
+    outer.append(outer[0])
+    hole = [[389500.0, 5819500.0], [389500.0, 5820500.0], [390500.0, 5820500.0], [390500.0, 5819500.0]]
+    hole.append(hole[0])
+    store = FeatureStore(
+        "PLR_ID",
+        np.array(["01100101"]),
+        GeometryStore.from_coordinates("MultiPolygon", [[[outer, hole]]]),
+        {"forecast_range_iso8601": StringColumn.from_values(["R1/2022-10-27T00:00:00.000000Z/PT24H"])},
+        {"no2": ValueColumn(np.array([[12.5]]))},
+    )
+    layer = TileLayer("lor", store)
+
+    # act
+    whole = mapbox_vector_tile.decode(layer.render(11, *[tiles[0] for tiles in tile_range(11, layer.bounds)]))
+    columns, rows = tile_range(15, layer.bounds)
+    corner = mapbox_vector_tile.decode(layer.render(15, columns[0], rows[0]))
+
+    # assert
+    feature = whole["lor"]["features"][0]
+    assert feature["properties"] == {
+        "PLR_ID": "01100101", "forecast_range_iso8601": "R1/2022-10-27T00:00:00.000000Z/PT24H", "no2": 12.5,
+    }
+    assert feature["geometry"]["type"] == "Polygon"
+    assert len(feature["geometry"]["coordinates"]) == 2
+    assert corner["lor"]["features"][0]["geometry"]["type"] == "Polygon"
+    assert max(x for ring in corner["lor"]["features"][0]["geometry"]["coordinates"] for x, _ in ring) <= 4096 + 64
+
+
+def test_orient_ring() -> None:
+    """This test asserts that exteriors are clockwise and holes counterclockwise in tile coordinates."""
+    # arrange
+    counterclockwise = np.array([[0, 0], [0, 10], [10, 10], [10, 0], [0, 0]])
+
+    # act
+    exterior = orient_ring(counterclockwise, exterior=True)
+    hole = orient_ring(counterclockwise, exterior=False)
+
+    # assert
+    assert exterior.tolist() == [[10, 0], [10, 10], [0, 10], [0, 0]]
+    assert hole.tolist() == [[0, 0], [0, 10], [10, 10], [10, 0]]
+    assert orient_ring(np.array([[0, 0], [5, 5], [10, 10]]), exterior=True) is None
+
+
+def test_tile_layers() -> None:
+    """This test asserts that the TileLayers of the two newest versions of a layer are kept."""
+    # arrange
+    stores = [get_grid_store(3) for _ in range(3)]
+    for version, store in enumerate(stores):
+        store.version = version
+
+    # act
+    first = tile_layers.get("test_versions", stores[0])
+    second = tile_layers.get("test_versions", stores[1])
+    first_again = tile_layers.get("test_versions", stores[0])
+    tile_layers.get("test_versions", stores[2])
+    second_again = tile_layers.get("test_versions", stores[1])
+    first_rebuilt = tile_layers.get("test_versions", stores[0])
+
+    # assert
+    assert first is first_again
+    assert second is second_again
+    assert first_rebuilt is not first
+
+
+def test_tile_layers_build_without_lock(monkeypatch) -> None:
+    """This test asserts that the TileLayers of other layers are returned while a TileLayer is built."""
+    # arrange
+    layers = TileLayers()
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_tile_layer(name, feature_store, level=0):
+        if name == "slow":
+            building.set()
+            release.wait(timeout=10)
+        return TileLayer(name, feature_store, level)
+
+    monkeypatch.setattr(tile_layer, "TileLayer", slow_tile_layer)
+    slow_store = get_grid_store(3)
+    built = []
+    thread = threading.Thread(target=lambda: built.append(layers.get("slow", slow_store)))
+    thread.start()
+    building.wait(timeout=10)
+
+    # act
+    other = layers.get("other", get_grid_store(3))
+    still_building = thread.is_alive()
+    release.set()
+    thread.join(timeout=10)
+
+    # assert
+    assert still_building
+    assert other.name == "other"
+    assert built[0].feature_store is slow_store
+    assert layers.get("slow", slow_store) is built[0]
+
+
+def test_tile_layers_simplified() -> None:
+    """This test asserts that the TileLayer of a simplification level projects the simplified geometries."""
+    # arrange
+    store = get_grid_store(3)
+    geometries = store.geometries
+    store.simplified_geometries = [GeometryStore("Point", geometries.coords[:, ::-1], []) for _ in range(4)]
+
+    # act
+    full = tile_layers.get("test_simplified", store)
+    simplified = tile_layers.get("test_simplified", store, level=2)
+
+    # assert
+    assert simplified is not full
+    assert simplified.feature_store is store
+    assert simplified.bounds != full.bounds
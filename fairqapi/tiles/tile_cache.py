@@ -0,0 +1,101 @@
+"""Cached vector tiles, pre-rendered for the common zoom levels when a layer is loaded."""
+import logging
+import os
+import time
+from itertools import islice
+from typing import Iterator
+
+from fairqapi.cache.response_cache import EncodedResponse, ResponseCache
+from fairqapi.cache.simplification import level_for_zoom
+from fairqapi.tiles.projection import tile_range
+from fairqapi.tiles.tile_layer import tile_layers
+
+TILE_LAYERS = ["streets", "grid", "lor", "simulation"]
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+def parse_zoom_range(zoom_range: str) -> range:
+    """
+    Parse a zoom range like "10-12" (inclusive), an empty string for no zoom levels.
+
+    :param str zoom_range: "first-last" or "zoom"
+    :return: range of the zoom levels
+    """
+    if not zoom_range:
+        return range(0)
+    first, _, last = zoom_range.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+# zoom levels whose tiles of the forecast hour 0 are rendered when a layer is loaded
+PRERENDER_ZOOMS = parse_zoom_range(os.getenv("TILE_PRERENDER_ZOOMS", "10-12"))
+# tiles rendered per layer at most when it is loaded, the lower zoom levels first
+PRERENDER_MAX_TILES = int(os.getenv("TILE_PRERENDER_MAX_TILES", 64))
+
+tile_cache = ResponseCache(max_bytes=int(os.getenv("TILE_CACHE_MAX_BYTES", 64 * 1024 ** 2)))
+
+
+def tile_response(name: str, feature_store, z: int, x: int, y: int, hour: int = 0) -> EncodedResponse:
+    """
+    Return the cached tile of a layer, render it if it is missing.
+
+    :param str name: name of the layer, one of TILE_LAYERS
+    :param FeatureStore feature_store: loaded FeatureStore of the layer
+    :param int z: zoom level
+    :param int x: column of the tile
+    :param int y: row of the tile
+    :param int hour: forecast value of the attributes, counted from the first prediction
+    :return: EncodedResponse of the tile
+    """
+    # overview tiles are rendered from the geometries simplified to the size of a pixel
+    layer = tile_layers.get(name, feature_store, level_for_zoom(z) if feature_store.simplified_geometries else 0)
+    return tile_cache.get(
+        ("tiles", name, z, x, y, hour),
+        feature_store.version,
+        lambda: layer.render(z, x, y, hour),
+        MEDIA_TYPE,
+    )
+
+
+def prerender_tiles(
+    name: str,
+    feature_store,
+    zooms: range = PRERENDER_ZOOMS,
+    max_tiles: int = PRERENDER_MAX_TILES,
+) -> int:
+    """
+    Render the tiles of a layer that contain features into the tile cache, the lower zoom levels first.
+
+    :param str name: name of the layer, one of TILE_LAYERS
+    :param FeatureStore feature_store: loaded FeatureStore of the layer
+    :param range zooms: zoom levels to render
+    :param int max_tiles: number of tiles to render at most, the others are rendered on their first request
+    :return: number of rendered tiles
+    """
+    start = time.perf_counter()
+    if not len(feature_store):
+        return 0
+
+    bounds = tile_layers.get(name, feature_store).bounds
+    n_tiles = 0
+    for z, x, y in islice(covering_tiles(zooms, bounds), max_tiles):
+        tile_response(name, feature_store, z, x, y)
+        n_tiles += 1
+
+    logging.info(f"Rendered {n_tiles} {name} tiles in {time.perf_counter() - start:.1f} seconds")
+    return n_tiles
+
+
+def covering_tiles(zooms: range, bounds: tuple) -> Iterator[tuple[int, int, int]]:
+    """
+    Generate the tiles covering bounds.
+
+    :param range zooms: zoom levels, in this order
+    :param tuple bounds: WebMercator bounds (minx, miny, maxx, maxy)
+    :return: generator of the tiles (z, x, y)
+    """
+    for z in zooms:
+        columns, rows = tile_range(z, bounds)
+        for x in columns:
+            for y in rows:
+                yield z, x, y
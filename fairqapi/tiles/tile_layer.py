@@ -0,0 +1,241 @@
+"""Rendering of the vector tiles of one layer (endpoint)."""
+import threading
+
+import numpy as np
+
+from fairqapi.cache.feature_store import FeatureStore
+from fairqapi.cache.geometry_store import GeometryStore
+from fairqapi.tiles.clipping import clip_lines, clip_points, clip_ring
+from fairqapi.tiles.mvt import EXTENT, encode_layer, encode_tile, geometry_commands
+from fairqapi.tiles.projection import tile_bounds, utm33_to_web_mercator
+
+# features are clipped this many tile coordinates outside of the tile, so lines and outlines
+# do not end visibly at the tile border
+TILE_BUFFER = 64
+# mvt geometry type of the geometries
+MVT_TYPES = {
+    "Point": "Point",
+    "LineString": "LineString",
+    "MultiLineString": "LineString",
+    "Polygon": "Polygon",
+    "MultiPolygon": "Polygon",
+}
+
+
+class TileLayer():
+    """
+    This class renders the vector tiles of a FeatureStore. The geometries are
+    projected to WebMercator once, with their own spatial index; a tile only
+    clips and encodes the features whose envelope intersects it. The forecast
+    values of one hour are the attributes of the features. Overview zoom levels
+    use a TileLayer of the simplified geometries.
+    """
+
+    def __init__(self, name: str, feature_store: FeatureStore, level: int = 0):
+        """
+        :param str name: name of the layer, e.g. "streets"
+        :param FeatureStore feature_store: features of the layer with EPSG:25833 geometries
+        :param int level: simplification level of the geometries, see simplification.py
+        """
+        self.name = name
+        self.feature_store = feature_store
+        self.level = level
+        geometries = feature_store.simplified(level).geometries
+        self.geometries = GeometryStore(
+            geometries.geometry_type,
+            utm33_to_web_mercator(geometries.coords),
+            geometries.offsets,
+            "EPSG:3857",
+        )
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        """WebMercator bounds (minx, miny, maxx, maxy) of all features."""
+        coords = self.geometries.coords
+        return (*coords.min(axis=0).tolist(), *coords.max(axis=0).tolist())
+
+    def render(self, z: int, x: int, y: int, hour: int = 0) -> bytes:
+        """
+        Render a tile.
+
+        :param int z: zoom level
+        :param int x: column of the tile
+        :param int y: row of the tile
+        :param int hour: forecast value of the attributes, counted from the first prediction
+        :return: Mapbox Vector Tile with one layer, empty if no feature intersects the tile
+        """
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        scale = EXTENT / (maxx - minx)
+        buffer = TILE_BUFFER / scale
+        rows = self.geometries.spatial_index.query((minx - buffer, miny - buffer, maxx + buffer, maxy + buffer))
+        if not len(rows):
+            return b""
+
+        geometries = self.geometries.take(rows)
+        # tile coordinates, y points down
+        coords = (geometries.coords - (minx, maxy)) * (scale, -scale)
+        clip_bounds = (-TILE_BUFFER, -TILE_BUFFER, EXTENT + TILE_BUFFER, EXTENT + TILE_BUFFER)
+        feature_parts = clip_geometries(geometries, coords, clip_bounds)
+        if not feature_parts:
+            return b""
+
+        kept = np.array(list(feature_parts))
+        geometry_type = MVT_TYPES[geometries.geometry_type]
+        feature_ids, attributes = feature_attributes(self.feature_store.take(rows[kept]), hour)
+        features = [
+            (feature_id, properties, geometry_type, geometry_commands(geometry_type, feature_parts[row]))
+            for row, feature_id, properties in zip(kept.tolist(), feature_ids, attributes)
+        ]
+        return encode_tile([encode_layer(self.name, features)])
+
+
+def clip_geometries(geometries: GeometryStore, coords: np.ndarray, bounds: tuple) -> dict[int, list[np.ndarray]]:
+    """
+    Clip and quantize geometries in tile coordinates.
+
+    :param GeometryStore geometries: geometries of the candidate features
+    :param np.ndarray coords: coordinates of the geometries in tile coordinates
+    :param tuple bounds: (minx, miny, maxx, maxy) to clip to
+    :return: parts (points, lines or rings) of every feature that is not clipped away, by position
+    """
+    offsets = geometries.offsets
+    geometry_type = geometries.geometry_type
+    if geometry_type == "Point":
+        inside = np.flatnonzero(clip_points(coords, bounds))
+        return {row: [np.rint(coords[row:row + 1]).astype(np.int64)] for row in inside}
+
+    feature_parts = {}
+    if geometry_type in ("LineString", "MultiLineString"):
+        clipped, part_offsets, part_lines = clip_lines(coords, offsets[-1], bounds)
+        # lines of MultiLineStrings belong to features by the outer offsets
+        part_features = part_lines
+        if geometry_type == "MultiLineString":
+            part_features = np.searchsorted(offsets[0], part_lines, side="right") - 1
+        part_ranges = zip(part_offsets[:-1].tolist(), part_offsets[1:].tolist())
+        for row, (start, end) in zip(part_features.tolist(), part_ranges):
+            part = quantize(clipped[start:end])
+            if len(part) >= 2:
+                feature_parts.setdefault(row, []).append(part)
+        return feature_parts
+
+    # polygons of every feature, the first ring of a polygon is its exterior
+    polygon_offsets = offsets[0] if geometry_type == "MultiPolygon" else np.arange(len(geometries) + 1)
+    ring_offsets, coordinate_offsets = offsets[-2:]
+    for row in range(len(geometries)):
+        for polygon in range(polygon_offsets[row], polygon_offsets[row + 1]):
+            rings = []
+            for ring in range(ring_offsets[polygon], ring_offsets[polygon + 1]):
+                ring_coords = clip_ring(coords[coordinate_offsets[ring]:coordinate_offsets[ring + 1]], bounds)
+                ring_coords = orient_ring(quantize(ring_coords), exterior=not rings)
+                if ring_coords is not None:
+                    rings.append(ring_coords)
+                elif not rings:
+                    # the exterior is clipped away, and with it the holes
+                    break
+            feature_parts.setdefault(row, []).extend(rings)
+        if not feature_parts.get(row):
+            feature_parts.pop(row, None)
+    return feature_parts
+
+
+def quantize(part: np.ndarray) -> np.ndarray:
+    """Round coordinates to integers and drop consecutive duplicates."""
+    quantized = np.rint(part).astype(np.int64)
+    kept = np.ones(len(quantized), dtype=bool)
+    kept[1:] = (quantized[1:] != quantized[:-1]).any(axis=1)
+    return quantized[kept]
+
+
+def orient_ring(ring: np.ndarray, exterior: bool) -> np.ndarray | None:
+    """
+    Orient a quantized ring: exteriors have a positive area in tile coordinates
+    (clockwise with y down), holes a negative.
+
+    :param np.ndarray ring: integer coordinates of the ring, closed or not
+    :param bool exterior: True for the exterior of a polygon
+    :return: the ring without closing point, None if it has no area
+    """
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+    if len(ring) < 3:
+        return None
+    following = np.roll(ring, -1, axis=0)
+    area = (ring[:, 0] * following[:, 1] - following[:, 0] * ring[:, 1]).sum()
+    if area == 0:
+        return None
+    if (area > 0) != exterior:
+        return ring[::-1]
+    return ring
+
+
+def feature_attributes(store: FeatureStore, hour: int) -> tuple[list, list[dict]]:
+    """
+    Return the feature ids and attributes: the properties of the features with the forecast values of one hour.
+
+    :param FeatureStore store: features of the tile
+    :param int hour: forecast value, counted from the first prediction
+    :return: mvt id of every feature (None for string ids) and attributes of every feature
+    """
+    ids = store.ids.tolist()
+    columns = {store.id_name: ids}
+    columns.update({name: column.to_list(0, len(column)) for name, column in store.strings.items()})
+    for name, column in store.values.items():
+        if hour >= column.values.shape[1]:
+            continue
+        values = column.values[:, hour].tolist()
+        if column.horizons is not None:
+            values = [value if hour < horizon else None for value, horizon in zip(values, column.horizons.tolist())]
+        columns[name] = values
+
+    attributes = [
+        {name: value for name, value in zip(columns, feature_values) if value is not None}
+        for feature_values in zip(*columns.values())
+    ]
+    feature_ids = [feature_id if isinstance(feature_id, int) and feature_id >= 0 else None for feature_id in ids]
+    return feature_ids, attributes
+
+
+class TileLayers():
+    """
+    This class keeps the TileLayers of every layer by version and simplification
+    level. The layers of the KEPT_VERSIONS newest versions of a layer are kept, so
+    the snapshot being loaded and the one still serving requests do not replace
+    each other's layers.
+    """
+
+    KEPT_VERSIONS = 2
+
+    def __init__(self):
+        self.layers = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str, feature_store: FeatureStore, level: int = 0) -> TileLayer:
+        """
+        Return the TileLayer of a FeatureStore, build it if the store is new.
+
+        :param str name: name of the layer
+        :param FeatureStore feature_store: FeatureStore of the layer
+        :param int level: simplification level of the geometries
+        :return: TileLayer
+        """
+        key = (name, feature_store.version, level)
+        with self.lock:
+            layer = self.layers.get(key)
+        if layer is not None and layer.feature_store is feature_store:
+            return layer
+
+        # built without the lock, the tiles of the other layers are served meanwhile
+        built_layer = TileLayer(name, feature_store, level)
+        with self.lock:
+            layer = self.layers.get(key)
+            if layer is not None and layer.feature_store is feature_store:
+                return layer
+            self.layers[key] = built_layer
+            kept = sorted({version for layer_name, version, _ in self.layers if layer_name == name})
+            kept = kept[-self.KEPT_VERSIONS:]
+            for old_key in [old_key for old_key in self.layers if old_key[0] == name and old_key[1] not in kept]:
+                del self.layers[old_key]
+        return built_layer
+
+
+tile_layers = TileLayers()